@@ -1,19 +1,22 @@
 import asyncio
-import base64
 import logging
 import os
 import time
 import re
 import threading
 from queue import Queue
-from typing import Optional, Tuple
+from typing import Dict, Optional, Sequence, Tuple
 
 from browser_use.agent.service import Agent as BrowserUseAgent
 from browser_use.browser.session import BrowserSession
 from browser_use.llm import BaseChatModel
 
 from ...cdp.observer import CDPObserver
-from ...utils.api_client import APIClient, TraceType
+from ...cdp.utils.screencast import RecordingMode, video_mime_type
+from ...cdp.utils.thumbnails import ThumbnailSprite
+from ...utils.api_client import APIClient
+from ...utils.outbox import DEFAULT_OUTBOX_DIR
+from ...utils.trace_sink import FanoutSink, TraceSink, TraceType
 
 
 class Agent:
@@ -29,6 +32,13 @@ class Agent:
         llm: BaseChatModel,
         cdp_url: str,
         api_key: str,
+        video_segment_s: Optional[float] = None,
+        video_recording_mode: RecordingMode = "h264",
+        thumbnails_dir: Optional[str] = None,
+        batch_traces: bool = True,
+        outbox_dir: Optional[str] = DEFAULT_OUTBOX_DIR,
+        outbox_drain_timeout_s: float = 5.0,
+        sinks: Optional[Sequence[TraceSink]] = None,
         **agent_kwargs,
     ) -> None:
         """
@@ -38,7 +48,23 @@ class Agent:
             task: The task description for the browser-use agent
             llm: The language model to use for the agent
             cdp_url: The CDP WebSocket URL to connect to
-            api_key: API key for the observability API
+            api_key: API key for the observability API; may be empty when sinks are given
+            video_segment_s: Upload the screencast in segments of this many seconds while
+                the agent runs; None (default) uploads a single video at the end. Segments
+                are uploaded as separate videos, without a playlist to join them
+            video_recording_mode: "h264" re-encodes the screencast with ffmpeg, "mjpeg" muxes
+                Chrome's JPEG frames into Matroska without transcoding
+            thumbnails_dir: Build timeline thumbnail sprite sheets and copy them with their
+                JSON index into a per-session folder of this directory; needs Pillow
+                (install "clado-observe[images]")
+            batch_traces: Send traces in compressed batches instead of one request each
+            outbox_dir: Durable outbox for traces and media, sent in the background and
+                resent on the next run if the API is unavailable; None sends directly. It
+                keeps at most 1 GiB of unsent records, none older than 7 days
+            outbox_drain_timeout_s: How long shutdown waits for queued traces to be handed
+                to the sinks, and for the outbox to drain
+            sinks: Additional trace sinks (e.g. JSONLFileSink, OTLPHTTPSink) written to
+                alongside the API, or instead of it when api_key is empty
             **agent_kwargs: Additional arguments passed to the browser-use Agent
         """
         if not task or not isinstance(task, str):
@@ -47,15 +73,34 @@ class Agent:
             raise ValueError("cdp_url must be a non-empty string")
         if not llm or not isinstance(llm, BaseChatModel):
             raise ValueError("llm must be a non-empty BrowserUse BaseChatModel")
-        if not api_key or not isinstance(api_key, str):
+        if not sinks and (not api_key or not isinstance(api_key, str)):
             raise ValueError("api_key must be a non-empty string")
+        if thumbnails_dir is not None and not ThumbnailSprite.is_available():
+            raise ValueError(
+                'thumbnails_dir needs Pillow, install it with "pip install clado-observe[images]"'
+            )
 
         self.task = task
         self.cdp_url = cdp_url
         self.api_key = api_key
         self.agent_kwargs = agent_kwargs
-
-        self.api_client = APIClient(api_key=api_key)
+        self.thumbnails_dir = thumbnails_dir
+        # Track key -> JSON index of the exported thumbnails, set when the run ends
+        self.thumbnail_indexes: Dict[str, str] = {}
+        self.outbox_drain_timeout_s = outbox_drain_timeout_s
+
+        all_sinks = list(sinks or [])
+        if api_key:
+            all_sinks.insert(
+                0,
+                APIClient(
+                    api_key=api_key,
+                    batch_traces=batch_traces,
+                    outbox_dir=outbox_dir,
+                    outbox_drain_timeout_s=outbox_drain_timeout_s,
+                ),
+            )
+        self.api_client: TraceSink = all_sinks[0] if len(all_sinks) == 1 else FanoutSink(all_sinks)
 
         self.model_name = str(llm.model) if hasattr(llm, "model") else "unknown"
 
@@ -65,7 +110,14 @@ class Agent:
 
         self._setup_log_capture()
 
-        self.observer = CDPObserver(cdp_url=cdp_url, task=task, api_client=self.api_client)
+        self.observer = CDPObserver(
+            cdp_url=cdp_url,
+            task=task,
+            api_client=self.api_client,
+            segment_duration_s=video_segment_s,
+            recording_mode=video_recording_mode,
+            thumbnails=thumbnails_dir is not None,
+        )
 
         self.browser_session = BrowserSession(
             cdp_url=cdp_url,
@@ -154,6 +206,9 @@ class Agent:
 
                             if self.agent.observer:
                                 self.agent.observer.add_log_entry(clean_msg, trace_type)
+                                # BrowserSession lines are traced as tools but are not actions
+                                if record.name == "tools":
+                                    self.agent.observer.add_action(clean_msg, record.created)
 
                             if (
                                 self.agent.api_client
@@ -254,22 +309,35 @@ class Agent:
                         import traceback
 
                         traceback.print_exc()
+                    finally:
+                        self._trace_queue.task_done()
                 else:
                     await asyncio.sleep(0.1)
             except Exception as e:
                 print(f"[DEBUG] Queue processor error: {e}")
                 await asyncio.sleep(0.1)
 
+    def _wait_for_trace_queue(self, timeout: float) -> bool:
+        """
+        Wait until every queued trace has been handed to the sinks.
+
+        Returns:
+            True if the queue drained within timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._trace_queue.all_tasks_done:
+            while self._trace_queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._trace_queue.all_tasks_done.wait(remaining)
+        return True
+
     def _stop_trace_thread(self):
         """Stop the background trace thread and clean up properly."""
         if self._trace_loop and self._trace_loop.is_running():
 
             async def cleanup_and_stop():
-                for i in range(100):  # 10 seconds total
-                    if self._trace_queue.empty():
-                        break
-                    await asyncio.sleep(0.1)
-
                 tasks = [
                     t for t in asyncio.all_tasks(self._trace_loop) if t != asyncio.current_task()
                 ]
@@ -318,32 +386,36 @@ class Agent:
                 print(f"[DEBUG] Error during agent execution: {e}")
             finally:
                 try:
-                    video_path = loop.run_until_complete(self.observer.end_screencast())
-                    if video_path and os.path.exists(video_path):
-                        try:
-                            with open(video_path, "rb") as video_file:
-                                video_data = video_file.read()
-                                video_base64 = base64.b64encode(video_data).decode("utf-8")
-                                video_data_uri = f"data:video/mp4;base64,{video_base64}"
+                    loop.run_until_complete(self.observer.end_screencast())
+                    video_paths = list(self.observer.screencast_util.track_videos.values())
 
+                    for path in video_paths:
+                        if not os.path.exists(path):
+                            continue
+                        try:
                             loop.run_until_complete(
-                                self.api_client.upload_media(
-                                    media_type="video", data=video_data_uri
+                                self.api_client.upload_media_file(
+                                    media_type="video", path=path, mime_type=video_mime_type(path)
                                 )
                             )
-
-                            try:
-                                self.observer.screencast_util.cleanup_temp_files()
-                            except Exception as e:
-                                print(f"[DEBUG] Failed to cleanup temp files: {e}")
-
                         except Exception as e:
                             print(f"[DEBUG] Failed to upload video: {e}")
+
+                    if self.thumbnails_dir:
+                        run_name = self.api_client.session_id or f"run-{int(time.time())}"
+                        self.thumbnail_indexes = self.observer.screencast_util.export_thumbnails(
+                            os.path.join(self.thumbnails_dir, run_name)
+                        )
+                        for index_path in self.thumbnail_indexes.values():
+                            print(f"[DEBUG] Wrote thumbnails to {index_path}")
+
+                    try:
+                        self.observer.screencast_util.cleanup_temp_files()
+                    except Exception as e:
+                        print(f"[DEBUG] Failed to cleanup temp files: {e}")
                 except Exception as e:
                     print(f"[DEBUG] Failed to end screencast: {e}")
 
-                time.sleep(2.0)
-
                 try:
                     vlm_result = loop.run_until_complete(self.observer.run_vlm_evaluation())
                     print(f"[VLM] Evaluation result: {vlm_result}")
@@ -369,12 +441,15 @@ class Agent:
                 except Exception as e:
                     print(f"[VLM] Failed to run evaluation: {e}")
 
+                self.observer.collected_screenshots.clear()
+
                 self.observer.stop_background()
 
-                max_wait_time = 30
-                wait_start = time.time()
-                while not self._trace_queue.empty() and (time.time() - wait_start) < max_wait_time:
-                    time.sleep(0.5)
+                if not self._wait_for_trace_queue(self.outbox_drain_timeout_s):
+                    print(
+                        f"[API] {self._trace_queue.unfinished_tasks} traces still queued after "
+                        f"{self.outbox_drain_timeout_s}s"
+                    )
 
                 if self.api_client.session_id:
                     try:
@@ -1,18 +1,31 @@
 import asyncio
 import os
 import threading
-from typing import Any, Dict, List, Optional, Tuple
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+from .utils.action_index import ActionIndex
 from .utils.base_client import BaseCDPClient
 from .utils.target_manager import TargetManager
-from .utils.screenshot import ScreenshotUtil
-from .utils.screencast import ScreencastUtil
+from .utils.screenshot import SCREENSHOT_PRESETS, ScreenshotOptions, ScreenshotUtil
+from .utils.screencast import RecordingMode, ScreencastUtil, video_mime_type
 from .utils.dom import DOMUtil
-from .utils.network import NetworkUtil
-from ..utils.api_client import APIClient
+from .utils.har import HARWriter
+from .utils.network import (
+    BodyCaptureOptions,
+    NetworkEvent,
+    NetworkEventKey,
+    NetworkUtil,
+    RawNetworkEvent,
+)
+from .utils.network_filter import NetworkFilter, NetworkRule
+from ..utils.trace_sink import TraceSink
+from ..utils.screenshot_store import ScreenshotStore
 from ..utils.vlm_evaluator import VLMEvaluator, RunData, EvaluationResult
 
 SnapshotData = Dict[int, Any]
+# Network events buffered before the receive loop waits for the flush to catch up
+MAX_NETWORK_BATCH = 1000
 CDPMessage = Dict[str, Any]
 
 
@@ -28,7 +41,16 @@ class CDPObserver:
         self,
         cdp_url: str,
         task: str,
-        api_client: Optional[APIClient] = None,
+        api_client: Optional[TraceSink] = None,
+        follow_active_target: bool = False,
+        segment_duration_s: Optional[float] = None,
+        recording_mode: RecordingMode = "h264",
+        thumbnails: bool = False,
+        screenshot_max_frame_age_s: Optional[float] = 2.0,
+        screenshot_options: Optional[ScreenshotOptions] = None,
+        har_path: Optional[str] = None,
+        network_rules: Optional[Sequence[NetworkRule]] = None,
+        body_capture: Optional[BodyCaptureOptions] = None,
     ) -> None:
         if not cdp_url or not isinstance(cdp_url, str):
             raise ValueError("cdp_url must be a non-empty string")
@@ -38,19 +60,41 @@ class CDPObserver:
         self.cdp_url = cdp_url
         self.task = task
         self.api_client = api_client
+        self.screenshot_max_frame_age_s = screenshot_max_frame_age_s
 
         self.client = BaseCDPClient(cdp_url)
         self.screencast_client = BaseCDPClient(cdp_url)
 
         self.target_manager = TargetManager(self.client)
-        self.screenshot_util = ScreenshotUtil(self.client)
-        self.screencast_util = ScreencastUtil(self.screencast_client)
+        self.screenshot_util = ScreenshotUtil(
+            self.client, options=screenshot_options or SCREENSHOT_PRESETS["upload"]
+        )
+        self.screencast_util = ScreencastUtil(
+            self.screencast_client,
+            follow_active_target=follow_active_target,
+            segment_duration_s=segment_duration_s,
+            recording_mode=recording_mode,
+            thumbnails=thumbnails,
+        )
+        if api_client is not None:
+            self.screencast_util.segment_callback = self._upload_screencast_segment
         self.dom_util = DOMUtil(self.client)
-        self.network_util = NetworkUtil(self.screencast_client, capture_bodies=False)
+        self.network_util = NetworkUtil(
+            self.screencast_client,
+            body_capture=body_capture,
+            network_filter=NetworkFilter(network_rules) if network_rules else None,
+        )
+        self.network_util.on_state_change = self._on_network_state_change
+        self.network_util.on_request_started = self._index_request
+        self.action_index: ActionIndex[NetworkEventKey] = ActionIndex()
+        self.network_util.on_event_evicted = self._unindex_request
+        self.har_writer = HARWriter(har_path) if har_path else None
+        self._network_batch: List[RawNetworkEvent] = []
+        self._network_flush_task: Optional[asyncio.Task] = None
 
         self._bg_thread: Optional[threading.Thread] = None
 
-        self.collected_screenshots: List[str] = []
+        self.collected_screenshots = ScreenshotStore()
         self.collected_logs: List[Tuple[str, str]] = []
         self.final_result: Optional[str] = None
 
@@ -180,7 +224,20 @@ class CDPObserver:
                     pass
 
     async def screenshot(self) -> Optional[str]:
-        """Capture a screenshot with ephemeral connection."""
+        """Capture a screenshot, reusing the latest screencast frame when it is fresh enough.
+
+        Falls back to Page.captureScreenshot with an ephemeral connection when no screencast
+        frame was received within ``screenshot_max_frame_age_s`` seconds.
+        """
+        if self.screenshot_max_frame_age_s is not None:
+            cached_frame = self.screencast_util.get_latest_frame(
+                max_age_s=self.screenshot_max_frame_age_s
+            )
+            if cached_frame:
+                self.collected_screenshots.add(cached_frame)
+                print("[DEBUG] Screenshot served from latest screencast frame")
+                return cached_frame
+
         connection_made = False
         try:
             if self.client._ws is None:
@@ -197,7 +254,7 @@ class CDPObserver:
             screenshot_data = await self.screenshot_util.capture_screenshot(session_id=session_id)
 
             if screenshot_data:
-                self.collected_screenshots.append(screenshot_data)
+                self.collected_screenshots.add(screenshot_data)
                 print("[DEBUG] Screenshot captured successfully with ephemeral connection")
                 return screenshot_data
             else:
@@ -229,6 +286,7 @@ class CDPObserver:
                 for target_id, session_id in self.screencast_client.get_session_ids().items():
                     await self.screencast_client.send("Page.enable", session_id=session_id)
                     await self.screencast_client.send("Network.enable", session_id=session_id)
+                    await self.network_util.apply_blocked_urls(session_id)
                     await self.screencast_client.send(
                         "Page.setLifecycleEventsEnabled",
                         params={"enabled": True},
@@ -243,14 +301,24 @@ class CDPObserver:
 
     async def _stop_screencast_connection(self) -> None:
         """Stop the dedicated screencast CDP connection."""
+        self.screencast_client._event_handler = None
+        if self._network_flush_task is not None:
+            await self._network_flush_task
+        # Bodies are fetched over this connection, so finish them before closing it
+        await self.network_util.drain_body_capture()
+        await self.network_util.stop_body_capture()
+
         try:
             if self.screencast_client._ws is not None:
                 print("[DEBUG] Stopping dedicated screencast CDP connection...")
-                self.screencast_client._event_handler = None
                 await self.screencast_client.disconnect()
         except Exception as e:
             print(f"[WARNING] Failed to stop screencast connection: {e}")
 
+        if self.har_writer:
+            har_path = await self.har_writer.close()
+            print(f"[DEBUG] Wrote {self.har_writer.entry_count} network entries to {har_path}")
+
     async def start_screencast(self) -> None:
         """Start screencast recording."""
         if (
@@ -265,10 +333,11 @@ class CDPObserver:
             await self.screencast_util.start_screencast()
 
     async def end_screencast(self) -> Optional[str]:
-        """Stop screencast recording and create video.
+        """Stop screencast recording and create one video per recorded track.
 
         Returns:
-            Path to the created video file, or None if no video was created
+            Path to the primary video file, or None if no video was created.
+            All per-track videos are available in ``screencast_util.track_videos``.
         """
         if (
             self.screencast_client._loop
@@ -286,6 +355,97 @@ class CDPObserver:
             video_path = await self.screencast_util.end_screencast()
         return video_path
 
+    async def _upload_screencast_segment(self, track_key: str, path: str, index: int) -> None:
+        """Upload a finished screencast segment while recording continues, then delete it."""
+        if not self.api_client or not self.api_client.session_id:
+            return
+
+        media_url = await self.api_client.upload_media_file(
+            media_type="video", path=path, mime_type=video_mime_type(path)
+        )
+        if media_url:
+            print(f"[DEBUG] Uploaded screencast segment {index} of track {track_key}")
+            os.remove(path)
+
+    async def _on_network_state_change(self, method: str, event: NetworkEvent) -> None:
+        """Log and trace a network event whenever its state changes."""
+        log_entry = self.network_util.format_network_log(event)
+        self.add_log_entry(log_entry, "network")
+
+        if self.har_writer and method in ("Network.loadingFinished", "Network.loadingFailed"):
+            await self.har_writer.add_event(event)
+
+        if self.api_client and self.api_client.session_id:
+            try:
+                await self.api_client.create_trace("network", log_entry)
+            except Exception as api_e:
+                print(f"[DEBUG] Failed to send network trace to API: {api_e}")
+
+    async def _flush_network_events(self) -> None:
+        """Apply the network events received since the last flush as one batch."""
+        while self._network_batch:
+            batch, self._network_batch = self._network_batch, []
+            try:
+                await self.network_util.handle_network_events(batch)
+            except Exception as e:
+                print(f"[DEBUG] Error handling network events: {e}")
+
+    def _index_request(self, event: NetworkEvent) -> None:
+        """Add a new request to the action index, linked to the request that caused it."""
+        session_key = event.session_id or ""
+        parent: Optional[NetworkEventKey] = None
+        if event.initiator_request_id:
+            parent = (session_key, event.initiator_request_id)
+        elif event.initiator_type == "parser" and event.loader_id:
+            # The navigation request of a document has the document's loaderId as requestId
+            parent = (session_key, event.loader_id)
+
+        # Host time, the clock actions are recorded with; events are applied within a tick
+        # of being received, so this is close to when the request was seen
+        self.action_index.add_request(event.key, time.time(), parent)
+
+    def _unindex_request(self, event: NetworkEvent) -> None:
+        """Drop a request from the action index once the network util no longer retains it."""
+        self.action_index.remove_request(event.key)
+
+    def requests_for_action(self, index: int) -> List[NetworkEvent]:
+        """
+        Get the network requests started in the causal window of an agent action.
+
+        Args:
+            index: Action index (actions in the order they were added)
+
+        Returns:
+            Network events still retained by the network util, in start order
+        """
+        events = []
+        for key in self.action_index.requests_for_action(index):
+            event = self.network_util.get_event(key[1], key[0] or None)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def action_for_request(
+        self, request_id: str, session_id: Optional[str] = None
+    ) -> Optional[int]:
+        """Get the index of the agent action that caused a network request, if any."""
+        return self.action_index.action_for_request((session_id or "", request_id))
+
+    def get_action_network_summary(self, index: int) -> Dict[str, Any]:
+        """Get network cost and latency of one agent action."""
+        if not 0 <= index < len(self.action_index):
+            raise IndexError(f"No action {index}")
+        events = self.requests_for_action(index)
+        durations = [e.duration_ms for e in events if e.duration_ms]
+        return {
+            "action": self.action_index.action_labels[index],
+            "requests": len(events),
+            "failed_requests": sum(1 for e in events if e.failed),
+            "data_transferred": sum(e.encoded_data_length or 0 for e in events),
+            "total_duration_ms": sum(durations),
+            "max_duration_ms": max(durations, default=0),
+        }
+
     async def _handle_event(self, msg: CDPMessage) -> None:
         """
         Handle CDP events.
@@ -295,41 +455,6 @@ class CDPObserver:
         if isinstance(msg, dict):
             method = msg.get("method")
 
-            if method and method.startswith("Network."):
-                try:
-                    params = msg.get("params", {})
-                    if isinstance(params, dict):
-                        await self.network_util.handle_network_event(method, params)
-
-                        if method in [
-                            "Network.requestWillBeSent",
-                            "Network.responseReceived",
-                            "Network.loadingFinished",
-                            "Network.loadingFailed",
-                        ]:
-                            request_id = params.get("requestId")
-
-                            if request_id:
-                                all_events = self.network_util.get_all_events()
-
-                                for event in all_events:
-                                    if event.request_id == request_id:
-                                        log_entry = self.network_util.format_network_log(event)
-                                        self.add_log_entry(log_entry, "network")
-
-                                        if self.api_client and self.api_client.session_id:
-                                            try:
-                                                await self.api_client.create_trace(
-                                                    "network", log_entry
-                                                )
-                                            except Exception as api_e:
-                                                print(
-                                                    f"[DEBUG] Failed to send network trace to API: {api_e}"
-                                                )
-                                        break
-                except Exception as e:
-                    print(f"[DEBUG] Error handling network event: {e}")
-
             if method == "Page.screencastFrame":
                 try:
                     frame_data = msg.get("params", {})
@@ -341,6 +466,30 @@ class CDPObserver:
                     import traceback
 
                     traceback.print_exc()
+                return
+
+            if method == "Page.screencastVisibilityChanged":
+                # Chrome reports a tab being shown or hidden on its screencast session; this
+                # is the activation signal the active track follows
+                params = msg.get("params", {})
+                session_id = msg.get("sessionId")
+                if isinstance(params, dict) and session_id:
+                    if params.get("visible"):
+                        self.screencast_util.set_active_session(session_id)
+                    else:
+                        self.screencast_util.deactivate_session(session_id)
+                return
+
+            if method and method.startswith("Network."):
+                params = msg.get("params", {})
+                if isinstance(params, dict):
+                    self._network_batch.append((method, params, msg.get("sessionId")))
+                    if self._network_flush_task is None or self._network_flush_task.done():
+                        self._network_flush_task = asyncio.create_task(self._flush_network_events())
+                    elif len(self._network_batch) >= MAX_NETWORK_BATCH:
+                        # Stop reading from the socket until the backlog is applied
+                        await asyncio.shield(self._network_flush_task)
+                return
 
             if method == "Target.targetCreated":
                 try:
@@ -378,6 +527,7 @@ class CDPObserver:
                             await self.screencast_client.send(
                                 "Network.enable", session_id=session_id
                             )
+                            await self.network_util.apply_blocked_urls(session_id)
                             await self.screencast_client.send("Page.enable", session_id=session_id)
 
                             if (
@@ -395,6 +545,21 @@ class CDPObserver:
 
                     traceback.print_exc()
 
+            if method == "Target.detachedFromTarget":
+                try:
+                    params = msg.get("params", {})
+                    if isinstance(params, dict):
+                        session_id = params.get("sessionId")
+                        target_id = params.get("targetId")
+
+                        if target_id:
+                            self.screencast_client.remove_session(target_id)
+                        if session_id:
+                            self.screencast_util.remove_session(session_id)
+                            self.network_util.remove_session(session_id)
+                except Exception as e:
+                    print(f"[DEBUG] Error handling target detached: {e}")
+
     def add_log_entry(self, log_entry: str, log_type: str) -> None:
         """Add a log entry for VLM evaluation.
 
@@ -413,6 +578,18 @@ class CDPObserver:
         if log_type == "final":
             self.final_result = log_entry
 
+    def add_action(self, label: str, timestamp: Optional[float] = None) -> int:
+        """Record an agent action for request correlation.
+
+        Args:
+            label: Action description, e.g. the tool log line
+            timestamp: Host time.time() at which the action was logged (finished)
+
+        Returns:
+            Index of the action
+        """
+        return self.action_index.add_action(label, timestamp)
+
     async def run_vlm_evaluation(self) -> EvaluationResult | None:
         """Run VLM evaluation on collected data."""
         openai_api_key = os.environ.get("OPENAI_API_KEY")
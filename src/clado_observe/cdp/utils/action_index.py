@@ -0,0 +1,116 @@
+"""
+Action Index Utility
+
+Links agent actions to the network requests they caused. Actions are recorded when they
+are logged, which is after they ran, so an action's causal window runs from the previous
+action's log line to its own. Actions and requests are kept in time-sorted arrays and
+lookups in either direction are bisect queries. Requests caused by another request (CORS
+preflights via initiator.requestId, parser-initiated subresources of a navigation via
+loaderId) inherit that request's start time, so they stay with the action that started
+the navigation even when they begin after it was logged.
+
+All times are host wall-clock seconds (time.time()); browser timestamps are not used, so
+a skewed remote browser clock does not move requests between actions.
+"""
+
+import math
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+class ActionIndex(Generic[K]):
+    """
+    Time-indexed mapping between actions and request keys.
+    """
+
+    def __init__(self) -> None:
+        self.action_times: List[float] = []
+        self.action_labels: List[str] = []
+
+        self._request_times: List[Tuple[float, int]] = []
+        self._request_keys: Dict[int, K] = {}
+        self._request_start: Dict[K, Tuple[float, int]] = {}
+        self._sequence = 0
+
+    def add_action(self, label: str, timestamp: Optional[float] = None) -> int:
+        """
+        Record an action.
+
+        Args:
+            label: Action description, e.g. the tool log line
+            timestamp: Host time the action was logged, i.e. its end (now if not provided)
+
+        Returns:
+            Index of the action
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.action_times and timestamp < self.action_times[-1]:
+            timestamp = self.action_times[-1]
+        self.action_times.append(timestamp)
+        self.action_labels.append(label)
+        return len(self.action_times) - 1
+
+    def add_request(self, key: K, timestamp: float, parent: Optional[K] = None) -> None:
+        """
+        Record the start of a request.
+
+        Args:
+            key: Request key
+            timestamp: Host time the request was seen
+            parent: Key of the request that caused this one, if known
+        """
+        if key in self._request_start:
+            return
+
+        parent_start = self._request_start.get(parent) if parent is not None else None
+        start = (parent_start[0] if parent_start else timestamp, self._sequence)
+        self._sequence += 1
+
+        self._request_start[key] = start
+        self._request_keys[start[1]] = key
+        insort(self._request_times, start)
+
+    def remove_request(self, key: K) -> None:
+        """Forget a request, e.g. when its network event is evicted."""
+        start = self._request_start.pop(key, None)
+        if start is None:
+            return
+        del self._request_keys[start[1]]
+        position = bisect_left(self._request_times, start)
+        if position < len(self._request_times) and self._request_times[position] == start:
+            del self._request_times[position]
+
+    def action_for_request(self, key: K) -> Optional[int]:
+        """Index of the action whose window contains the request, or None if no action has
+        been logged since it started."""
+        start = self._request_start.get(key)
+        if start is None:
+            return None
+        index = bisect_left(self.action_times, start[0])
+        return index if index < len(self.action_times) else None
+
+    def requests_for_action(self, index: int) -> List[K]:
+        """Keys of the requests in an action's causal window, in start order."""
+        if not 0 <= index < len(self.action_times):
+            raise IndexError(f"No action {index}")
+
+        lo = 0
+        if index > 0:
+            lo = bisect_right(self._request_times, (self.action_times[index - 1], math.inf))
+        hi = bisect_right(self._request_times, (self.action_times[index], math.inf))
+        return [self._request_keys[sequence] for _, sequence in self._request_times[lo:hi]]
+
+    def __len__(self) -> int:
+        return len(self.action_times)
+
+    def clear(self) -> None:
+        """Drop all actions and requests."""
+        self.action_times.clear()
+        self.action_labels.clear()
+        self._request_times.clear()
+        self._request_keys.clear()
+        self._request_start.clear()
+        self._sequence = 0
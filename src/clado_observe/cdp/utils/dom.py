@@ -7,9 +7,11 @@ for visibility, clickability, cursor styles, and other layout information.
 
 import asyncio
 import logging
+from functools import partial
 from typing import Any, Dict, Optional, List
 
 from .base_client import BaseCDPClient
+from .fanout import fan_out
 
 SnapshotLookup = Dict[int, Any]
 RawSnapshot = Dict[str, Any]
@@ -92,21 +94,26 @@ class DOMUtil:
 
     async def capture_snapshot_from_all_pages(
         self,
+        max_concurrency: int = 4,
+        timeout_s: float = 15.0,
     ) -> Dict[str, SnapshotLookup]:
         """
-        Capture DOM snapshots from all attached page sessions.
+        Capture DOM snapshots from all attached page sessions concurrently.
 
         Args:
+            max_concurrency: Maximum number of pages captured at once
+            timeout_s: Overall deadline; pages not captured in time map to an empty lookup
 
         Returns:
             Dictionary mapping target_id to enhanced snapshot lookup
         """
-        snapshots = {}
-        for target_id, session_id in self.client.get_session_ids().items():
-            snapshot_data = await self.capture_snapshot(
-                session_id=session_id,
-            )
-            snapshots[target_id] = snapshot_data
+        jobs = {
+            target_id: partial(self.capture_snapshot, session_id=session_id)
+            for target_id, session_id in self.client.get_session_ids().items()
+        }
+        snapshots: Dict[str, SnapshotLookup] = await fan_out(
+            jobs, default_factory=dict, max_concurrency=max_concurrency, timeout_s=timeout_s
+        )
         return snapshots
 
     def _parse_rare_boolean_data(self, rare_data: Dict[str, Any], index: int) -> Optional[bool]:
@@ -0,0 +1,69 @@
+"""
+Fan-out Utility
+
+Runs one capture per page session concurrently with bounded parallelism and a single
+overall deadline, returning whatever finished in time.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, TypeVar
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+logger = logging.getLogger(__name__)
+
+
+async def fan_out(
+    jobs: Dict[K, Callable[[], Awaitable[V]]],
+    default_factory: Callable[[], V],
+    max_concurrency: int = 4,
+    timeout_s: float = 10.0,
+) -> Dict[K, V]:
+    """
+    Run jobs concurrently and collect their results by key.
+
+    Args:
+        jobs: Mapping of key to a zero-argument coroutine factory
+        default_factory: Called once per job that fails or misses the deadline to build
+            its result
+        max_concurrency: Maximum number of jobs running at once
+        timeout_s: Overall deadline for all jobs
+
+    Returns:
+        Dictionary mapping every key to its result, or to a default if it did not finish
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+
+    if not jobs:
+        return {}
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(job: Callable[[], Awaitable[V]]) -> V:
+        async with semaphore:
+            return await job()
+
+    tasks = {asyncio.create_task(_run(job)): key for key, job in jobs.items()}
+    done, pending = await asyncio.wait(tasks, timeout=timeout_s)
+
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(
+            f"{len(pending)}/{len(tasks)} page captures missed the {timeout_s}s deadline"
+        )
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    finished: Dict[K, V] = {}
+    for task in done:
+        key = tasks[task]
+        if task.exception() is not None:
+            logger.debug(f"Page capture for {key} failed: {task.exception()}")
+            continue
+        finished[key] = task.result()
+
+    return {key: finished[key] if key in finished else default_factory() for key in jobs}
@@ -0,0 +1,150 @@
+"""
+Frame Pipeline Utility
+
+Bounded in-flight queue between screencast frame receipt and frame storage.
+Frames are acknowledged to Chrome before they enter the pipeline, so a slow consumer
+drops frames according to the configured policy instead of throttling capture.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Literal, Optional
+
+DropPolicy = Literal["drop_oldest", "drop_newest"]
+FrameConsumer = Callable[[dict], Awaitable[None]]
+
+
+logger = logging.getLogger(__name__)
+
+
+class FramePipeline:
+    """
+    Bounded, single-consumer frame queue with drop counters.
+    """
+
+    def __init__(
+        self,
+        consumer: FrameConsumer,
+        max_in_flight: int = 64,
+        drop_policy: DropPolicy = "drop_oldest",
+    ) -> None:
+        """
+        Initialize FramePipeline.
+
+        Args:
+            consumer: Coroutine called for every frame that leaves the queue
+            max_in_flight: Maximum number of frames waiting for the consumer
+            drop_policy: "drop_oldest" evicts the oldest queued frame when full,
+                "drop_newest" rejects the incoming frame
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        if drop_policy not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+
+        self.consumer = consumer
+        self.max_in_flight = max_in_flight
+        self.drop_policy = drop_policy
+
+        self._queue: Deque[dict] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_stored = 0
+        self.frames_encoded = 0
+
+    def start(self) -> None:
+        """Start the consumer task on the running event loop."""
+        if self._worker and not self._worker.done():
+            return
+
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._worker = asyncio.create_task(self._run())
+
+    def submit(self, frame: dict) -> bool:
+        """
+        Enqueue a frame without blocking.
+
+        Returns:
+            True if the frame was queued, False if it was dropped
+        """
+        self.frames_received += 1
+
+        if len(self._queue) >= self.max_in_flight:
+            self.frames_dropped += 1
+            if self.drop_policy == "drop_newest":
+                return False
+            self._queue.popleft()
+
+        self._queue.append(frame)
+        if self._idle is not None:
+            self._idle.clear()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def mark_encoded(self, count: int) -> None:
+        """Record frames that made it into an encoded output."""
+        self.frames_encoded += count
+
+    async def drain(self, timeout: float = 5.0) -> None:
+        """Wait until every queued frame has been handed to the consumer."""
+        if self._idle is None or not self._worker or self._worker.done():
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Frame pipeline drain timed out with {len(self._queue)} frames queued")
+
+    async def stop(self) -> None:
+        """Stop the consumer task. Frames still queued are discarded."""
+        if self._worker and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+        self._queue.clear()
+
+    def reset(self) -> None:
+        """Reset queue contents and counters for a new recording."""
+        self._queue.clear()
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_stored = 0
+        self.frames_encoded = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get pipeline counters."""
+        return {
+            "frames_received": self.frames_received,
+            "frames_dropped": self.frames_dropped,
+            "frames_stored": self.frames_stored,
+            "frames_encoded": self.frames_encoded,
+            "in_flight": len(self._queue),
+            "max_in_flight": self.max_in_flight,
+        }
+
+    async def _run(self) -> None:
+        """Consumer loop."""
+        assert self._wakeup is not None and self._idle is not None
+
+        while True:
+            while not self._queue:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            frame = self._queue.popleft()
+            try:
+                await self.consumer(frame)
+                self.frames_stored += 1
+            except Exception as e:
+                logger.debug(f"Frame consumer failed: {e}")
@@ -0,0 +1,270 @@
+"""
+HAR Export Utility
+
+Streams completed network events as a HAR 1.2 log. Entries are serialized and written
+one at a time as requests complete, to a file or an async sink, so the whole log is
+never held in memory. The detailed CDP response timing is mapped onto HAR timings.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from importlib import metadata
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TextIO
+from urllib.parse import parse_qsl, urlsplit
+
+from .network import NetworkEvent
+
+HARSink = Callable[[str], Awaitable[None]]
+
+
+logger = logging.getLogger(__name__)
+
+HAR_VERSION = "1.2"
+
+
+def _creator_version() -> str:
+    try:
+        return metadata.version("clado-observe")
+    except metadata.PackageNotFoundError:
+        return "0.0.0"
+
+
+def _name_value_list(values: Dict[str, str]) -> List[Dict[str, str]]:
+    return [{"name": name, "value": str(value)} for name, value in values.items()]
+
+
+def _iso_time(seconds: float) -> str:
+    return (
+        datetime.fromtimestamp(seconds, tz=timezone.utc)
+        .isoformat(timespec="milliseconds")
+        .replace("+00:00", "Z")
+    )
+
+
+def _phase(timing: Dict[str, float], start: str, end: str) -> float:
+    """Duration of a CDP timing phase in ms, or -1 if the phase did not happen."""
+    start_ms = timing.get(start, -1)
+    end_ms = timing.get(end, -1)
+    if start_ms < 0 or end_ms < 0:
+        return -1
+    return max(end_ms - start_ms, 0.0)
+
+
+def har_timings(event: NetworkEvent) -> Dict[str, float]:
+    """
+    Build HAR timings for a network event.
+
+    CDP reports phase boundaries in ms relative to timing.requestTime; HAR wants phase
+    durations, with -1 for phases that did not apply (e.g. DNS on a reused connection).
+
+    Args:
+        event: The network event
+
+    Returns:
+        HAR timings object (blocked, dns, connect, ssl, send, wait, receive)
+    """
+    timing = event.timing
+    if not timing or "requestTime" not in timing:
+        wait = event.duration_ms or 0.0
+        receive = 0.0
+        if event.end_time and event.response_time:
+            receive = max((event.end_time - event.response_time) * 1000, 0.0)
+        return {
+            "blocked": -1,
+            "dns": -1,
+            "connect": -1,
+            "ssl": -1,
+            "send": 0.0,
+            "wait": wait,
+            "receive": receive,
+        }
+
+    request_time = timing["requestTime"]
+    queued_ms = max((request_time - event.timestamp) * 1000, 0.0) if event.timestamp else 0.0
+
+    first_start = next(
+        (
+            timing[name]
+            for name in ("dnsStart", "connectStart", "sendStart")
+            if timing.get(name, -1) >= 0
+        ),
+        0.0,
+    )
+    send_end = timing.get("sendEnd", 0.0)
+    headers_end = timing.get("receiveHeadersEnd", send_end)
+
+    receive = 0.0
+    if event.end_time:
+        receive = max((event.end_time - request_time) * 1000 - headers_end, 0.0)
+
+    return {
+        "blocked": queued_ms + first_start,
+        "dns": _phase(timing, "dnsStart", "dnsEnd"),
+        "connect": _phase(timing, "connectStart", "connectEnd"),
+        "ssl": _phase(timing, "sslStart", "sslEnd"),
+        "send": _phase(timing, "sendStart", "sendEnd"),
+        "wait": max(headers_end - send_end, 0.0),
+        "receive": receive,
+    }
+
+
+def har_entry(event: NetworkEvent) -> Dict[str, Any]:
+    """
+    Convert a network event to a HAR 1.2 entry.
+
+    Args:
+        event: The network event
+
+    Returns:
+        HAR entry dictionary
+    """
+    timings = har_timings(event)
+    # ssl is already included in connect, so it is not added to the total
+    total_ms = sum(
+        value for name, value in timings.items() if name != "ssl" and value and value > 0
+    )
+    http_version = event.http_version or ""
+    url = event.url or ""
+
+    request: Dict[str, Any] = {
+        "method": event.method or "GET",
+        "url": url,
+        "httpVersion": http_version,
+        "cookies": [],
+        "headers": _name_value_list(event.request_headers),
+        "queryString": [
+            {"name": name, "value": value}
+            for name, value in parse_qsl(urlsplit(url).query, keep_blank_values=True)
+        ],
+        "headersSize": -1,
+        "bodySize": len(event.request_body.encode("utf-8")) if event.request_body else 0,
+    }
+    if event.request_body:
+        request["postData"] = {
+            "mimeType": event.request_headers.get("Content-Type", ""),
+            "text": event.request_body,
+        }
+
+    content: Dict[str, Any] = {
+        "size": event.decoded_body_length or event.encoded_data_length or 0,
+        "mimeType": event.mime_type or "",
+    }
+    if event.response_body:
+        content["text"] = event.response_body
+        if event.response_body_base64:
+            content["encoding"] = "base64"
+    if event.response_body_path:
+        content["_file"] = event.response_body_path
+
+    response: Dict[str, Any] = {
+        "status": event.status_code or 0,
+        "statusText": event.status_text or "",
+        "httpVersion": http_version,
+        "cookies": [],
+        "headers": _name_value_list(event.response_headers),
+        "content": content,
+        "redirectURL": event.response_headers.get("Location")
+        or event.response_headers.get("location")
+        or "",
+        "headersSize": -1,
+        "bodySize": event.encoded_data_length if event.encoded_data_length is not None else -1,
+    }
+    if event.failed:
+        response["_error"] = event.failure_reason
+
+    entry: Dict[str, Any] = {
+        "startedDateTime": _iso_time(event.wall_time or event.timestamp),
+        "time": total_ms,
+        "request": request,
+        "response": response,
+        "cache": {},
+        "timings": timings,
+        "_requestId": event.request_id,
+        "_resourceType": event.resource_type,
+    }
+    if event.remote_ip_address:
+        entry["serverIPAddress"] = event.remote_ip_address.strip("[]")
+    if event.session_id:
+        entry["_sessionId"] = event.session_id
+    return entry
+
+
+class HARWriter:
+    """
+    Incremental HAR 1.2 writer.
+    """
+
+    def __init__(self, path: Optional[str] = None, sink: Optional[HARSink] = None) -> None:
+        """
+        Initialize HARWriter.
+
+        Args:
+            path: File the HAR log is written to
+            sink: Coroutine receiving the HAR document in chunks; used instead of a file
+        """
+        if (path is None) == (sink is None):
+            raise ValueError("Exactly one of path or sink must be provided")
+
+        self.path = path
+        self.sink = sink
+        self.entry_count = 0
+
+        self._file: Optional[TextIO] = None
+        self._started = False
+        self._closed = False
+        self._lock = asyncio.Lock()
+
+    async def add_event(self, event: NetworkEvent) -> None:
+        """Append a completed network event as a HAR entry."""
+        try:
+            entry = json.dumps(har_entry(event), separators=(",", ":"))
+        except Exception as e:
+            logger.debug(f"Failed to build HAR entry for {event.request_id}: {e}")
+            return
+
+        async with self._lock:
+            if self._closed:
+                return
+            chunk = entry if self.entry_count == 0 else "," + entry
+            await self._write(chunk)
+            self.entry_count += 1
+
+    async def close(self) -> Optional[str]:
+        """
+        Finish the HAR document.
+
+        Returns:
+            Path of the HAR file, or None when writing to a sink
+        """
+        async with self._lock:
+            if self._closed:
+                return self.path
+            await self._write("]}}\n")
+            self._closed = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        return self.path
+
+    async def _write(self, chunk: str) -> None:
+        """Write a chunk, emitting the log header first."""
+        if not self._started:
+            self._started = True
+            creator = {"name": "clado-observe", "version": _creator_version()}
+            header = (
+                '{"log":{"version":"'
+                + HAR_VERSION
+                + '","creator":'
+                + json.dumps(creator)
+                + ',"pages":[],"entries":['
+            )
+            if self.path is not None:
+                self._file = open(self.path, "w", encoding="utf-8")
+            chunk = header + chunk
+
+        if self._file is not None:
+            self._file.write(chunk)
+        elif self.sink is not None:
+            await self.sink(chunk)
@@ -0,0 +1,172 @@
+"""
+Latency Sketch Utility
+
+Mergeable quantile sketch with relative-error guarantees (DDSketch-style log buckets).
+Values land in logarithmically sized buckets, so memory stays bounded by the dynamic
+range rather than the number of samples, and sketches from different runs merge exactly
+by summing bucket counts.
+
+Bins are kept sorted with a Fenwick tree of their counts, so adding a value to an existing
+bin and answering a quantile both take O(log bins); only a new bin rebuilds the tree.
+"""
+
+import math
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional
+
+
+class LatencySketch:
+    """
+    Log-bucketed latency histogram with quantiles accurate to relative_accuracy.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-3) -> None:
+        """
+        Initialize LatencySketch.
+
+        Args:
+            relative_accuracy: Maximum relative error of reported quantiles
+            min_value: Values at or below this are counted in a single zero bucket
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        # Sorted bin indexes and a Fenwick tree (1-based) of their counts
+        self._indexes: List[int] = []
+        self._tree: List[int] = [0]
+
+    def add(self, value: float) -> None:
+        """Record a value."""
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+        if value <= self.min_value:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        if index in self.bins:
+            self.bins[index] += 1
+            self._tree_add(bisect_left(self._indexes, index) + 1, 1)
+        else:
+            self.bins[index] = 1
+            insort(self._indexes, index)
+            self._rebuild_tree()
+
+    def merge(self, other: "LatencySketch") -> None:
+        """Add the samples of another sketch with the same accuracy into this one."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        if other.min_value != self.min_value:
+            raise ValueError("Cannot merge sketches with different min_value")
+
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self._indexes = sorted(self.bins)
+        self._rebuild_tree()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile.
+
+        Args:
+            q: Quantile between 0 and 1
+
+        Returns:
+            The estimated value, or None if the sketch is empty
+        """
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+
+        # Descend the tree to the first bin whose cumulative count exceeds the rank
+        remaining = rank - self.zero_count
+        position = 0
+        step = 1 << (len(self._indexes).bit_length() - 1) if self._indexes else 0
+        while step:
+            next_position = position + step
+            if next_position < len(self._tree) and self._tree[next_position] <= remaining:
+                position = next_position
+                remaining -= self._tree[next_position]
+            step >>= 1
+        if position == len(self._indexes):
+            return self.max
+
+        value = 2 * self._gamma ** self._indexes[position] / (self._gamma + 1)
+        assert self.min is not None and self.max is not None
+        return min(max(value, self.min), self.max)
+
+    def percentiles(self) -> Dict[str, Optional[float]]:
+        """p50, p95 and p99 of the recorded values."""
+        return {
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the sketch, e.g. to merge runs into a fleet-level view."""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "min_value": self.min_value,
+            "bins": {str(index): count for index, count in self.bins.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencySketch":
+        """Rebuild a sketch serialized with to_dict."""
+        sketch = cls(data["relative_accuracy"], data.get("min_value", 1e-3))
+        sketch.bins = {int(index): count for index, count in data.get("bins", {}).items()}
+        sketch._indexes = sorted(sketch.bins)
+        sketch._rebuild_tree()
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        sketch.sum = data.get("sum", 0.0)
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        return sketch
+
+    def _tree_add(self, position: int, count: int) -> None:
+        while position < len(self._tree):
+            self._tree[position] += count
+            position += position & -position
+
+    def _rebuild_tree(self) -> None:
+        """Rebuild the Fenwick tree from the bins in O(bins)."""
+        tree = [0] + [self.bins[index] for index in self._indexes]
+        for position in range(1, len(tree)):
+            parent = position + (position & -position)
+            if parent < len(tree):
+                tree[parent] += tree[position]
+        self._tree = tree
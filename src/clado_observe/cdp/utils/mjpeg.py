@@ -0,0 +1,254 @@
+"""
+MJPEG Container Utility
+
+Muxes JPEG screencast frames directly into a Matroska (MKV) file with per-frame timestamps,
+without decoding or re-encoding them. Element sizes are patched when clusters and the file
+are closed; until then they are written as "unknown" so a truncated file stays playable.
+"""
+
+import logging
+import struct
+from typing import BinaryIO, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EBML_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+INFO_ID = 0x1549A966
+TIMECODE_SCALE_ID = 0x2AD7B1
+DURATION_ID = 0x4489
+MUXING_APP_ID = 0x4D80
+WRITING_APP_ID = 0x5741
+TRACKS_ID = 0x1654AE6B
+TRACK_ENTRY_ID = 0xAE
+TRACK_NUMBER_ID = 0xD7
+TRACK_UID_ID = 0x73C5
+TRACK_TYPE_ID = 0x83
+FLAG_LACING_ID = 0x9C
+CODEC_ID_ID = 0x86
+VIDEO_ID = 0xE0
+PIXEL_WIDTH_ID = 0xB0
+PIXEL_HEIGHT_ID = 0xBA
+CLUSTER_ID = 0x1F43B675
+CLUSTER_TIMECODE_ID = 0xE7
+SIMPLE_BLOCK_ID = 0xA3
+
+UNKNOWN_SIZE = b"\x01\xff\xff\xff\xff\xff\xff\xff"
+MAX_CLUSTER_MS = 5000
+MAX_CLUSTER_BYTES = 5 * 1024 * 1024
+
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _encode_id(element_id: int) -> bytes:
+    """Encode an EBML element ID (IDs already carry their length marker)."""
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+
+
+def _encode_size(size: int) -> bytes:
+    """Encode an EBML data size as a variable-length integer."""
+    for length in range(1, 9):
+        if size < (1 << (7 * length)) - 1:
+            return (size | (1 << (7 * length))).to_bytes(length, "big")
+    raise ValueError(f"EBML size too large: {size}")
+
+
+def _element(element_id: int, data: bytes) -> bytes:
+    return _encode_id(element_id) + _encode_size(len(data)) + data
+
+
+def _uint_element(element_id: int, value: int) -> bytes:
+    return _element(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+def _string_element(element_id: int, value: str) -> bytes:
+    return _element(element_id, value.encode("utf-8"))
+
+
+def jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Read the pixel dimensions of a JPEG image from its SOF marker.
+
+    Args:
+        data: Raw JPEG bytes
+
+    Returns:
+        (width, height) tuple, or None if the data is not a parseable JPEG
+    """
+    if len(data) < 4 or data[0:2] != b"\xff\xd8":
+        return None
+
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+
+        segment_length = struct.unpack(">H", data[offset + 2 : offset + 4])[0]
+        if marker in JPEG_SOF_MARKERS and offset + 9 <= len(data):
+            height, width = struct.unpack(">HH", data[offset + 5 : offset + 9])
+            return width, height
+        offset += 2 + segment_length
+
+    return None
+
+
+class MJPEGWriter:
+    """
+    Streaming Matroska writer for a single V_MJPEG video track.
+    """
+
+    def __init__(self, path: str, width: int = 0, height: int = 0) -> None:
+        """
+        Initialize MJPEGWriter.
+
+        Args:
+            path: Output file path
+            width: Frame width in pixels, read from the first frame when 0
+            height: Frame height in pixels, read from the first frame when 0
+        """
+        self.path = path
+        self.width = width
+        self.height = height
+
+        self.frame_count = 0
+        self.start_timestamp: Optional[float] = None
+        self._last_timecode_ms = 0
+
+        self._file: Optional[BinaryIO] = None
+        self._segment_data_offset = 0
+        self._duration_offset = 0
+        self._cluster_offset: Optional[int] = None
+        self._cluster_timecode_ms = 0
+
+    def write_frame(self, jpeg_data: bytes, timestamp: float) -> None:
+        """
+        Append a JPEG frame.
+
+        Args:
+            jpeg_data: Raw JPEG bytes
+            timestamp: Capture timestamp in seconds
+        """
+        if self._file is None:
+            self._open(jpeg_data, timestamp)
+        assert self._file is not None and self.start_timestamp is not None
+
+        timecode_ms = max(int(round((timestamp - self.start_timestamp) * 1000)), 0)
+        timecode_ms = max(timecode_ms, self._last_timecode_ms)
+
+        if (
+            self._cluster_offset is None
+            or timecode_ms - self._cluster_timecode_ms > MAX_CLUSTER_MS
+            or self._file.tell() - self._cluster_offset > MAX_CLUSTER_BYTES
+        ):
+            self._start_cluster(timecode_ms)
+
+        relative_ms = timecode_ms - self._cluster_timecode_ms
+        block = b"\x81" + struct.pack(">hB", relative_ms, 0x80) + jpeg_data
+        self._file.write(_encode_id(SIMPLE_BLOCK_ID) + _encode_size(len(block)) + block)
+
+        self._last_timecode_ms = timecode_ms
+        self.frame_count += 1
+
+    def close(self, end_timestamp: Optional[float] = None) -> None:
+        """
+        Finish the file, patching cluster, segment and duration fields.
+
+        Args:
+            end_timestamp: Display end of the last frame in seconds, if known
+        """
+        if self._file is None:
+            return
+
+        try:
+            self._end_cluster()
+
+            duration_ms = float(self._last_timecode_ms)
+            if end_timestamp is not None and self.start_timestamp is not None:
+                duration_ms = max(duration_ms, (end_timestamp - self.start_timestamp) * 1000)
+            elif self.frame_count > 1:
+                duration_ms += self._last_timecode_ms / (self.frame_count - 1)
+
+            end = self._file.tell()
+            self._file.seek(self._segment_data_offset - 8)
+            self._file.write((end - self._segment_data_offset | (1 << 56)).to_bytes(8, "big"))
+            self._file.seek(self._duration_offset)
+            self._file.write(struct.pack(">d", duration_ms))
+        finally:
+            self._file.close()
+            self._file = None
+
+    def _open(self, first_frame: bytes, timestamp: float) -> None:
+        """Open the output file and write the header elements."""
+        if not self.width or not self.height:
+            self.width, self.height = jpeg_dimensions(first_frame) or (1280, 720)
+
+        self.start_timestamp = timestamp
+        self._file = open(self.path, "wb")
+
+        self._file.write(
+            _element(
+                EBML_ID,
+                _uint_element(0x4286, 1)
+                + _uint_element(0x42F7, 1)
+                + _uint_element(0x42F2, 4)
+                + _uint_element(0x42F3, 8)
+                + _string_element(0x4282, "matroska")
+                + _uint_element(0x4287, 4)
+                + _uint_element(0x4285, 2),
+            )
+        )
+
+        self._file.write(_encode_id(SEGMENT_ID) + UNKNOWN_SIZE)
+        self._segment_data_offset = self._file.tell()
+
+        duration_element = _encode_id(DURATION_ID) + _encode_size(8)
+        info = (
+            _uint_element(TIMECODE_SCALE_ID, 1_000_000)
+            + _string_element(MUXING_APP_ID, "clado-observe")
+            + _string_element(WRITING_APP_ID, "clado-observe")
+        )
+        info_header = _encode_id(INFO_ID) + _encode_size(len(info) + len(duration_element) + 8)
+        self._file.write(info_header + info + duration_element)
+        self._duration_offset = self._file.tell()
+        self._file.write(struct.pack(">d", 0.0))
+
+        video = _uint_element(PIXEL_WIDTH_ID, self.width) + _uint_element(
+            PIXEL_HEIGHT_ID, self.height
+        )
+        track_entry = (
+            _uint_element(TRACK_NUMBER_ID, 1)
+            + _uint_element(TRACK_UID_ID, 1)
+            + _uint_element(TRACK_TYPE_ID, 1)
+            + _uint_element(FLAG_LACING_ID, 0)
+            + _string_element(CODEC_ID_ID, "V_MJPEG")
+            + _element(VIDEO_ID, video)
+        )
+        self._file.write(_element(TRACKS_ID, _element(TRACK_ENTRY_ID, track_entry)))
+
+    def _start_cluster(self, timecode_ms: int) -> None:
+        """Close the current cluster and start a new one at the given timecode."""
+        assert self._file is not None
+
+        self._end_cluster()
+        self._file.write(_encode_id(CLUSTER_ID) + UNKNOWN_SIZE)
+        self._cluster_offset = self._file.tell()
+        self._cluster_timecode_ms = timecode_ms
+        self._file.write(_uint_element(CLUSTER_TIMECODE_ID, timecode_ms))
+
+    def _end_cluster(self) -> None:
+        """Patch the size of the open cluster."""
+        if self._file is None or self._cluster_offset is None:
+            return
+
+        end = self._file.tell()
+        self._file.seek(self._cluster_offset - 8)
+        self._file.write((end - self._cluster_offset | (1 << 56)).to_bytes(8, "big"))
+        self._file.seek(end)
+        self._cluster_offset = None
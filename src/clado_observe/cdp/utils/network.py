@@ -3,39 +3,158 @@ Network Capture Utility
 
 Handles network request/response capture and analysis using Chrome DevTools Protocol.
 Collects network traffic data including requests, responses, headers, timing, etc.
+Completed events are kept in a bounded ring; every completed event is folded into running
+totals when it completes, so summaries stay correct after old events are evicted.
+
+CDP request ids are only unique within a target, so events are keyed by
+(session_id, request_id) and per-session views and summaries are available.
+
+Response bodies are captured without pausing requests: after loadingFinished, matching
+requests are queued to a bounded worker pool that calls Network.getResponseBody, with
+MIME/URL/size filters, per-body and per-session byte caps, and large bodies spilled to disk.
+
+Statistics are kept incrementally: every completed event updates counters and a mergeable
+latency sketch overall and per host, resource type, status class and session. Hosts are
+capped at max_stat_hosts; requests to further hosts are counted under "other".
+
+An optional NetworkFilter drops or samples requests at requestWillBeSent, before a
+NetworkEvent is allocated; outcome-dependent rules are decided on completion.
+
+State updates are synchronous and lock-free (all callers share one event loop), and raw
+events can be applied in batches with apply_network_events before callbacks run.
+
+WebSocket, EventSource and WebTransport connections are tracked separately as
+ChannelConnection objects with bounded per-connection message rings.
 """
 
 import asyncio
+import base64
+import fnmatch
 import logging
-from typing import Dict, List, Optional, Any
+import os
+import sys
+import shutil
+import tempfile
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Any, Tuple
+from urllib.parse import urlsplit
 from datetime import datetime
 
 from .base_client import BaseCDPClient
+from .latency import LatencySketch
+from .network_channels import (
+    CHANNEL_RESOURCE_TYPES,
+    WEBSOCKET_TEXT_OPCODE,
+    ChannelCaptureOptions,
+    ChannelConnection,
+    ChannelKind,
+    MessageDirection,
+)
+from .network_filter import NetworkFilter
 
 logger = logging.getLogger(__name__)
 
+# (method, params, session_id) as received from CDP
+RawNetworkEvent = Tuple[str, Dict[str, Any], Optional[str]]
+
+NETWORK_STATE_EVENTS = (
+    "Network.requestWillBeSent",
+    "Network.responseReceived",
+    "Network.loadingFinished",
+    "Network.loadingFailed",
+)
+
+DEFAULT_BODY_MIME_TYPES = (
+    "application/json",
+    "application/graphql",
+    "application/x-www-form-urlencoded",
+    "application/xml",
+    "text/",
+)
+
+STAT_DIMENSIONS = ("host", "resource_type", "status_class", "session")
+
+# Host totals bucket of hosts beyond max_stat_hosts
+OTHER_HOST = "other"
+
+# (session_id, request_id); session_id is "" for events from the browser-level connection
+NetworkEventKey = Tuple[str, str]
+
+
+def intern_headers(headers: Dict[str, str]) -> Dict[str, str]:
+    """Return headers with interned names, so repeated names share one string."""
+    return {sys.intern(name): value for name, value in headers.items()}
+
 
 class NetworkEvent:
     """Represents a network event with request and response data."""
 
-    def __init__(self, request_id: str, timestamp: float):
+    __slots__ = (
+        "request_id",
+        "session_id",
+        "timestamp",
+        "wall_time",
+        "method",
+        "url",
+        "request_headers",
+        "request_body",
+        "resource_type",
+        "loader_id",
+        "initiator_type",
+        "initiator_request_id",
+        "status_code",
+        "status_text",
+        "response_headers",
+        "response_body",
+        "response_body_base64",
+        "response_body_truncated",
+        "response_body_path",
+        "mime_type",
+        "http_version",
+        "remote_ip_address",
+        "timing",
+        "response_time",
+        "end_time",
+        "duration_ms",
+        "encoded_data_length",
+        "decoded_body_length",
+        "failed",
+        "failure_reason",
+        "sampled",
+        "body_pending",
+    )
+
+    def __init__(self, request_id: str, timestamp: float, session_id: Optional[str] = None):
         self.request_id = request_id
+        self.session_id = session_id
         self.timestamp = timestamp
-        self.request_time = datetime.fromtimestamp(timestamp).isoformat()
+        self.wall_time: Optional[float] = None
 
         self.method: Optional[str] = None
         self.url: Optional[str] = None
         self.request_headers: Dict[str, str] = {}
         self.request_body: Optional[str] = None
         self.resource_type: Optional[str] = None
+        self.loader_id: Optional[str] = None
+        self.initiator_type: Optional[str] = None
+        self.initiator_request_id: Optional[str] = None
 
         self.status_code: Optional[int] = None
         self.status_text: Optional[str] = None
         self.response_headers: Dict[str, str] = {}
         self.response_body: Optional[str] = None
+        self.response_body_base64: bool = False
+        self.response_body_truncated: bool = False
+        self.response_body_path: Optional[str] = None
         self.mime_type: Optional[str] = None
+        self.http_version: Optional[str] = None
+        self.remote_ip_address: Optional[str] = None
+        self.timing: Optional[Dict[str, float]] = None
 
+        self.body_pending = False
         self.response_time: Optional[float] = None
+        self.end_time: Optional[float] = None
         self.duration_ms: Optional[float] = None
         self.encoded_data_length: Optional[int] = None
         self.decoded_body_length: Optional[int] = None
@@ -43,10 +162,41 @@ class NetworkEvent:
         self.failed: bool = False
         self.failure_reason: Optional[str] = None
 
+        # False when a filter rule sampled the event out, None until an outcome rule decides
+        self.sampled: Optional[bool] = True
+
+    @property
+    def key(self) -> NetworkEventKey:
+        """Session-qualified key of this event."""
+        return (self.session_id or "", self.request_id)
+
+    @property
+    def host(self) -> str:
+        """Host name of the request URL."""
+        try:
+            return urlsplit(self.url or "").hostname or ""
+        except ValueError:
+            return ""
+
+    @property
+    def status_class(self) -> str:
+        """Status class such as "2xx", or "failed"/"unknown"."""
+        if self.failed:
+            return "failed"
+        if not self.status_code:
+            return "unknown"
+        return f"{self.status_code // 100}xx"
+
+    @property
+    def request_time(self) -> str:
+        """ISO formatted request timestamp."""
+        return datetime.fromtimestamp(self.timestamp).isoformat()
+
     def to_dict(self) -> Dict[str, Any]:
         """Convert network event to dictionary for serialization."""
         data = {
             "request_id": self.request_id,
+            "session_id": self.session_id,
             "timestamp": self.timestamp,
             "request_time": self.request_time,
             "method": self.method,
@@ -71,30 +221,230 @@ class NetworkEvent:
             data["request_body"] = self.request_body
         if self.response_body:
             data["response_body"] = self.response_body
+            if self.response_body_base64:
+                data["response_body_base64"] = True
+        if self.response_body_path:
+            data["response_body_path"] = self.response_body_path
+        if self.response_body_truncated:
+            data["response_body_truncated"] = True
 
         return {k: v for k, v in data.items() if v is not None}
 
 
+@dataclass
+class BodyCaptureOptions:
+    """Which response bodies to capture and how much of them to keep."""
+
+    mime_types: Tuple[str, ...] = DEFAULT_BODY_MIME_TYPES
+    url_patterns: Tuple[str, ...] = ()
+    max_fetch_bytes: int = 5 * 1024 * 1024
+    max_body_bytes: int = 1024 * 1024
+    max_session_bytes: int = 50 * 1024 * 1024
+    spill_bytes: int = 64 * 1024
+    body_dir: Optional[str] = None
+    max_workers: int = 4
+    max_queued: int = 256
+    fetch_timeout_s: float = 10.0
+
+    def matches(self, event: "NetworkEvent") -> bool:
+        """
+        Whether the body of a finished request should be fetched.
+
+        mime_types are prefixes ("text/" matches "text/html"); url_patterns are fnmatch
+        globs, and an empty tuple matches every URL.
+        """
+        if event.failed or not event.session_id:
+            return False
+        if event.encoded_data_length and event.encoded_data_length > self.max_fetch_bytes:
+            return False
+        mime_type = (event.mime_type or "").lower()
+        if self.mime_types and not mime_type.startswith(self.mime_types):
+            return False
+        if self.url_patterns and not any(
+            fnmatch.fnmatchcase(event.url or "", pattern) for pattern in self.url_patterns
+        ):
+            return False
+        return True
+
+
+class NetworkTotals:
+    """Running aggregates over completed network events."""
+
+    __slots__ = (
+        "requests",
+        "failed",
+        "data_transferred",
+        "duration_sum_ms",
+        "duration_count",
+        "by_type",
+        "by_status",
+        "latency",
+    )
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.failed = 0
+        self.data_transferred = 0
+        self.duration_sum_ms = 0.0
+        self.duration_count = 0
+        self.by_type: Dict[str, int] = {}
+        self.by_status: Dict[str, int] = {}
+        self.latency = LatencySketch()
+
+    def add(self, event: NetworkEvent) -> None:
+        """Fold an event into the totals."""
+        self.requests += 1
+        if event.failed:
+            self.failed += 1
+        self.data_transferred += event.encoded_data_length or 0
+        if event.duration_ms:
+            self.duration_sum_ms += event.duration_ms
+            self.duration_count += 1
+            self.latency.add(event.duration_ms)
+        if event.resource_type:
+            self.by_type[event.resource_type] = self.by_type.get(event.resource_type, 0) + 1
+        if event.status_code:
+            status_group = f"{event.status_code // 100}xx"
+            self.by_status[status_group] = self.by_status.get(status_group, 0) + 1
+
+    def merge(self, other: "NetworkTotals") -> None:
+        """Add another set of totals, e.g. from a different run, into these."""
+        self.requests += other.requests
+        self.failed += other.failed
+        self.data_transferred += other.data_transferred
+        self.duration_sum_ms += other.duration_sum_ms
+        self.duration_count += other.duration_count
+        for resource_type, count in other.by_type.items():
+            self.by_type[resource_type] = self.by_type.get(resource_type, 0) + count
+        for status_group, count in other.by_status.items():
+            self.by_status[status_group] = self.by_status.get(status_group, 0) + count
+        self.latency.merge(other.latency)
+
+    def copy(self) -> "NetworkTotals":
+        """Return an independent copy of the counters (the latency sketch starts empty)."""
+        totals = NetworkTotals()
+        totals.requests = self.requests
+        totals.failed = self.failed
+        totals.data_transferred = self.data_transferred
+        totals.duration_sum_ms = self.duration_sum_ms
+        totals.duration_count = self.duration_count
+        totals.by_type = dict(self.by_type)
+        totals.by_status = dict(self.by_status)
+        return totals
+
+    def to_dict(self, include_sketch: bool = False) -> Dict[str, Any]:
+        """
+        Convert the totals to a dictionary.
+
+        Args:
+            include_sketch: Include the serialized latency sketch for later merging
+        """
+        data: Dict[str, Any] = {
+            "requests": self.requests,
+            "failed": self.failed,
+            "failure_rate": self.failed / self.requests if self.requests else 0.0,
+            "data_transferred": self.data_transferred,
+            "average_duration_ms": (
+                self.duration_sum_ms / self.duration_count if self.duration_count else 0
+            ),
+            "duration_percentiles_ms": self.latency.percentiles(),
+        }
+        if include_sketch:
+            data["latency_sketch"] = self.latency.to_dict()
+        return data
+
+
 class NetworkUtil:
     """
     Utility for capturing and managing network traffic via CDP.
     """
 
-    def __init__(self, client: BaseCDPClient, capture_bodies: bool = False):
+    def __init__(
+        self,
+        client: BaseCDPClient,
+        capture_bodies: bool = False,
+        max_completed_events: int = 5000,
+        body_capture: Optional[BodyCaptureOptions] = None,
+        network_filter: Optional[NetworkFilter] = None,
+        channel_capture: Optional[ChannelCaptureOptions] = None,
+        max_stat_hosts: int = 200,
+    ):
         """
         Initialize NetworkUtil.
 
         Args:
             client: The base CDP client for communication
-            capture_bodies: Whether to capture request/response bodies (can be memory intensive)
+            capture_bodies: Whether to capture response bodies after requests finish
+            max_completed_events: Number of completed events retained; older ones are evicted
+                but still counted in get_events_summary
+            body_capture: Body filters and limits (defaults used when capture_bodies is set)
+            network_filter: Rules deciding which requests are tracked and reported
+            channel_capture: Limits for WebSocket/EventSource/WebTransport message capture
+            max_stat_hosts: Number of hosts with their own totals; requests to further hosts
+                are counted under "other"
         """
         self.client = client
-        self.capture_bodies = capture_bodies
+        self.capture_bodies = capture_bodies or body_capture is not None
+        self.body_capture = body_capture or BodyCaptureOptions()
+        self.max_completed_events = max_completed_events
+        self.max_stat_hosts = max_stat_hosts
+        self.network_filter = network_filter
+        self.requests_filtered = 0
+        self.channel_capture = channel_capture or ChannelCaptureOptions()
+        self._channels: Dict[NetworkEventKey, ChannelConnection] = {}
+        self._closed_channels: Deque[NetworkEventKey] = deque()
+        # Channels whose request was dropped by the filter; used as an ordered set
+        self._dropped_channels: Dict[NetworkEventKey, None] = {}
+
+        self._events: Dict[NetworkEventKey, NetworkEvent] = {}
+        self._completed_events: Deque[NetworkEvent] = deque()
+        self._index: Dict[NetworkEventKey, NetworkEvent] = {}
+        self._completed_totals = NetworkTotals()
+        self._dimension_totals: Dict[str, Dict[str, NetworkTotals]] = {
+            dimension: {} for dimension in STAT_DIMENSIONS
+        }
 
-        self._events: Dict[str, NetworkEvent] = {}
-        self._completed_events: List[NetworkEvent] = []
+        self._handlers: Dict[
+            str, Callable[[Dict[str, Any], Optional[str]], Optional[NetworkEvent]]
+        ] = {
+            "Network.requestWillBeSent": self._handle_request_will_be_sent,
+            "Network.responseReceived": self._handle_response_received,
+            "Network.loadingFinished": self._handle_loading_finished,
+            "Network.loadingFailed": self._handle_loading_failed,
+            "Network.requestServedFromCache": self._handle_served_from_cache,
+            "Network.webSocketCreated": self._handle_web_socket_created,
+            "Network.webSocketHandshakeResponseReceived": self._handle_web_socket_handshake,
+            "Network.webSocketFrameSent": self._handle_web_socket_frame_sent,
+            "Network.webSocketFrameReceived": self._handle_web_socket_frame_received,
+            "Network.webSocketFrameError": self._handle_web_socket_frame_error,
+            "Network.webSocketClosed": self._handle_channel_closed,
+            "Network.eventSourceMessageReceived": self._handle_event_source_message,
+            "Network.webTransportCreated": self._handle_web_transport_created,
+            "Network.webTransportConnectionEstablished": self._handle_web_transport_established,
+            "Network.webTransportClosed": self._handle_channel_closed,
+        }
 
-        self._lock = asyncio.Lock()
+        self._body_queue: Deque[NetworkEvent] = deque()
+        self._body_wakeup: Optional[asyncio.Event] = None
+        # Set while no body is queued or being fetched
+        self._body_idle: Optional[asyncio.Event] = None
+        # Spill directory; a temporary one is created on first use and removed on stop
+        self._body_dir = self.body_capture.body_dir
+        self._owns_body_dir = False
+        self._body_workers: List[asyncio.Task] = []
+        self._body_active: List[NetworkEvent] = []
+        self._session_body_bytes: Dict[str, int] = {}
+        self.bodies_captured = 0
+        self.bodies_skipped = 0
+
+        # Called with (method, event) after requestWillBeSent/responseReceived/
+        # loadingFinished/loadingFailed updated an event
+        self.on_state_change: Optional[Callable[[str, NetworkEvent], Awaitable[None]]] = None
+        # Called synchronously when a new request is tracked, after its request fields are set
+        self.on_request_started: Optional[Callable[[NetworkEvent], None]] = None
+        # Called synchronously when an event is no longer retained (evicted from the completed
+        # ring, dropped by the filter on completion, or dropped with its session)
+        self.on_event_evicted: Optional[Callable[[NetworkEvent], None]] = None
 
     async def enable_network_capture(self, session_id: str) -> None:
         """Enable network capture for a specific session."""
@@ -105,123 +455,484 @@ class NetworkUtil:
                 session_id=session_id,
             )
 
-            if self.capture_bodies:
-                await self.client.send(
-                    "Network.setRequestInterception",
-                    params={"patterns": [{"urlPattern": "*"}]},
-                    session_id=session_id,
-                )
+            await self.apply_blocked_urls(session_id)
 
             logger.debug(f"Network capture enabled for session {session_id}")
 
         except Exception as e:
             logger.error(f"Failed to enable network capture: {e}")
 
-    async def handle_network_event(self, method: str, params: Dict[str, Any]) -> None:
+    async def apply_blocked_urls(self, session_id: str) -> None:
+        """Send the filter's block rules to Chrome with Network.setBlockedURLs."""
+        if not self.network_filter:
+            return
+        patterns = self.network_filter.blocked_url_patterns()
+        if patterns:
+            await self.client.send(
+                "Network.setBlockedURLs", params={"urls": patterns}, session_id=session_id
+            )
+
+    async def handle_network_event(
+        self, method: str, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> Optional[NetworkEvent]:
         """
         Handle network-related CDP events.
 
         Args:
             method: The CDP event method name
             params: The event parameters
+            session_id: The CDP session the event was received on (msg["sessionId"])
+
+        Returns:
+            The network event updated by this CDP event, or None if none was affected
         """
-        async with self._lock:
-            try:
-                if method == "Network.requestWillBeSent":
-                    await self._handle_request_will_be_sent(params)
-                elif method == "Network.responseReceived":
-                    await self._handle_response_received(params)
-                elif method == "Network.loadingFinished":
-                    await self._handle_loading_finished(params)
-                elif method == "Network.loadingFailed":
-                    await self._handle_loading_failed(params)
-                elif method == "Network.requestServedFromCache":
-                    await self._handle_served_from_cache(params)
+        event = self.apply_network_event(method, params, session_id)
+        if (
+            event is not None
+            and event.sampled
+            and method in NETWORK_STATE_EVENTS
+            and not event.body_pending
+        ):
+            await self._notify_state_change(method, event)
+        return event
+
+    async def handle_network_events(self, batch: Iterable[RawNetworkEvent]) -> None:
+        """
+        Apply a batch of raw network events, then run state change callbacks in order.
+
+        Callbacks run after the whole batch is applied, so each request is reported once,
+        with its final state and the last method that changed it.
+
+        Args:
+            batch: (method, params, session_id) tuples, e.g. everything received in one tick
+        """
+        for method, event in self.apply_network_events(batch):
+            await self._notify_state_change(method, event)
 
+    def apply_network_event(
+        self, method: str, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> Optional[NetworkEvent]:
+        """
+        Apply one CDP network event to the state synchronously, without callbacks.
+
+        Returns:
+            The network event updated by this CDP event, or None if none was affected
+        """
+        handler = self._handlers.get(method)
+        if handler is None:
+            return None
+        try:
+            return handler(params, session_id)
+        except Exception as e:
+            logger.debug(f"Error handling network event {method}: {e}")
+            return None
+
+    def apply_network_events(
+        self, batch: Iterable[RawNetworkEvent]
+    ) -> List[Tuple[str, NetworkEvent]]:
+        """
+        Apply a batch of raw CDP network events in one pass, without callbacks.
+
+        Returns:
+            (method, event) pairs that are state changes to report, one per request with
+            the last method that changed it, in the order of those last changes
+        """
+        handlers = self._handlers
+        changes: Dict[NetworkEventKey, Tuple[str, NetworkEvent]] = {}
+        for method, params, session_id in batch:
+            handler = handlers.get(method)
+            if handler is None:
+                continue
+            try:
+                event = handler(params, session_id)
             except Exception as e:
                 logger.debug(f"Error handling network event {method}: {e}")
+                continue
+            if event is None or method not in NETWORK_STATE_EVENTS:
+                continue
+            # Earlier changes of the request in this batch are superseded by this one
+            changes.pop(event.key, None)
+            if event.sampled and not event.body_pending:
+                changes[event.key] = (method, event)
+        return list(changes.values())
+
+    async def _notify_state_change(self, method: str, event: NetworkEvent) -> None:
+        """Run the state change callback, if any."""
+        if not self.on_state_change:
+            return
+        try:
+            await self.on_state_change(method, event)
+        except Exception as e:
+            logger.debug(f"Network state change callback failed for {method}: {e}")
+
+    def get_event(
+        self, request_id: str, session_id: Optional[str] = None
+    ) -> Optional[NetworkEvent]:
+        """Get a pending or completed network event by session and request ID."""
+        return self._index.get((session_id or "", request_id))
+
+    def _get_pending(
+        self, params: Dict[str, Any], session_id: Optional[str]
+    ) -> Optional[NetworkEvent]:
+        """Look up the pending event a CDP event refers to."""
+        request_id = params.get("requestId")
+        if not request_id:
+            return None
+        return self._events.get((session_id or "", request_id))
 
-    async def _handle_request_will_be_sent(self, params: Dict[str, Any]) -> None:
+    def _handle_request_will_be_sent(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> Optional[NetworkEvent]:
         """Handle the start of a network request."""
         request_id = params.get("requestId")
         if not request_id:
-            return
+            return None
+
+        key = (session_id or "", request_id)
+        request = params.get("request", {})
+        event = self._events.get(key)
+        if event is None:
+            sampled: Optional[bool] = True
+            if self.network_filter:
+                sampled = self.network_filter.on_request(
+                    request_id, request.get("url", ""), params.get("type")
+                )
+                if sampled is False:
+                    self.requests_filtered += 1
+                    if params.get("type") == "EventSource":
+                        self._drop_channel(key)
+                    return None
 
-        if request_id not in self._events:
             timestamp = params.get("timestamp", 0)
-            event = NetworkEvent(request_id, timestamp)
-            self._events[request_id] = event
+            event = NetworkEvent(request_id, timestamp, session_id)
+            event.wall_time = params.get("wallTime")
+            event.sampled = sampled
+            event.loader_id = params.get("loaderId")
+            initiator = params.get("initiator") or {}
+            event.initiator_type = initiator.get("type")
+            event.initiator_request_id = initiator.get("requestId")
+            self._events[key] = event
+            self._index[key] = event
+            is_new = True
         else:
-            event = self._events[request_id]
+            is_new = False
 
-        request = params.get("request", {})
         event.method = request.get("method")
         event.url = request.get("url")
-        event.request_headers = request.get("headers", {})
+        event.request_headers = intern_headers(request.get("headers", {}))
         event.request_body = request.get("postData")
 
         event.resource_type = params.get("type")
 
-    async def _handle_response_received(self, params: Dict[str, Any]) -> None:
-        """Handle receipt of a network response."""
-        request_id = params.get("requestId")
-        if not request_id or request_id not in self._events:
-            return
+        if is_new and self.on_request_started:
+            try:
+                self.on_request_started(event)
+            except Exception as e:
+                logger.debug(f"Request started callback failed for {request_id}: {e}")
+        return event
 
-        event = self._events[request_id]
+    def _handle_response_received(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> Optional[NetworkEvent]:
+        """Handle receipt of a network response."""
+        event = self._get_pending(params, session_id)
+        if event is None:
+            return None
         response = params.get("response", {})
 
         event.status_code = response.get("status")
         event.status_text = response.get("statusText")
-        event.response_headers = response.get("headers", {})
+        event.response_headers = intern_headers(response.get("headers", {}))
         event.mime_type = response.get("mimeType")
         event.encoded_data_length = response.get("encodedDataLength")
+        event.http_version = response.get("protocol")
+        event.remote_ip_address = response.get("remoteIPAddress")
+        event.timing = response.get("timing")
 
         timestamp = params.get("timestamp", 0)
         if timestamp and event.timestamp:
             event.response_time = timestamp
             event.duration_ms = (timestamp - event.timestamp) * 1000
+        return event
 
-    async def _handle_loading_finished(self, params: Dict[str, Any]) -> None:
+    def _handle_loading_finished(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> Optional[NetworkEvent]:
         """Handle completion of network loading."""
-        request_id = params.get("requestId")
-        if not request_id or request_id not in self._events:
-            return
-
-        event = self._events[request_id]
+        self._close_event_source(params, session_id)
+        event = self._get_pending(params, session_id)
+        if event is None:
+            return None
 
         if "encodedDataLength" in params:
             event.encoded_data_length = params["encodedDataLength"]
+        event.end_time = params.get("timestamp")
 
-        self._completed_events.append(event)
-        del self._events[request_id]
+        self._complete(event)
+        if self.capture_bodies and event.sampled:
+            # loadingFinished is reported by the body worker once the body is stored
+            event.body_pending = self._queue_body_capture(event)
 
         logger.debug(f"Network request completed: {event.method} {event.url} - {event.status_code}")
+        return event
 
-    async def _handle_loading_failed(self, params: Dict[str, Any]) -> None:
+    def _handle_loading_failed(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> Optional[NetworkEvent]:
         """Handle failed network loading."""
-        request_id = params.get("requestId")
-        if not request_id or request_id not in self._events:
-            return
-
-        event = self._events[request_id]
+        self._close_event_source(params, session_id)
+        event = self._get_pending(params, session_id)
+        if event is None:
+            return None
         event.failed = True
         event.failure_reason = params.get("errorText", "Unknown error")
+        event.end_time = params.get("timestamp")
 
-        self._completed_events.append(event)
-        del self._events[request_id]
+        self._complete(event)
 
         logger.debug(f"Network request failed: {event.url} - {event.failure_reason}")
+        return event
+
+    def _complete(self, event: NetworkEvent) -> None:
+        """Move an event from pending to the completed ring and fold it into the totals."""
+        self._events.pop(event.key, None)
+        if event.sampled is None and self.network_filter:
+            event.sampled = self.network_filter.on_complete(event)
+        self._completed_totals.add(event)
+        host = event.host
+        host_totals = self._dimension_totals["host"]
+        if host not in host_totals and len(host_totals) >= self.max_stat_hosts:
+            host = OTHER_HOST
+        for dimension, value in (
+            ("host", host),
+            ("resource_type", event.resource_type or ""),
+            ("status_class", event.status_class),
+            ("session", event.session_id or ""),
+        ):
+            totals = self._dimension_totals[dimension].get(value)
+            if totals is None:
+                totals = self._dimension_totals[dimension][value] = NetworkTotals()
+            totals.add(event)
+
+        if not event.sampled:
+            self._index.pop(event.key, None)
+            self._evicted(event)
+            return
+        self._completed_events.append(event)
 
-    async def _handle_served_from_cache(self, params: Dict[str, Any]) -> None:
+        while len(self._completed_events) > self.max_completed_events:
+            evicted = self._completed_events.popleft()
+            if self._index.get(evicted.key) is evicted:
+                del self._index[evicted.key]
+                self._evicted(evicted)
+
+    def _evicted(self, event: NetworkEvent) -> None:
+        """Run the eviction callback, if any."""
+        if self.on_event_evicted:
+            try:
+                self.on_event_evicted(event)
+            except Exception as e:
+                logger.debug(f"Eviction callback failed for {event.request_id}: {e}")
+
+    def _handle_served_from_cache(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> Optional[NetworkEvent]:
         """Handle requests served from cache."""
+        event = self._get_pending(params, session_id)
+        if event is None:
+            return None
+        event.status_code = 304
+        return event
+
+    def _open_channel(
+        self,
+        connection_id: str,
+        kind: ChannelKind,
+        url: Optional[str],
+        timestamp: float,
+        session_id: Optional[str],
+    ) -> Optional[ChannelConnection]:
+        """Start tracking a channel connection unless the filter drops its URL."""
+        key = (session_id or "", connection_id)
+        if key in self._dropped_channels:
+            return None
+        if self.network_filter and (
+            self.network_filter.on_request(connection_id, url or "", CHANNEL_RESOURCE_TYPES[kind])
+            is False
+        ):
+            self.requests_filtered += 1
+            self._drop_channel(key)
+            return None
+
+        channel = ChannelConnection(
+            connection_id,
+            kind,
+            url,
+            timestamp,
+            session_id,
+            self.channel_capture.max_messages_per_connection,
+        )
+        self._channels[key] = channel
+        return channel
+
+    def _drop_channel(self, key: NetworkEventKey) -> None:
+        """Remember a filtered channel so its later messages are ignored."""
+        self._dropped_channels[key] = None
+        if len(self._dropped_channels) > self.channel_capture.max_closed_connections:
+            del self._dropped_channels[next(iter(self._dropped_channels))]
+
+    def _handle_web_socket_created(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> None:
+        """Handle a new WebSocket connection."""
+        request_id = params.get("requestId")
+        if request_id:
+            self._open_channel(
+                request_id, "websocket", params.get("url"), params.get("timestamp", 0), session_id
+            )
+
+    def _handle_web_socket_handshake(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> None:
+        """Handle the WebSocket handshake response."""
+        channel = self._channels.get((session_id or "", params.get("requestId", "")))
+        if channel is not None:
+            channel.opened_time = params.get("timestamp")
+            channel.status_code = params.get("response", {}).get("status")
+
+    def _handle_web_socket_frame_sent(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> None:
+        """Handle a WebSocket frame sent by the page."""
+        self._record_web_socket_frame(params, session_id, "sent")
+
+    def _handle_web_socket_frame_received(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> None:
+        """Handle a WebSocket frame received by the page."""
+        self._record_web_socket_frame(params, session_id, "received")
+
+    def _record_web_socket_frame(
+        self, params: Dict[str, Any], session_id: Optional[str], direction: MessageDirection
+    ) -> None:
+        """Record a WebSocket frame on its connection."""
+        channel = self._channels.get((session_id or "", params.get("requestId", "")))
+        if channel is None:
+            return
+        frame = params.get("response", {})
+        opcode = frame.get("opcode")
+        channel.record_message(
+            params.get("timestamp", 0),
+            direction,
+            frame.get("payloadData", ""),
+            self.channel_capture,
+            base64_encoded=opcode is not None and opcode != WEBSOCKET_TEXT_OPCODE,
+            opcode=opcode,
+        )
+
+    def _handle_web_socket_frame_error(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> None:
+        """Handle a WebSocket frame error."""
+        channel = self._channels.get((session_id or "", params.get("requestId", "")))
+        if channel is not None:
+            channel.errors += 1
+            channel.last_error = params.get("errorMessage")
+
+    def _handle_event_source_message(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> None:
+        """Handle an EventSource message; the connection is created on the first message."""
         request_id = params.get("requestId")
-        if not request_id or request_id not in self._events:
+        if not request_id:
             return
+        key = (session_id or "", request_id)
+        channel = self._channels.get(key)
+        if channel is None:
+            request = self._index.get(key)
+            channel = self._open_channel(
+                request_id,
+                "eventsource",
+                request.url if request else None,
+                request.timestamp if request else params.get("timestamp", 0),
+                session_id,
+            )
+            if channel is None:
+                return
+            channel.opened_time = params.get("timestamp")
+        channel.record_message(
+            params.get("timestamp", 0),
+            "received",
+            params.get("data", ""),
+            self.channel_capture,
+            event_name=params.get("eventName"),
+            event_id=params.get("eventId"),
+        )
+
+    def _handle_web_transport_created(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> None:
+        """Handle a new WebTransport session (CDP reports no message-level events for it)."""
+        transport_id = params.get("transportId")
+        if transport_id:
+            self._open_channel(
+                transport_id,
+                "webtransport",
+                params.get("url"),
+                params.get("timestamp", 0),
+                session_id,
+            )
 
-        event = self._events[request_id]
-        event.status_code = 304
-        return None
+    def _handle_web_transport_established(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> None:
+        """Handle an established WebTransport connection."""
+        channel = self._channels.get((session_id or "", params.get("transportId", "")))
+        if channel is not None:
+            channel.opened_time = params.get("timestamp")
+
+    def _handle_channel_closed(
+        self, params: Dict[str, Any], session_id: Optional[str] = None
+    ) -> None:
+        """Handle a closed WebSocket or WebTransport connection."""
+        key = (session_id or "", params.get("requestId") or params.get("transportId", ""))
+        self._close_channel(key, params.get("timestamp", 0))
+
+    def _close_event_source(self, params: Dict[str, Any], session_id: Optional[str]) -> None:
+        """Close the EventSource channel of a request that finished or failed, if any."""
+        key = (session_id or "", params.get("requestId", ""))
+        self._dropped_channels.pop(key, None)
+        channel = self._channels.get(key)
+        if channel is not None and channel.kind == "eventsource":
+            self._close_channel(key, params.get("timestamp", 0))
+
+    def _close_channel(self, key: NetworkEventKey, timestamp: float) -> None:
+        """Mark a channel closed; the oldest closed channels are evicted."""
+        channel = self._channels.get(key)
+        if channel is None or channel.closed:
+            return
+
+        channel.closed_time = timestamp
+        self._closed_channels.append(key)
+        while len(self._closed_channels) > self.channel_capture.max_closed_connections:
+            self._channels.pop(self._closed_channels.popleft(), None)
+
+    def get_channels(self, session_id: Optional[str] = None) -> List[ChannelConnection]:
+        """
+        Get tracked WebSocket, EventSource and WebTransport connections.
+
+        Args:
+            session_id: Only return connections of this session if provided
+        """
+        if session_id is None:
+            return list(self._channels.values())
+        return [c for c in self._channels.values() if c.session_id == session_id]
+
+    def get_channel(
+        self, connection_id: str, session_id: Optional[str] = None
+    ) -> Optional[ChannelConnection]:
+        """Get a channel connection by session and request (or transport) ID."""
+        return self._channels.get((session_id or "", connection_id))
 
     async def get_response_body(self, request_id: str, session_id: str) -> Optional[str]:
         """
@@ -232,11 +943,18 @@ class NetworkUtil:
             session_id: The CDP session ID
 
         Returns:
-            The response body as a string, or None if unavailable
+            The response body as a string (base64 for binary bodies), or None if unavailable
         """
         if not self.capture_bodies:
             return None
 
+        result = await self._fetch_response_body(request_id, session_id)
+        return result[0] if result else None
+
+    async def _fetch_response_body(
+        self, request_id: str, session_id: str
+    ) -> Optional[Tuple[str, bool]]:
+        """Call Network.getResponseBody and return (body, base64_encoded)."""
         try:
             fut = await self.client.send(
                 "Network.getResponseBody",
@@ -245,68 +963,290 @@ class NetworkUtil:
                 expect_result=True,
             )
             if fut:
-                result = await fut
-                body = result.get("result", {}).get("body")
-                return body
+                response = await asyncio.wait_for(fut, self.body_capture.fetch_timeout_s)
+                result = response.get("result", {})
+                body = result.get("body")
+                if body is not None:
+                    return body, bool(result.get("base64Encoded"))
+            return None
+        except asyncio.TimeoutError:
+            logger.debug(f"Timed out fetching response body for {request_id}")
             return None
         except Exception as e:
             logger.debug(f"Failed to get response body for {request_id}: {e}")
             return None
 
-    def get_completed_events(self) -> List[NetworkEvent]:
-        """Get all completed network events."""
-        return self._completed_events.copy()
+    def _queue_body_capture(self, event: NetworkEvent) -> bool:
+        """Queue a finished request for body capture if it passes the filters."""
+        options = self.body_capture
+        session_key = event.session_id or ""
+        if (
+            not options.matches(event)
+            or self._session_body_bytes.get(session_key, 0) >= options.max_session_bytes
+            or len(self._body_queue) >= options.max_queued
+        ):
+            self.bodies_skipped += 1
+            return False
+
+        if not self._body_workers:
+            self._body_wakeup = asyncio.Event()
+            self._body_idle = asyncio.Event()
+            self._body_workers = [
+                asyncio.create_task(self._body_worker()) for _ in range(options.max_workers)
+            ]
+
+        self._body_queue.append(event)
+        assert self._body_wakeup is not None and self._body_idle is not None
+        self._body_idle.clear()
+        self._body_wakeup.set()
+        return True
+
+    async def _body_worker(self) -> None:
+        """Fetch queued response bodies until cancelled."""
+        assert self._body_wakeup is not None
+
+        while True:
+            while not self._body_queue:
+                self._body_wakeup.clear()
+                await self._body_wakeup.wait()
+
+            event = self._body_queue.popleft()
+            self._body_active.append(event)
+            try:
+                await self._capture_body(event)
+            except Exception as e:
+                logger.debug(f"Body capture failed for {event.request_id}: {e}")
+            finally:
+                event.body_pending = False
+            try:
+                await self._notify_state_change("Network.loadingFinished", event)
+            finally:
+                self._body_active.remove(event)
+                if not self._body_queue and not self._body_active and self._body_idle:
+                    self._body_idle.set()
+
+    async def _capture_body(self, event: NetworkEvent) -> None:
+        """Fetch one response body, apply the byte caps and store it on the event."""
+        assert event.session_id is not None
+        options = self.body_capture
+        session_key = event.session_id
+
+        if self._session_body_bytes.get(session_key, 0) >= options.max_session_bytes:
+            self.bodies_skipped += 1
+            return
 
-    def get_pending_events(self) -> List[NetworkEvent]:
-        """Get all pending network events."""
-        return list(self._events.values())
+        result = await self._fetch_response_body(event.request_id, event.session_id)
+        used = self._session_body_bytes.get(session_key, 0)
+        if result is None or used >= options.max_session_bytes:
+            self.bodies_skipped += 1
+            return
 
-    def get_all_events(self) -> List[NetworkEvent]:
-        """Get all network events (completed and pending)."""
-        all_events = self._completed_events.copy()
-        all_events.extend(self._events.values())
+        body, is_base64 = result
+        data = base64.b64decode(body) if is_base64 else body.encode("utf-8")
+        limit = min(options.max_body_bytes, options.max_session_bytes - used)
+        if len(data) > limit:
+            data = data[:limit]
+            event.response_body_truncated = True
+        self._session_body_bytes[session_key] = used + len(data)
+
+        if len(data) > options.spill_bytes:
+            if self._body_dir is None:
+                self._body_dir = tempfile.mkdtemp(prefix="network_bodies_")
+                self._owns_body_dir = True
+            event.response_body_path = await asyncio.to_thread(self._spill_body, event, data)
+        if event.response_body_path is None:
+            if is_base64:
+                event.response_body = base64.b64encode(data).decode("ascii")
+            else:
+                event.response_body = data.decode("utf-8", errors="replace")
+            event.response_body_base64 = is_base64
+        event.decoded_body_length = len(data) if not event.response_body_truncated else None
+        self.bodies_captured += 1
+
+    def _spill_body(self, event: NetworkEvent, data: bytes) -> Optional[str]:
+        """Write a large body to disk and return its path."""
+        body_dir = self._body_dir
+        assert body_dir is not None
+        try:
+            os.makedirs(body_dir, exist_ok=True)
+            name = f"{event.session_id or 'browser'}_{event.request_id}.body"
+            path = os.path.join(body_dir, name.replace(os.sep, "_"))
+            with open(path, "wb") as f:
+                f.write(data)
+            return path
+        except OSError as e:
+            logger.debug(f"Failed to write body of {event.request_id} to disk: {e}")
+            return None
+
+    async def drain_body_capture(self, timeout: float = 5.0) -> None:
+        """Wait until queued response bodies have been fetched."""
+        if self._body_idle is None or not (self._body_queue or self._body_active):
+            return
+        try:
+            await asyncio.wait_for(self._body_idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Body capture drain timed out with {len(self._body_queue)} bodies queued"
+            )
+
+    async def stop_body_capture(self) -> None:
+        """
+        Stop the body capture workers.
+
+        Bodies still queued are discarded; their requests are reported as finished
+        without a body. A temporary spill directory is deleted with the bodies in it;
+        set BodyCaptureOptions.body_dir to keep spilled bodies.
+        """
+        for worker in self._body_workers:
+            worker.cancel()
+        await asyncio.gather(*self._body_workers, return_exceptions=True)
+        self._body_workers = []
+        unfinished = self._body_active + list(self._body_queue)
+        self._body_active = []
+        self._body_queue.clear()
+        if self._body_idle is not None:
+            self._body_idle.set()
+        for event in unfinished:
+            event.body_pending = False
+            self.bodies_skipped += 1
+            await self._notify_state_change("Network.loadingFinished", event)
+
+        if self._owns_body_dir and self._body_dir is not None:
+            await asyncio.to_thread(shutil.rmtree, self._body_dir, True)
+            self._body_dir = None
+            self._owns_body_dir = False
+
+    def get_completed_events(self, session_id: Optional[str] = None) -> List[NetworkEvent]:
+        """
+        Get the retained completed network events (at most max_completed_events).
+
+        Args:
+            session_id: Only return events of this session if provided
+        """
+        if session_id is None:
+            return list(self._completed_events)
+        return [e for e in self._completed_events if e.session_id == session_id]
+
+    def get_pending_events(self, session_id: Optional[str] = None) -> List[NetworkEvent]:
+        """
+        Get pending network events.
+
+        Args:
+            session_id: Only return events of this session if provided
+        """
+        if session_id is None:
+            return list(self._events.values())
+        return [e for e in self._events.values() if e.session_id == session_id]
+
+    def get_all_events(self, session_id: Optional[str] = None) -> List[NetworkEvent]:
+        """Get all retained network events (completed and pending), optionally for one session."""
+        all_events = self.get_completed_events(session_id)
+        all_events.extend(self.get_pending_events(session_id))
         return all_events
 
+    def get_session_ids(self) -> List[str]:
+        """Get the session IDs network events were seen on."""
+        session_ids = dict.fromkeys(self._dimension_totals["session"])
+        session_ids.update(dict.fromkeys(key[0] for key in self._events))
+        return [session_id for session_id in session_ids if session_id]
+
+    def remove_session(self, session_id: str) -> int:
+        """
+        Drop pending events of a detached session; they will never complete.
+
+        Completed events and totals of the session are kept.
+
+        Returns:
+            Number of pending events dropped
+        """
+        stale = [key for key in self._events if key[0] == session_id]
+        for key in stale:
+            event = self._events.pop(key)
+            self._index.pop(key, None)
+            self._evicted(event)
+        return len(stale)
+
     def clear_events(self) -> None:
         """Clear all stored network events."""
         self._events.clear()
         self._completed_events.clear()
+        self._index.clear()
+        self._completed_totals = NetworkTotals()
+        for totals_by_value in self._dimension_totals.values():
+            totals_by_value.clear()
+        self._body_queue.clear()
+        self._session_body_bytes.clear()
+        self._channels.clear()
+        self._closed_channels.clear()
+        self._dropped_channels.clear()
+
+    def get_events_summary(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get a summary of network activity, including evicted completed events.
 
-    def get_events_summary(self) -> Dict[str, Any]:
-        """Get a summary of network activity."""
-        all_events = self.get_all_events()
+        Args:
+            session_id: Summarize only this session if provided
+        """
+        if session_id is None:
+            completed_totals = self._completed_totals
+            pending = list(self._events.values())
+        else:
+            completed_totals = self._dimension_totals["session"].get(session_id) or NetworkTotals()
+            pending = self.get_pending_events(session_id)
 
-        # Initialize typed dictionaries for request counts
-        requests_by_type: Dict[str, int] = {}
-        requests_by_status: Dict[str, int] = {}
+        totals = completed_totals.copy()
+        for event in pending:
+            totals.add(event)
 
         summary: Dict[str, Any] = {
-            "total_requests": len(all_events),
-            "completed_requests": len(self._completed_events),
-            "pending_requests": len(self._events),
-            "failed_requests": sum(1 for e in all_events if e.failed),
-            "total_data_transferred": sum(e.encoded_data_length or 0 for e in all_events),
+            "total_requests": totals.requests,
+            "completed_requests": completed_totals.requests,
+            "pending_requests": len(pending),
+            "failed_requests": totals.failed,
+            "total_data_transferred": totals.data_transferred,
             "average_duration_ms": 0,
-            "requests_by_type": requests_by_type,
-            "requests_by_status": requests_by_status,
+            "requests_by_type": totals.by_type,
+            "requests_by_status": totals.by_status,
+            "duration_percentiles_ms": completed_totals.latency.percentiles(),
         }
 
-        durations = [e.duration_ms for e in all_events if e.duration_ms]
-        if durations:
-            summary["average_duration_ms"] = sum(durations) / len(durations)
+        if totals.duration_count:
+            summary["average_duration_ms"] = totals.duration_sum_ms / totals.duration_count
 
-        for event in all_events:
-            if event.resource_type:
-                requests_by_type[event.resource_type] = (
-                    requests_by_type.get(event.resource_type, 0) + 1
-                )
+        return summary
 
-        for event in all_events:
-            if event.status_code:
-                status_group = f"{event.status_code // 100}xx"
-                requests_by_status[status_group] = requests_by_status.get(status_group, 0) + 1
+    def get_network_stats(self, include_sketches: bool = False) -> Dict[str, Any]:
+        """
+        Get completed-request statistics overall and per host, resource type, status class
+        and session, including p50/p95/p99 durations.
 
-        return summary
+        Args:
+            include_sketches: Include serialized latency sketches so stats of several runs
+                can be merged with LatencySketch.from_dict and LatencySketch.merge
+
+        Returns:
+            Dictionary with "overall" and one "by_<dimension>" mapping per dimension
+        """
+        stats: Dict[str, Any] = {"overall": self._completed_totals.to_dict(include_sketches)}
+        for dimension, totals_by_value in self._dimension_totals.items():
+            stats[f"by_{dimension}"] = {
+                value: totals.to_dict(include_sketches) for value, totals in totals_by_value.items()
+            }
+        return stats
+
+    def get_totals(self, dimension: Optional[str] = None, value: str = "") -> NetworkTotals:
+        """
+        Get the live totals overall or for one dimension value (e.g. "host", "example.com").
+
+        Hosts beyond max_stat_hosts are only available as ("host", "other").
+
+        The returned object can be merged with totals of other runs via NetworkTotals.merge.
+        """
+        if dimension is None:
+            return self._completed_totals
+        if dimension not in self._dimension_totals:
+            raise ValueError(f"Unknown stats dimension: {dimension}")
+        return self._dimension_totals[dimension].get(value) or NetworkTotals()
 
     def format_network_log(self, event: NetworkEvent) -> str:
         """Format a network event as a log entry."""
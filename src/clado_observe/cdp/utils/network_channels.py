@@ -0,0 +1,230 @@
+"""
+Network Channel Capture
+
+Message-level capture for long-lived channels: WebSockets, EventSource streams and
+WebTransport sessions. Each connection keeps counters and byte totals for all traffic,
+while message payloads are truncated, optionally sampled and kept in a bounded ring per
+connection, so chatty sockets cannot exhaust memory.
+"""
+
+import base64
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Literal, Optional
+
+ChannelKind = Literal["websocket", "eventsource", "webtransport"]
+MessageDirection = Literal["sent", "received"]
+
+WEBSOCKET_TEXT_OPCODE = 1
+
+# CDP ResourceType of each channel kind, as seen by network filter rules
+CHANNEL_RESOURCE_TYPES: Dict[str, str] = {
+    "websocket": "WebSocket",
+    "eventsource": "EventSource",
+    "webtransport": "WebTransport",
+}
+
+
+@dataclass
+class ChannelCaptureOptions:
+    """Limits for channel message capture."""
+
+    max_messages_per_connection: int = 200
+    max_payload_chars: int = 4096
+    sample_rate: float = 1.0
+    max_closed_connections: int = 500
+
+
+def _payload_size(payload: str, base64_encoded: bool) -> int:
+    """Payload size in bytes without decoding base64 payloads."""
+    if base64_encoded:
+        return len(payload) * 3 // 4 - payload[-2:].count("=")
+    if payload.isascii():
+        return len(payload)
+    return len(payload.encode("utf-8"))
+
+
+class ChannelMessage:
+    """A single captured channel message."""
+
+    __slots__ = (
+        "timestamp",
+        "direction",
+        "size",
+        "data",
+        "truncated",
+        "opcode",
+        "event_name",
+        "event_id",
+    )
+
+    def __init__(
+        self,
+        timestamp: float,
+        direction: MessageDirection,
+        size: int,
+        data: str,
+        truncated: bool,
+        opcode: Optional[int] = None,
+        event_name: Optional[str] = None,
+        event_id: Optional[str] = None,
+    ):
+        self.timestamp = timestamp
+        self.direction = direction
+        self.size = size
+        self.data = data
+        self.truncated = truncated
+        self.opcode = opcode
+        self.event_name = event_name
+        self.event_id = event_id
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the message to a dictionary for serialization."""
+        data = {
+            "timestamp": self.timestamp,
+            "direction": self.direction,
+            "size": self.size,
+            "data": self.data,
+            "truncated": self.truncated,
+            "opcode": self.opcode,
+            "event_name": self.event_name,
+            "event_id": self.event_id,
+        }
+        return {k: v for k, v in data.items() if v is not None}
+
+
+class ChannelConnection:
+    """State, counters and recent messages of one channel connection."""
+
+    __slots__ = (
+        "connection_id",
+        "session_id",
+        "kind",
+        "url",
+        "created_time",
+        "opened_time",
+        "closed_time",
+        "status_code",
+        "messages_sent",
+        "messages_received",
+        "bytes_sent",
+        "bytes_received",
+        "messages_sampled_out",
+        "errors",
+        "last_error",
+        "messages",
+    )
+
+    def __init__(
+        self,
+        connection_id: str,
+        kind: ChannelKind,
+        url: Optional[str],
+        timestamp: float,
+        session_id: Optional[str] = None,
+        max_messages: int = 200,
+    ):
+        self.connection_id = connection_id
+        self.session_id = session_id
+        self.kind = kind
+        self.url = url
+        self.created_time = timestamp
+        self.opened_time: Optional[float] = None
+        self.closed_time: Optional[float] = None
+        self.status_code: Optional[int] = None
+
+        self.messages_sent = 0
+        self.messages_received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.messages_sampled_out = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+        self.messages: Deque[ChannelMessage] = deque(maxlen=max_messages)
+
+    @property
+    def closed(self) -> bool:
+        """Whether the connection was closed."""
+        return self.closed_time is not None
+
+    def record_message(
+        self,
+        timestamp: float,
+        direction: MessageDirection,
+        payload: str,
+        options: ChannelCaptureOptions,
+        base64_encoded: bool = False,
+        opcode: Optional[int] = None,
+        event_name: Optional[str] = None,
+        event_id: Optional[str] = None,
+    ) -> Optional[ChannelMessage]:
+        """
+        Count a message and keep it in the ring if it is sampled in.
+
+        Returns:
+            The stored message, or None if it was sampled out
+        """
+        size = _payload_size(payload, base64_encoded)
+        if direction == "sent":
+            self.messages_sent += 1
+            self.bytes_sent += size
+            count = self.messages_sent
+        else:
+            self.messages_received += 1
+            self.bytes_received += size
+            count = self.messages_received
+
+        # Keep an evenly spaced subset, starting with the first message
+        rate = options.sample_rate
+        if rate < 1.0 and math.ceil(count * rate) == math.ceil((count - 1) * rate):
+            self.messages_sampled_out += 1
+            return None
+
+        truncated = len(payload) > options.max_payload_chars
+        message = ChannelMessage(
+            timestamp,
+            direction,
+            size,
+            payload[: options.max_payload_chars] if truncated else payload,
+            truncated,
+            opcode,
+            event_name,
+            event_id,
+        )
+        self.messages.append(message)
+        return message
+
+    def to_dict(self, include_messages: bool = True) -> Dict[str, Any]:
+        """Convert the connection to a dictionary for serialization."""
+        data: Dict[str, Any] = {
+            "connection_id": self.connection_id,
+            "session_id": self.session_id,
+            "kind": self.kind,
+            "url": self.url,
+            "created_time": self.created_time,
+            "opened_time": self.opened_time,
+            "closed_time": self.closed_time,
+            "status_code": self.status_code,
+            "messages_sent": self.messages_sent,
+            "messages_received": self.messages_received,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "messages_sampled_out": self.messages_sampled_out,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+        if include_messages:
+            data["messages"] = [message.to_dict() for message in self.messages]
+        return {k: v for k, v in data.items() if v is not None}
+
+
+def decode_binary_payload(message: ChannelMessage) -> Optional[bytes]:
+    """Decode a binary WebSocket payload, which CDP delivers base64 encoded."""
+    if message.opcode is None or message.opcode == WEBSOCKET_TEXT_OPCODE or message.truncated:
+        return None
+    try:
+        return base64.b64decode(message.data)
+    except ValueError:
+        return None
@@ -0,0 +1,151 @@
+"""
+Network Filter Utility
+
+Declarative keep/drop/block and sampling rules for network capture. Rules are evaluated
+in order and the first match decides. Rules that only look at the request (URL, host,
+resource type) are decided at Network.requestWillBeSent, so dropped requests never get a
+NetworkEvent. Rules that look at the outcome (MIME type, status class) are decided when
+the request completes; until then the event is tracked but not reported.
+
+Request-only drop and block rules are applied at requestWillBeSent even when an earlier
+outcome rule matches the request, so "keep all failures" placed first does not defer
+every request; a dropped request is not kept when it fails.
+"""
+
+import fnmatch
+import zlib
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Literal, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from .network import NetworkEvent
+
+RuleAction = Literal["keep", "drop", "block"]
+
+
+@dataclass
+class NetworkRule:
+    """
+    One filter rule. Empty criteria match everything.
+
+    Examples:
+        NetworkRule(status_classes=("failed", "4xx", "5xx"))  # keep all failures
+        NetworkRule(resource_types=("Image",), status_classes=("2xx",), sample_rate=0.05)
+        NetworkRule(action="block", url_patterns=("*://*.doubleclick.net/*",))
+    """
+
+    action: RuleAction = "keep"
+    sample_rate: float = 1.0
+    url_patterns: Tuple[str, ...] = ()
+    hosts: Tuple[str, ...] = ()
+    resource_types: Tuple[str, ...] = ()
+    mime_types: Tuple[str, ...] = ()
+    status_classes: Tuple[str, ...] = ()
+
+    def __post_init__(self) -> None:
+        if not 0.0 <= self.sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+        if self.action == "block" and (self.needs_response or self.hosts or self.resource_types):
+            raise ValueError("block rules can only match url_patterns")
+
+    @property
+    def needs_response(self) -> bool:
+        """Whether the rule can only be decided once the response is known."""
+        return bool(self.mime_types or self.status_classes)
+
+    def matches_request(self, url: str, resource_type: Optional[str]) -> bool:
+        """Whether the request-time criteria match."""
+        if self.resource_types and resource_type not in self.resource_types:
+            return False
+        if self.url_patterns and not any(
+            fnmatch.fnmatchcase(url, pattern) for pattern in self.url_patterns
+        ):
+            return False
+        if self.hosts:
+            try:
+                host = urlsplit(url).hostname or ""
+            except ValueError:
+                host = ""
+            if not any(fnmatch.fnmatchcase(host, pattern) for pattern in self.hosts):
+                return False
+        return True
+
+    def matches_response(self, mime_type: Optional[str], status_class: str) -> bool:
+        """Whether the response-time criteria match."""
+        if self.status_classes and status_class not in self.status_classes:
+            return False
+        if self.mime_types and not (mime_type or "").lower().startswith(self.mime_types):
+            return False
+        return True
+
+
+class NetworkFilter:
+    """
+    Ordered rule set with deterministic per-request sampling.
+
+    The first matching rule decides, except that a request-only drop or block rule drops
+    a request at requestWillBeSent even if an earlier outcome rule would have matched it.
+    """
+
+    def __init__(self, rules: Sequence[NetworkRule], default_sample_rate: float = 1.0) -> None:
+        """
+        Initialize NetworkFilter.
+
+        Args:
+            rules: Rules evaluated in order; the first matching rule decides
+            default_sample_rate: Fraction of requests kept when no rule matches
+        """
+        self.rules: List[NetworkRule] = list(rules)
+        self.default_sample_rate = default_sample_rate
+
+    def blocked_url_patterns(self) -> List[str]:
+        """URL patterns of block rules, for Network.setBlockedURLs."""
+        return [
+            pattern
+            for rule in self.rules
+            if rule.action == "block"
+            for pattern in rule.url_patterns
+        ]
+
+    def on_request(self, request_id: str, url: str, resource_type: Optional[str]) -> Optional[bool]:
+        """
+        Decide at requestWillBeSent.
+
+        Returns:
+            True to keep, False to drop, None if a response-dependent rule must decide later
+        """
+        deferred = False
+        for rule in self.rules:
+            if not rule.matches_request(url, resource_type):
+                continue
+            if rule.needs_response:
+                deferred = True
+            elif not deferred or rule.action != "keep":
+                return self._decide(rule.action, rule.sample_rate, request_id)
+            else:
+                # An earlier outcome rule may still keep or drop the request
+                return None
+        if deferred:
+            return None
+        return self._decide("keep", self.default_sample_rate, request_id)
+
+    def on_complete(self, event: "NetworkEvent") -> bool:
+        """Decide for a completed event whose request-time decision was deferred."""
+        url = event.url or ""
+        status_class = event.status_class
+        for rule in self.rules:
+            if rule.matches_request(url, event.resource_type) and rule.matches_response(
+                event.mime_type, status_class
+            ):
+                return self._decide(rule.action, rule.sample_rate, event.request_id)
+        return self._decide("keep", self.default_sample_rate, event.request_id)
+
+    @staticmethod
+    def _decide(action: RuleAction, sample_rate: float, request_id: str) -> bool:
+        """Keep/drop decision; sampling is a stable hash of the request id."""
+        if action != "keep":
+            return False
+        if sample_rate >= 1.0:
+            return True
+        return zlib.crc32(request_id.encode("utf-8")) % 10000 < sample_rate * 10000
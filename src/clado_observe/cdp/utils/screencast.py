@@ -2,19 +2,44 @@
 Screencast Utility
 
 Handles screencast recording functionality including frame capture and video creation.
+Frames are kept in one track per page session so each tab is encoded into its own video,
+or, when following the active tab, into a single track that switches to whichever tab
+Chrome reports as visible (Page.screencastVisibilityChanged).
+Tracks can optionally be cut into fixed-duration segments that are finished and handed to
+a callback while recording continues. In "mjpeg" recording mode the JPEG frames sent by
+Chrome are muxed into Matroska files as they arrive instead of being re-encoded with ffmpeg.
+Timeline sprite sheets of low-resolution thumbnails can be built from the same frames.
+The latest frame of each session is cached so it can stand in for a fresh screenshot.
 """
 
 import asyncio
 import base64
+import json
 import logging
 import os
+import re
+import shutil
 import subprocess
 import tempfile
 import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional, TypedDict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Set,
+    Tuple,
+    TypedDict,
+)
 
 from .base_client import BaseCDPClient
+from .frame_pipeline import DropPolicy, FramePipeline
+from .mjpeg import MJPEGWriter
+from .thumbnails import ThumbnailSprite
 
 
 class ScreencastParams(TypedDict, total=False):
@@ -32,20 +57,99 @@ class FrameData(TypedDict, total=False):
     timestamp: float
 
 
+SegmentCallback = Callable[[str, str, int], Awaitable[None]]
+RecordingMode = Literal["h264", "mjpeg"]
+
+
 logger = logging.getLogger(__name__)
 
+ACTIVE_TRACK = "active"
+DEFAULT_TRACK = "default"
+
+VIDEO_MIME_TYPES = {
+    ".mp4": "video/mp4",
+    ".ts": "video/mp2t",
+    ".mkv": "video/x-matroska",
+}
+
+
+def video_mime_type(path: str) -> str:
+    """Return the MIME type of a video produced by ScreencastUtil."""
+    return VIDEO_MIME_TYPES.get(os.path.splitext(path)[1].lower(), "video/mp4")
+
 
 class ScreencastUtil:
     """
     Utility for recording browser screencasts and creating videos.
     """
 
-    def __init__(self, client: BaseCDPClient) -> None:
+    def __init__(
+        self,
+        client: BaseCDPClient,
+        follow_active_target: bool = False,
+        max_in_flight_frames: int = 64,
+        drop_policy: DropPolicy = "drop_oldest",
+        segment_duration_s: Optional[float] = None,
+        max_parallel_encodes: int = 2,
+        recording_mode: RecordingMode = "h264",
+        thumbnails: bool = False,
+        thumbnail_interval_s: float = 5.0,
+    ) -> None:
+        """
+        Initialize ScreencastUtil.
+
+        Args:
+            client: The base CDP client for communication
+            follow_active_target: Record only the active tab into a single track instead of
+                one track per session
+            max_in_flight_frames: Maximum number of acked frames waiting to be stored
+            drop_policy: Which frame to drop when the in-flight queue is full
+            segment_duration_s: Cut each track into MPEG-TS segments of this many seconds
+                instead of encoding one video at the end
+            max_parallel_encodes: Maximum number of ffmpeg processes running at once
+            recording_mode: "h264" re-encodes frames with ffmpeg at the end of each video,
+                "mjpeg" muxes the received JPEGs into Matroska files without transcoding
+            thumbnails: Build a thumbnail sprite sheet and JSON index per track (needs Pillow)
+            thumbnail_interval_s: Interval between thumbnails when the page is not changing
+        """
+        if recording_mode not in ("h264", "mjpeg"):
+            raise ValueError(f"Unknown recording mode: {recording_mode}")
+
         self.client = client
-        self._screencast_frames: List[dict] = []  # Use dict instead of FrameData
+        self.follow_active_target = follow_active_target
+        self._tracks: Dict[str, List[dict]] = {}  # Use dict instead of FrameData
+        self._active_session_id: Optional[str] = None
         self._screencast_recording = False
         self._temp_dir: Optional[str] = None
         self._screencast_params: dict = {}  # Use dict instead of ScreencastParams
+        self.track_videos: Dict[str, str] = {}
+        self._frame_pipeline = FramePipeline(
+            self._store_frame, max_in_flight=max_in_flight_frames, drop_policy=drop_policy
+        )
+
+        self.segment_duration_s = segment_duration_s
+        self.segment_callback: Optional[SegmentCallback] = None
+        self.track_segments: Dict[str, List[str]] = {}
+        self._track_start: Dict[str, float] = {}
+        self._segment_durations: Dict[str, List[float]] = {}
+        self._segment_tasks: Set[asyncio.Task] = set()
+        self._encode_slots = asyncio.Semaphore(max_parallel_encodes)
+
+        self.recording_mode = recording_mode
+        self._mjpeg_writers: Dict[str, MJPEGWriter] = {}
+        self._track_frame_counts: Dict[str, int] = {}
+
+        self.thumbnails = thumbnails and ThumbnailSprite.is_available()
+        if thumbnails and not self.thumbnails:
+            logger.warning(
+                "Pillow is not installed, screencast thumbnails are disabled; "
+                'install "clado-observe[images]" to enable them'
+            )
+        self.thumbnail_interval_s = thumbnail_interval_s
+        self._thumbnail_sprites: Dict[str, ThumbnailSprite] = {}
+        self.track_thumbnails: Dict[str, str] = {}
+
+        self._latest_frames: Dict[str, Tuple[str, float]] = {}
 
     async def start_screencast(self) -> None:
         """Start screencast recording."""
@@ -53,7 +157,18 @@ class ScreencastUtil:
             self._temp_dir = tempfile.mkdtemp(prefix="screencast_")
             logger.debug(f"Created temporary directory: {self._temp_dir}")
 
-            self._screencast_frames.clear()
+            self._tracks.clear()
+            self.track_videos.clear()
+            self.track_segments.clear()
+            self._track_start.clear()
+            self._segment_durations.clear()
+            self._mjpeg_writers.clear()
+            self._track_frame_counts.clear()
+            self._thumbnail_sprites.clear()
+            self.track_thumbnails.clear()
+            self._latest_frames.clear()
+            self._frame_pipeline.reset()
+            self._frame_pipeline.start()
             self._screencast_recording = True
 
             viewport_size = await self._get_viewport_size()
@@ -93,8 +208,12 @@ class ScreencastUtil:
     async def end_screencast(self) -> Optional[str]:
         """Stop screencast recording and create video.
 
+        In segmented mode the remaining frames of every track are flushed as final segments
+        and all pending segment callbacks are awaited.
+
         Returns:
-            Path to the created video file, or None if no video was created
+            Path to the created video file (or the primary track's playlist in segmented
+            mode), or None if no video was created
         """
         try:
             await asyncio.sleep(0.5)
@@ -106,10 +225,31 @@ class ScreencastUtil:
             # Wait again after stopping to catch any final frames that may have been in flight
             await asyncio.sleep(0.3)
             self._screencast_recording = False
-
-            if self._screencast_frames:
-                video_path = await self._create_video_from_frames()
-                return video_path
+            await self._frame_pipeline.drain()
+            await self._frame_pipeline.stop()
+            self._close_thumbnail_sprites()
+
+            if self.recording_mode == "mjpeg":
+                for track_key in list(self._mjpeg_writers):
+                    self._finish_mjpeg_writer(track_key)
+                if self._segment_tasks:
+                    await asyncio.gather(*self._segment_tasks, return_exceptions=True)
+                return self._primary_video_path()
+
+            if self.segment_duration_s:
+                for track_key in list(self._tracks):
+                    self._cut_segment(track_key)
+                if self._segment_tasks:
+                    await asyncio.gather(*self._segment_tasks, return_exceptions=True)
+                return self._primary_playlist_path()
+
+            if self._tracks:
+                self.track_videos = await self._create_videos_from_tracks()
+                self._frame_pipeline.mark_encoded(
+                    sum(len(self._tracks[key]) for key in self.track_videos)
+                )
+                logger.debug(f"Screencast frame stats: {self.get_frame_stats()}")
+                return self._primary_video_path()
 
             return None
 
@@ -204,57 +344,386 @@ class ScreencastUtil:
 
             traceback.print_exc()
 
+    def get_latest_frame(
+        self, session_id: Optional[str] = None, max_age_s: Optional[float] = None
+    ) -> Optional[str]:
+        """
+        Get the most recent screencast frame as a data URI.
+
+        Args:
+            session_id: Session to read; defaults to the active session, or to the session
+                that produced the most recent frame
+            max_age_s: Only return the frame if it was received within this many seconds
+
+        Returns:
+            Data URI formatted base64 image data, or None if no fresh frame is cached
+        """
+        if session_id is None:
+            if self._active_session_id in self._latest_frames:
+                session_id = self._active_session_id
+            elif self._latest_frames:
+                session_id = max(self._latest_frames, key=lambda k: self._latest_frames[k][1])
+
+        cached = self._latest_frames.get(session_id) if session_id else None
+        if cached is None:
+            return None
+
+        data, received_at = cached
+        if max_age_s is not None and time.monotonic() - received_at > max_age_s:
+            return None
+
+        image_format = self._screencast_params.get("format", "jpeg")
+        return f"data:image/{image_format};base64,{data}"
+
+    def set_active_session(self, session_id: Optional[str]) -> None:
+        """Mark the session whose frames should be recorded when following the active tab."""
+        if session_id and session_id != self._active_session_id:
+            logger.debug(f"Screencast active session switched to {session_id}")
+            self._active_session_id = session_id
+
+    def deactivate_session(self, session_id: str) -> None:
+        """
+        Stop following a session whose tab was hidden.
+
+        The next session to deliver a frame becomes active; hidden tabs produce no frames.
+        """
+        if self._active_session_id == session_id:
+            logger.debug(f"Screencast active session {session_id} was hidden")
+            self._active_session_id = None
+
+    def remove_session(self, session_id: str) -> None:
+        """Forget a detached session so the active track does not stall on it."""
+        if self._active_session_id == session_id:
+            self._active_session_id = None
+        self._latest_frames.pop(session_id, None)
+
+    def _track_key(self, session_id: Optional[str]) -> Optional[str]:
+        """Return the track a frame from this session belongs to, or None to drop it."""
+        if not self.follow_active_target:
+            return session_id or DEFAULT_TRACK
+
+        if self._active_session_id is None:
+            self._active_session_id = session_id
+        if session_id != self._active_session_id:
+            return None
+        return ACTIVE_TRACK
+
     async def handle_screencast_frame(self, frame_data: dict, session_id: Optional[str]) -> None:
-        """Handle incoming screencast frame data."""
+        """Handle incoming screencast frame data.
+
+        The frame is acknowledged first so Chrome keeps producing frames at its own pace,
+        then handed to the bounded frame pipeline for storage.
+        """
         if not self._screencast_recording:
             return
 
         try:
-            metadata = frame_data.get("metadata", {})
-            cdp_timestamp = metadata.get("timestamp", time.time())
+            frame_session_id = frame_data.get("sessionId")
+            if frame_session_id and session_id:
+                await self._ack_screencast_frame(frame_session_id, session_id)
+
+            data = frame_data.get("data")
+            if data:
+                self._latest_frames[session_id or DEFAULT_TRACK] = (data, time.monotonic())
 
-            self._screencast_frames.append(
+            track_key = self._track_key(session_id)
+            if track_key is None:
+                return
+
+            metadata = frame_data.get("metadata", {})
+            self._frame_pipeline.submit(
                 {
                     "data": frame_data.get("data", ""),
-                    "timestamp": cdp_timestamp,
+                    "timestamp": metadata.get("timestamp", time.time()),
                     "metadata": metadata,
                     "sessionId": session_id,
+                    "track": track_key,
                 }
             )
 
-            frame_session_id = frame_data.get("sessionId")
-            if frame_session_id and session_id:
-                await self._ack_screencast_frame(frame_session_id, session_id)
-
         except Exception:
             import traceback
 
             traceback.print_exc()
 
-    async def _create_video_from_frames(self) -> Optional[str]:
-        """Create a video file from captured screencast frames.
+    async def _store_frame(self, frame: dict) -> None:
+        """Store a frame that left the frame pipeline in its track."""
+        track_key = frame["track"]
+        self._track_frame_counts[track_key] = self._track_frame_counts.get(track_key, 0) + 1
+
+        jpeg_data: Optional[bytes] = None
+        if self.thumbnails or self.recording_mode == "mjpeg":
+            jpeg_data = base64.b64decode(frame.get("data", ""))
+
+        if self.thumbnails and jpeg_data is not None:
+            self._add_thumbnail(track_key, jpeg_data, float(frame.get("timestamp", 0)))
+
+        if self.recording_mode == "mjpeg" and jpeg_data is not None:
+            self._write_mjpeg_frame(track_key, jpeg_data, float(frame.get("timestamp", 0)))
+            return
+
+        frames = self._tracks.setdefault(track_key, [])
+
+        if self.segment_duration_s and frames:
+            segment_start = float(frames[0].get("timestamp", 0))
+            if float(frame.get("timestamp", 0)) - segment_start >= self.segment_duration_s:
+                self._cut_segment(track_key, end_timestamp=float(frame.get("timestamp", 0)))
+                frames = self._tracks.setdefault(track_key, [])
+
+        frames.append(frame)
+
+    def _cut_segment(self, track_key: str, end_timestamp: Optional[float] = None) -> None:
+        """Detach the buffered frames of a track and encode them as a segment in the background.
+
+        Args:
+            track_key: Key of the track to cut
+            end_timestamp: Timestamp of the first frame of the next segment, used as the
+                display end of this segment's last frame
+        """
+        frames = self._tracks.pop(track_key, [])
+        if not frames:
+            return
+
+        first_timestamp = float(frames[0].get("timestamp", 0))
+        track_start = self._track_start.setdefault(track_key, first_timestamp)
+        last_timestamp = end_timestamp or float(frames[-1].get("timestamp", 0))
+        segments = self.track_segments.setdefault(track_key, [])
+        index = len(segments)
+        segments.append("")
+        self._segment_durations.setdefault(track_key, []).append(
+            max(last_timestamp - first_timestamp, 0.1)
+        )
+
+        task = asyncio.create_task(
+            self._encode_segment(
+                track_key, frames, index, first_timestamp - track_start, end_timestamp
+            )
+        )
+        self._segment_tasks.add(task)
+        task.add_done_callback(self._segment_tasks.discard)
+
+    async def _encode_segment(
+        self,
+        track_key: str,
+        frames: List[dict],
+        index: int,
+        offset_s: float,
+        end_timestamp: Optional[float],
+    ) -> None:
+        """Encode one segment and pass it to the segment callback."""
+        segment_path = await self._create_video_from_frames(
+            track_key,
+            frames,
+            segment_index=index,
+            offset_s=offset_s,
+            end_timestamp=end_timestamp,
+        )
+        if not segment_path:
+            return
+
+        self.track_segments[track_key][index] = segment_path
+        self._frame_pipeline.mark_encoded(len(frames))
+        self._write_playlist(track_key)
+        await self._deliver_segment(track_key, segment_path, index)
+
+    async def _deliver_segment(self, track_key: str, segment_path: str, index: int) -> None:
+        """Pass a finished segment to the segment callback."""
+        if self.segment_callback:
+            try:
+                await self.segment_callback(track_key, segment_path, index)
+            except Exception as e:
+                logger.error(f"Segment callback failed for {segment_path}: {e}")
+
+    def _add_thumbnail(self, track_key: str, jpeg_data: bytes, timestamp: float) -> None:
+        """Offer a frame to its track's thumbnail sprite."""
+        if not self._temp_dir:
+            return
+
+        sprite = self._thumbnail_sprites.get(track_key)
+        if sprite is None:
+            sprite = ThumbnailSprite(
+                self._temp_dir, self._track_name(track_key), interval_s=self.thumbnail_interval_s
+            )
+            self._thumbnail_sprites[track_key] = sprite
+        sprite.add_frame(jpeg_data, timestamp)
+
+    def _close_thumbnail_sprites(self) -> None:
+        """Flush every track's sprite sheet and record the index paths."""
+        for track_key, sprite in self._thumbnail_sprites.items():
+            try:
+                index_path = sprite.close()
+                if index_path:
+                    self.track_thumbnails[track_key] = index_path
+            except Exception as e:
+                logger.error(f"Failed to write thumbnails for track {track_key}: {e}")
+        self._thumbnail_sprites.clear()
+
+    def _write_mjpeg_frame(self, track_key: str, jpeg_data: bytes, timestamp: float) -> None:
+        """Mux a frame into its track's Matroska file, rotating files per segment."""
+        writer = self._mjpeg_writers.get(track_key)
+        if (
+            writer is not None
+            and self.segment_duration_s
+            and writer.start_timestamp is not None
+            and timestamp - writer.start_timestamp >= self.segment_duration_s
+        ):
+            self._finish_mjpeg_writer(track_key, end_timestamp=timestamp)
+            writer = None
+
+        if writer is None:
+            if not self._temp_dir:
+                logger.error("No temporary directory available")
+                return
+
+            track_name = self._track_name(track_key)
+            if self.segment_duration_s:
+                index = len(self.track_segments.get(track_key, []))
+                name = f"{track_name}_{index:05d}.mkv"
+            else:
+                name = f"screencast_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{track_name}.mkv"
+            writer = MJPEGWriter(os.path.join(self._temp_dir, name))
+            self._mjpeg_writers[track_key] = writer
+
+        writer.write_frame(jpeg_data, timestamp)
+        self._frame_pipeline.mark_encoded(1)
+
+    def _finish_mjpeg_writer(self, track_key: str, end_timestamp: Optional[float] = None) -> None:
+        """Close a track's Matroska file and publish it as a video or segment."""
+        writer = self._mjpeg_writers.pop(track_key, None)
+        if writer is None:
+            return
+
+        writer.close(end_timestamp=end_timestamp)
+        if not writer.frame_count:
+            return
+
+        if not self.segment_duration_s:
+            self.track_videos[track_key] = writer.path
+            return
+
+        segments = self.track_segments.setdefault(track_key, [])
+        segments.append(writer.path)
+        task = asyncio.create_task(self._deliver_segment(track_key, writer.path, len(segments) - 1))
+        self._segment_tasks.add(task)
+        task.add_done_callback(self._segment_tasks.discard)
+
+    def _write_playlist(self, track_key: str) -> Optional[str]:
+        """Write an HLS playlist listing the finished MPEG-TS segments of a track."""
+        if not self._temp_dir or not self.segment_duration_s or self.recording_mode != "h264":
+            return None
+
+        playlist_path = os.path.join(self._temp_dir, f"{self._track_name(track_key)}.m3u8")
+        durations = self._segment_durations.get(track_key, [])
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{int(max(durations, default=self.segment_duration_s)) + 1}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for segment_path, duration in zip(self.track_segments.get(track_key, []), durations):
+            if not segment_path:
+                break
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(os.path.basename(segment_path))
+        if not self._screencast_recording:
+            lines.append("#EXT-X-ENDLIST")
+
+        with open(playlist_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return playlist_path
+
+    def _primary_playlist_path(self) -> Optional[str]:
+        """Return the playlist of the active track, or of the track with the most segments."""
+        if not self.track_segments:
+            return None
+
+        if ACTIVE_TRACK in self.track_segments:
+            track_key = ACTIVE_TRACK
+        else:
+            track_key = max(self.track_segments, key=lambda k: len(self.track_segments[k]))
+        return self._write_playlist(track_key)
+
+    @staticmethod
+    def _track_name(track_key: str) -> str:
+        """Return a filesystem-safe name for a track key."""
+        return re.sub(r"[^A-Za-z0-9_-]", "", track_key)[:32] or DEFAULT_TRACK
+
+    def get_frame_stats(self) -> Dict[str, int]:
+        """Get counters for frames received, dropped, stored and encoded."""
+        return self._frame_pipeline.get_stats()
+
+    def _primary_video_path(self) -> Optional[str]:
+        """Return the video of the active track, or of the track with the most frames."""
+        if ACTIVE_TRACK in self.track_videos:
+            return self.track_videos[ACTIVE_TRACK]
+
+        counts = self._track_frame_counts
+        for track_key in sorted(counts, key=lambda k: counts[k], reverse=True):
+            if track_key in self.track_videos:
+                return self.track_videos[track_key]
+        return None
+
+    async def _create_videos_from_tracks(self) -> Dict[str, str]:
+        """Encode every recorded track into its own video in parallel.
+
+        Returns:
+            Dictionary mapping track key (session ID or "active") to video file path
+        """
+        track_keys = [key for key, frames in self._tracks.items() if frames]
+        results = await asyncio.gather(
+            *(self._create_video_from_frames(key, self._tracks[key]) for key in track_keys),
+            return_exceptions=True,
+        )
+
+        videos: Dict[str, str] = {}
+        for track_key, result in zip(track_keys, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Failed to create video for track {track_key}: {result}")
+            elif result:
+                videos[track_key] = result
+        return videos
+
+    async def _create_video_from_frames(
+        self,
+        track_key: str,
+        frames: List[dict],
+        segment_index: Optional[int] = None,
+        offset_s: float = 0.0,
+        end_timestamp: Optional[float] = None,
+    ) -> Optional[str]:
+        """Create a video file from the captured screencast frames of one track.
+
+        Args:
+            track_key: Key of the track the frames belong to
+            frames: Frames recorded for that track
+            segment_index: Index of the segment when writing an MPEG-TS segment
+            offset_s: Presentation time offset of the segment within the track
+            end_timestamp: Display end of the last frame, if known
 
         Returns:
             Path to the created video file, or None if creation failed
         """
         try:
-            if not self._screencast_frames:
-                logger.debug("No screencast frames to create video from")
+            if not frames:
+                logger.debug(f"No screencast frames to create video from for track {track_key}")
                 return None
 
             if not self._temp_dir:
                 logger.error("No temporary directory available")
                 return None
 
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            video_path = os.path.join(self._temp_dir, f"screencast_{timestamp}.mp4")
+            track_name = self._track_name(track_key)
+            if segment_index is not None:
+                name = f"{track_name}_{segment_index:05d}"
+                video_path = os.path.join(self._temp_dir, f"{name}.ts")
+            else:
+                name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{track_name}"
+                video_path = os.path.join(self._temp_dir, f"screencast_{name}.mp4")
 
-            frames_dir = os.path.join(self._temp_dir, f"frames_{timestamp}")
+            frames_dir = os.path.join(self._temp_dir, f"frames_{name}")
             os.makedirs(frames_dir, exist_ok=True)
 
-            sorted_frames = sorted(
-                self._screencast_frames, key=lambda x: float(x.get("timestamp", 0))
-            )
+            sorted_frames = sorted(frames, key=lambda x: float(x.get("timestamp", 0)))
 
             frame_files = []
             timestamps = []
@@ -279,7 +748,17 @@ class ScreencastUtil:
                 logger.error("No frames were successfully saved")
                 return None
 
-            success = await self._create_video_with_ffmpeg(frame_files, timestamps, video_path)
+            async with self._encode_slots:
+                success = await self._create_video_with_ffmpeg(
+                    frame_files,
+                    timestamps,
+                    video_path,
+                    offset_s=offset_s if segment_index is not None else None,
+                    end_timestamp=end_timestamp,
+                )
+
+            if segment_index is not None:
+                shutil.rmtree(frames_dir, ignore_errors=True)
 
             if success:
                 logger.debug(f"Video created: {video_path}")
@@ -292,7 +771,12 @@ class ScreencastUtil:
             return None
 
     async def _create_video_with_ffmpeg(
-        self, frame_files: List[str], timestamps: List[float], output_path: str
+        self,
+        frame_files: List[str],
+        timestamps: List[float],
+        output_path: str,
+        offset_s: Optional[float] = None,
+        end_timestamp: Optional[float] = None,
     ) -> bool:
         """Create video using ffmpeg from frame images with timestamp-based durations.
 
@@ -300,6 +784,8 @@ class ScreencastUtil:
             frame_files: List of paths to frame image files
             timestamps: List of timestamps for each frame
             output_path: Path where the video should be saved
+            offset_s: When set, write an MPEG-TS segment starting at this presentation time
+            end_timestamp: Display end of the last frame, if known
 
         Returns:
             True if video was created successfully, False otherwise
@@ -319,6 +805,8 @@ class ScreencastUtil:
                 for i, frame_path in enumerate(frame_files):
                     if i < len(frame_files) - 1:
                         duration = timestamps[i + 1] - timestamps[i]
+                    elif end_timestamp is not None:
+                        duration = end_timestamp - timestamps[i]
                     else:
                         if len(timestamps) > 1:
                             avg_duration = (timestamps[-1] - timestamps[0]) / (len(timestamps) - 1)
@@ -361,14 +849,18 @@ class ScreencastUtil:
                 "yuv420p",
                 "-vf",
                 "pad=ceil(iw/2)*2:ceil(ih/2)*2",
-                "-movflags",
-                "+faststart",
-                output_path,
             ]
+            if offset_s is not None:
+                cmd += ["-f", "mpegts", "-output_ts_offset", f"{offset_s:.3f}", output_path]
+            else:
+                cmd += ["-movflags", "+faststart", output_path]
 
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+            _, stderr = await process.communicate()
 
-            if result.returncode == 0 and os.path.exists(output_path):
+            if process.returncode == 0 and os.path.exists(output_path):
                 file_size = os.path.getsize(output_path)
                 if file_size > 0:
                     return True
@@ -376,20 +868,93 @@ class ScreencastUtil:
                     logger.error("Video file created but is empty")
                     return False
             else:
-                logger.error(f"ffmpeg failed with return code {result.returncode}")
-                logger.error(f"ffmpeg stderr: {result.stderr}")
+                logger.error(f"ffmpeg failed with return code {process.returncode}")
+                logger.error(f"ffmpeg stderr: {stderr.decode(errors='replace')}")
                 return False
 
         except Exception as e:
             logger.error(f"Error creating video with ffmpeg: {e}")
             return False
 
+    async def transcode_to_h264(self, path: str) -> Optional[str]:
+        """Transcode a recorded video (e.g. an MJPEG Matroska file) to H.264 MP4.
+
+        Args:
+            path: Path of the video to transcode
+
+        Returns:
+            Path to the MP4 file, or None if transcoding failed
+        """
+        output_path = os.path.splitext(path)[0] + ".mp4"
+        cmd = [
+            "ffmpeg",
+            "-y",
+            "-i",
+            path,
+            "-c:v",
+            "libx264",
+            "-preset",
+            "medium",
+            "-crf",
+            "23",
+            "-pix_fmt",
+            "yuv420p",
+            "-vf",
+            "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-movflags",
+            "+faststart",
+            output_path,
+        ]
+
+        try:
+            async with self._encode_slots:
+                process = await asyncio.create_subprocess_exec(
+                    *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+                )
+                _, stderr = await process.communicate()
+
+            if process.returncode == 0 and os.path.exists(output_path):
+                return output_path
+
+            logger.error(f"ffmpeg transcode failed with return code {process.returncode}")
+            logger.error(f"ffmpeg stderr: {stderr.decode(errors='replace')}")
+            return None
+        except Exception as e:
+            logger.error(f"Error transcoding video with ffmpeg: {e}")
+            return None
+
+    def export_thumbnails(self, output_dir: str) -> Dict[str, str]:
+        """
+        Copy each track's thumbnail index and sprite sheets out of the temporary directory,
+        so they outlive cleanup_temp_files.
+
+        Args:
+            output_dir: Directory the indexes and sheets are copied to
+
+        Returns:
+            Track key -> path of the copied JSON index
+        """
+        exported: Dict[str, str] = {}
+        if not self.track_thumbnails:
+            return exported
+        os.makedirs(output_dir, exist_ok=True)
+        for track_key, index_path in self.track_thumbnails.items():
+            try:
+                with open(index_path) as f:
+                    sheets = json.load(f).get("sheets", [])
+                source_dir = os.path.dirname(index_path)
+                # The index refers to its sheets by file name, so they are copied alongside
+                for sheet in sheets:
+                    shutil.copy2(os.path.join(source_dir, sheet), output_dir)
+                exported[track_key] = shutil.copy2(index_path, output_dir)
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to export thumbnails of track {track_key}: {e}")
+        return exported
+
     def cleanup_temp_files(self) -> None:
         """Clean up temporary files and directories created during screencast."""
         try:
             if self._temp_dir and os.path.exists(self._temp_dir):
-                import shutil
-
                 shutil.rmtree(self._temp_dir)
                 logger.debug(f"Cleaned up temporary directory: {self._temp_dir}")
                 self._temp_dir = None
@@ -2,23 +2,59 @@
 Screenshot Utility
 
 Handles screenshot capture functionality using CDP Page.captureScreenshot.
+Encoding (format, quality, downscale and capture flags) is configurable through
+ScreenshotOptions, with presets for upload, VLM and forensic use.
+Element screenshots for many backend nodes are cropped locally from a single capture
+using DOM snapshot layout bounds. Cropping needs Pillow (the "images" extra); without it
+each element is captured separately.
 """
 
 import asyncio
+import base64
+import io
 import logging
-from typing import Any, Dict, Optional, TypedDict, cast
+from dataclasses import dataclass, replace
+from functools import partial
+from typing import Any, Dict, Iterable, List, Literal, Optional, TypedDict, cast
 
 from .base_client import BaseCDPClient
+from .dom import DOMUtil, SnapshotLookup
+from .fanout import fan_out
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - Pillow is optional
+    Image = None  # type: ignore[assignment]
 
 
 logger = logging.getLogger(__name__)
 
+_warned_without_pillow = False
+
+
+def _warn_without_pillow() -> None:
+    global _warned_without_pillow
+    if not _warned_without_pillow:
+        _warned_without_pillow = True
+        logger.warning(
+            "Pillow is not installed, capturing element screenshots one by one; "
+            'install "clado-observe[images]" to crop them from a single capture'
+        )
+
+
+ScreenshotFormat = Literal["jpeg", "png", "webp"]
+
 
 class ClipParams(TypedDict, total=False):
     """Type definition for screenshot clip parameters."""
 
     type: str
     nodeId: str
+    x: float
+    y: float
+    width: float
+    height: float
+    scale: float
 
 
 class ScreenshotParams(TypedDict, total=False):
@@ -27,6 +63,60 @@ class ScreenshotParams(TypedDict, total=False):
     format: str
     quality: int
     clip: ClipParams
+    captureBeyondViewport: bool
+    fromSurface: bool
+    optimizeForSpeed: bool
+
+
+@dataclass(frozen=True)
+class ScreenshotOptions:
+    """Encoding and capture options for Page.captureScreenshot; derive variants with replace()."""
+
+    format: ScreenshotFormat = "png"
+    quality: Optional[int] = None
+    scale: float = 1.0
+    capture_beyond_viewport: bool = False
+    from_surface: bool = True
+    optimize_for_speed: bool = False
+
+    def __post_init__(self) -> None:
+        if self.format not in ("jpeg", "png", "webp"):
+            raise ValueError(f"Unsupported screenshot format: {self.format}")
+        if self.quality is not None and not 0 <= self.quality <= 100:
+            raise ValueError("quality must be between 0 and 100")
+        if self.scale <= 0:
+            raise ValueError("scale must be positive")
+
+    @property
+    def mime_type(self) -> str:
+        """MIME type of the captured image."""
+        return f"image/{self.format}"
+
+    def to_params(self, clip: Optional[ClipParams] = None) -> ScreenshotParams:
+        """Build Page.captureScreenshot parameters."""
+        params: ScreenshotParams = {
+            "format": self.format,
+            "fromSurface": self.from_surface,
+        }
+        # Chrome ignores quality for PNG
+        if self.quality is not None and self.format != "png":
+            params["quality"] = self.quality
+        if self.capture_beyond_viewport:
+            params["captureBeyondViewport"] = True
+        if self.optimize_for_speed:
+            params["optimizeForSpeed"] = True
+        if clip:
+            params["clip"] = clip
+        return params
+
+
+PIL_FORMATS = {"jpeg": "JPEG", "png": "PNG", "webp": "WEBP"}
+
+SCREENSHOT_PRESETS: Dict[str, ScreenshotOptions] = {
+    "upload": ScreenshotOptions(format="jpeg", quality=75, optimize_for_speed=True),
+    "vlm": ScreenshotOptions(format="jpeg", quality=60, scale=0.5, optimize_for_speed=True),
+    "forensic": ScreenshotOptions(format="png", capture_beyond_viewport=True),
+}
 
 
 class ScreenshotUtil:
@@ -34,28 +124,103 @@ class ScreenshotUtil:
     Utility for capturing screenshots from browser pages.
     """
 
-    def __init__(self, client: BaseCDPClient) -> None:
+    def __init__(self, client: BaseCDPClient, options: Optional[ScreenshotOptions] = None) -> None:
+        """
+        Initialize ScreenshotUtil.
+
+        Args:
+            client: The base CDP client for communication
+            options: Default screenshot options; PNG at full resolution when omitted
+        """
         self.client = client
+        self.options = options or ScreenshotOptions()
+
+    async def _get_layout_metrics(self, session_id: Optional[str]) -> Dict[str, Any]:
+        """Fetch Page.getLayoutMetrics for a session."""
+        fut = await self.client.send(
+            "Page.getLayoutMetrics", expect_result=True, session_id=session_id
+        )
+        assert fut is not None
+        msg = await asyncio.wait_for(fut, timeout=2.0)
+        return msg.get("result", {})
+
+    async def _get_device_pixel_ratio(self, session_id: Optional[str]) -> float:
+        """Device pixels per CSS pixel, from the layout metrics (1.0 if unavailable)."""
+        try:
+            metrics = await self._get_layout_metrics(session_id)
+        except Exception as e:
+            logger.debug(f"Failed to get layout metrics for device pixel ratio: {e}")
+            return 1.0
+        css_width = metrics.get("cssVisualViewport", {}).get("clientWidth")
+        device_width = metrics.get("visualViewport", {}).get("clientWidth")
+        if not css_width or not device_width:
+            return 1.0
+        return device_width / css_width
+
+    async def _get_scaled_clip(
+        self, options: ScreenshotOptions, session_id: Optional[str]
+    ) -> Optional[ClipParams]:
+        """
+        Build a clip covering the viewport (or full page) at the requested scale.
 
-    async def capture_screenshot(self, session_id: Optional[str] = None) -> Optional[str]:
+        Full-page captures always get a clip of the content size, since Chrome otherwise
+        captures only the viewport; viewport captures at scale 1 need none.
+        """
+        if options.scale == 1.0 and not options.capture_beyond_viewport:
+            return None
+
+        try:
+            metrics = await self._get_layout_metrics(session_id)
+            viewport = metrics.get("cssVisualViewport", {})
+
+            if options.capture_beyond_viewport:
+                content = metrics.get("cssContentSize", {})
+                return {
+                    "x": 0,
+                    "y": 0,
+                    "width": content.get("width", viewport.get("clientWidth", 0)),
+                    "height": content.get("height", viewport.get("clientHeight", 0)),
+                    "scale": options.scale,
+                }
+
+            return {
+                "x": viewport.get("pageX", 0),
+                "y": viewport.get("pageY", 0),
+                "width": viewport.get("clientWidth", 0),
+                "height": viewport.get("clientHeight", 0),
+                "scale": options.scale,
+            }
+        except Exception as e:
+            logger.debug(f"Failed to get layout metrics for scaled screenshot: {e}")
+            return None
+
+    async def capture_screenshot(
+        self,
+        session_id: Optional[str] = None,
+        options: Optional[ScreenshotOptions] = None,
+        clip: Optional[ClipParams] = None,
+    ) -> Optional[str]:
         """
         Capture a screenshot and return the base64 encoded image data as data URI.
 
         Args:
             session_id: Optional session ID for targeted screenshot
+            options: Screenshot options overriding the utility defaults for this capture
+            clip: Explicit page-coordinate clip; replaces the clip derived from options.scale
 
         Returns:
             Data URI formatted base64 image data (data:image/png;base64,...) or None if failed
         """
+        options = options or self.options
         max_retries = 2
         timeout_seconds = 2.0
 
+        if clip is None:
+            clip = await self._get_scaled_clip(options, session_id)
+
         for attempt in range(max_retries + 1):
             try:
-                params: ScreenshotParams = {
-                    "format": "png",
-                    "quality": 60,
-                }
+                params = options.to_params(clip)
 
                 fut = await self.client.send(
                     "Page.captureScreenshot",
@@ -70,7 +235,7 @@ class ScreenshotUtil:
                 screenshot_data = result.get("data")
                 if screenshot_data:
                     logger.debug(f"Screenshot captured successfully on attempt {attempt + 1}")
-                    return f"data:image/png;base64,{screenshot_data}"
+                    return f"data:{options.mime_type};base64,{screenshot_data}"
 
                 logger.warning(f"Screenshot capture returned no data on attempt {attempt + 1}")
 
@@ -92,18 +257,30 @@ class ScreenshotUtil:
         logger.error(f"Failed to capture screenshot after {max_retries + 1} attempts")
         return None
 
-    async def capture_screenshot_from_all_pages(self) -> Dict[str, Optional[str]]:
+    async def capture_screenshot_from_all_pages(
+        self,
+        options: Optional[ScreenshotOptions] = None,
+        max_concurrency: int = 4,
+        timeout_s: float = 10.0,
+    ) -> Dict[str, Optional[str]]:
         """
-        Capture screenshots from all attached page sessions.
+        Capture screenshots from all attached page sessions concurrently.
+
+        Args:
+            options: Screenshot options overriding the utility defaults
+            max_concurrency: Maximum number of pages captured at once
+            timeout_s: Overall deadline; pages not captured in time map to None
 
         Returns:
             Dictionary mapping target_id to data URI formatted base64 image data
         """
-        screenshots = {}
-        for target_id, session_id in self.client.get_session_ids().items():
-            screenshot_data = await self.capture_screenshot(session_id=session_id)
-            screenshots[target_id] = screenshot_data
-        return screenshots
+        jobs = {
+            target_id: partial(self.capture_screenshot, session_id=session_id, options=options)
+            for target_id, session_id in self.client.get_session_ids().items()
+        }
+        return await fan_out(
+            jobs, default_factory=lambda: None, max_concurrency=max_concurrency, timeout_s=timeout_s
+        )
 
     async def capture_element_screenshot(
         self, element_id: str, session_id: Optional[str] = None
@@ -112,58 +289,176 @@ class ScreenshotUtil:
         Capture a screenshot of a specific DOM element.
 
         Args:
-            element_id: The DOM element ID
+            element_id: The DOM node ID of the element
             session_id: Optional session ID for targeted screenshot
 
         Returns:
             Data URI formatted base64 image data (data:image/png;base64,...) or None if failed
         """
-        max_retries = 2
-        timeout_seconds = 2.0
-        for attempt in range(max_retries + 1):
-            try:
-                params: ScreenshotParams = {
-                    "format": "png",
-                    "quality": 60,
-                    "clip": {"type": "node", "nodeId": element_id},
-                }
-
-                fut = await self.client.send(
-                    "Page.captureScreenshot",
-                    params=cast(Dict[str, Any], params),
-                    expect_result=True,
-                    session_id=session_id,
-                )
-                assert fut is not None
+        try:
+            fut = await self.client.send(
+                "DOM.getBoxModel",
+                params={"nodeId": int(element_id)},
+                expect_result=True,
+                session_id=session_id,
+            )
+            assert fut is not None
+            msg = await asyncio.wait_for(fut, timeout=2.0)
+            quad = msg.get("result", {}).get("model", {}).get("border", [])
+            if len(quad) < 8:
+                logger.warning(f"No box model for element {element_id}")
+                return None
+
+            viewport = (await self._get_layout_metrics(session_id)).get("cssVisualViewport", {})
+        except Exception as e:
+            logger.warning(f"Failed to resolve element {element_id} bounds: {e}")
+            return None
+
+        xs, ys = quad[0::2], quad[1::2]
+        clip: ClipParams = {
+            "x": min(xs) + viewport.get("pageX", 0),
+            "y": min(ys) + viewport.get("pageY", 0),
+            "width": max(xs) - min(xs),
+            "height": max(ys) - min(ys),
+            "scale": 1,
+        }
+        if clip["width"] <= 0 or clip["height"] <= 0:
+            return None
+
+        options = replace(self.options, scale=1.0, capture_beyond_viewport=True)
+        return await self.capture_screenshot(session_id=session_id, options=options, clip=clip)
+
+    async def capture_element_screenshots(
+        self,
+        backend_node_ids: Iterable[int],
+        snapshot: Optional[SnapshotLookup] = None,
+        session_id: Optional[str] = None,
+        options: Optional[ScreenshotOptions] = None,
+        padding: int = 0,
+    ) -> Dict[int, Optional[str]]:
+        """
+        Capture screenshots of many elements with a single browser capture.
 
-                # Add timeout to the future
-                msg = await asyncio.wait_for(fut, timeout=timeout_seconds)
-                result = msg.get("result", {})
-                screenshot_data = result.get("data")
-                if screenshot_data:
-                    logger.debug(
-                        f"Element screenshot captured successfully for element {element_id} on attempt {attempt + 1}"
-                    )
-                    return f"data:image/png;base64,{screenshot_data}"
+        Element boxes come from the DOM snapshot layout bounds, which are document
+        coordinates in device pixels and are converted to CSS pixels. The union of all boxes
+        is captured once and every element is cropped from it locally.
 
-                logger.warning(
-                    f"Element screenshot capture returned no data on attempt {attempt + 1}"
-                )
+        Args:
+            backend_node_ids: Backend node IDs of the elements to capture
+            snapshot: Enhanced snapshot lookup from DOMUtil; captured when omitted
+            session_id: Optional session ID for targeted screenshot
+            options: Encoding options for the element images; scale is ignored
+            padding: Extra CSS pixels to include around each element
 
-            except asyncio.TimeoutError:
-                logger.warning(
-                    f"Element screenshot capture timed out on attempt {attempt + 1}/{max_retries + 1}"
-                )
-            except Exception as e:
-                logger.warning(
-                    f"Element screenshot capture failed on attempt {attempt + 1}/{max_retries + 1}: {e}"
+        Returns:
+            Dictionary mapping backend node ID to data URI, or None for elements without
+            a visible box
+        """
+        node_ids = list(dict.fromkeys(backend_node_ids))
+        results: Dict[int, Optional[str]] = {node_id: None for node_id in node_ids}
+        if not node_ids:
+            return results
+
+        options = replace(options or self.options, scale=1.0)
+
+        if snapshot is None:
+            snapshot = await DOMUtil(self.client).capture_snapshot(session_id=session_id)
+        device_pixel_ratio = await self._get_device_pixel_ratio(session_id)
+        boxes = self._resolve_element_boxes(node_ids, snapshot, padding, device_pixel_ratio)
+        if not boxes:
+            return results
+
+        if Image is None:
+            _warn_without_pillow()
+            for node_id, box in boxes.items():
+                results[node_id] = await self.capture_screenshot(
+                    session_id=session_id,
+                    options=replace(options, capture_beyond_viewport=True),
+                    clip=box,
                 )
+            return results
+
+        union: ClipParams = {
+            "x": min(box["x"] for box in boxes.values()),
+            "y": min(box["y"] for box in boxes.values()),
+            "width": 0,
+            "height": 0,
+            "scale": 1,
+        }
+        union["width"] = max(box["x"] + box["width"] for box in boxes.values()) - union["x"]
+        union["height"] = max(box["y"] + box["height"] for box in boxes.values()) - union["y"]
+
+        capture_options = replace(options, format="png", capture_beyond_viewport=True)
+        capture = await self.capture_screenshot(
+            session_id=session_id, options=capture_options, clip=union
+        )
+        if not capture:
+            return results
+
+        try:
+            image = Image.open(io.BytesIO(base64.b64decode(capture.split(",", 1)[1])))
+            image.load()
+        except Exception as e:
+            logger.warning(f"Failed to decode batched element capture: {e}")
+            return results
+
+        ratio_x = image.width / union["width"]
+        ratio_y = image.height / union["height"]
+        pil_format = PIL_FORMATS[options.format]
+        if pil_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        for node_id, box in boxes.items():
+            left = int((box["x"] - union["x"]) * ratio_x)
+            top = int((box["y"] - union["y"]) * ratio_y)
+            right = min(int(round(left + box["width"] * ratio_x)), image.width)
+            bottom = min(int(round(top + box["height"] * ratio_y)), image.height)
+            if right <= left or bottom <= top:
+                continue
+
+            buffer = io.BytesIO()
+            save_kwargs: Dict[str, Any] = {}
+            if options.quality is not None and pil_format != "PNG":
+                save_kwargs["quality"] = options.quality
+            image.crop((left, top, right, bottom)).save(buffer, pil_format, **save_kwargs)
+            encoded = base64.b64encode(buffer.getvalue()).decode("utf-8")
+            results[node_id] = f"data:{options.mime_type};base64,{encoded}"
+
+        return results
+
+    @staticmethod
+    def _resolve_element_boxes(
+        node_ids: List[int],
+        snapshot: SnapshotLookup,
+        padding: int,
+        device_pixel_ratio: float = 1.0,
+    ) -> Dict[int, ClipParams]:
+        """
+        Map backend node IDs to non-empty clip rectangles from snapshot layout bounds.
 
-            # Don't wait after the last attempt
-            if attempt < max_retries:
-                backoff_delay = min(1 + attempt * 0.5, 3)  # Much faster backoff: 1s, 1.5s, 2s max
-                logger.debug(f"Waiting {backoff_delay}s before retry...")
-                await asyncio.sleep(backoff_delay)
-
-        logger.error(f"Failed to capture element screenshot after {max_retries + 1} attempts")
-        return None
+        Bounds are divided by device_pixel_ratio to get the CSS pixels clips are given in.
+        """
+        wanted = set(node_ids)
+        boxes: Dict[int, ClipParams] = {}
+
+        for node in snapshot.values():
+            node_id = node.get("backend_node_id")
+            box = node.get("bounding_box")
+            if node_id not in wanted or node_id in boxes or not box:
+                continue
+            if box["width"] <= 0 or box["height"] <= 0:
+                continue
+
+            left = box["x"] / device_pixel_ratio
+            top = box["y"] / device_pixel_ratio
+            x = max(left - padding, 0)
+            y = max(top - padding, 0)
+            boxes[node_id] = {
+                "x": x,
+                "y": y,
+                "width": left + box["width"] / device_pixel_ratio + padding - x,
+                "height": top + box["height"] / device_pixel_ratio + padding - y,
+                "scale": 1,
+            }
+
+        return boxes
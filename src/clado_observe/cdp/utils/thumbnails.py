@@ -0,0 +1,217 @@
+"""
+Thumbnail Sprite Utility
+
+Builds sprite sheets of low-resolution thumbnails from screencast frames as they arrive,
+at fixed intervals and at visual-change points, together with a JSON index mapping
+time to sprite tile. Frames are decoded with JPEG draft mode at reduced scale, so no
+full-resolution decode happens and nothing is left to do at the end but flush the last sheet.
+
+Requires Pillow (the "images" extra); when it is not installed thumbnail generation is
+disabled.
+"""
+
+import io
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+try:
+    from PIL import Image, ImageChops, ImageStat
+except ImportError:  # pragma: no cover - Pillow is optional
+    Image = None  # type: ignore[assignment]
+    ImageChops = None  # type: ignore[assignment]
+    ImageStat = None  # type: ignore[assignment]
+
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_SIZE = (16, 9)
+
+
+class ThumbnailSprite:
+    """
+    Incremental sprite sheet and index writer for one screencast track.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        name: str,
+        interval_s: float = 5.0,
+        change_threshold: float = 0.08,
+        min_change_gap_s: float = 0.5,
+        tile_width: int = 160,
+        tile_height: int = 90,
+        columns: int = 10,
+        rows: int = 10,
+        quality: int = 60,
+    ) -> None:
+        """
+        Initialize ThumbnailSprite.
+
+        Args:
+            output_dir: Directory the sheets and index are written to
+            name: File name prefix for this track
+            interval_s: Take a thumbnail at least this often
+            change_threshold: Mean grayscale difference (0-1) that counts as a visual change
+            min_change_gap_s: Minimum time between change checks
+            tile_width: Thumbnail width in pixels
+            tile_height: Thumbnail height in pixels
+            columns: Tiles per sheet row
+            rows: Tile rows per sheet; a new sheet is started when one is full
+            quality: JPEG quality of the sheets
+        """
+        self.output_dir = output_dir
+        self.name = name
+        self.interval_s = interval_s
+        self.change_threshold = change_threshold
+        self.min_change_gap_s = min_change_gap_s
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.columns = columns
+        self.rows = rows
+        self.quality = quality
+
+        self.index_path = os.path.join(output_dir, f"{name}_thumbnails.json")
+        self.sheets: List[str] = []
+        self.tiles: List[Dict[str, Any]] = []
+
+        self._sheet: Optional[Any] = None
+        self._sheet_tiles = 0
+        self._start_timestamp: Optional[float] = None
+        self._last_tile_timestamp: Optional[float] = None
+        self._last_check_timestamp: Optional[float] = None
+        self._last_signature: Optional[Any] = None
+
+    @staticmethod
+    def is_available() -> bool:
+        """Whether Pillow is installed."""
+        return Image is not None
+
+    def add_frame(self, jpeg_data: bytes, timestamp: float) -> bool:
+        """
+        Offer a frame to the timeline.
+
+        Args:
+            jpeg_data: Raw JPEG bytes of the frame
+            timestamp: Capture timestamp in seconds
+
+        Returns:
+            True if the frame was added as a thumbnail
+        """
+        if Image is None:
+            return False
+
+        if self._start_timestamp is None:
+            self._start_timestamp = timestamp
+
+        due = (
+            self._last_tile_timestamp is None
+            or timestamp - self._last_tile_timestamp >= self.interval_s
+        )
+        if (
+            not due
+            and self._last_check_timestamp is not None
+            and timestamp - self._last_check_timestamp < self.min_change_gap_s
+        ):
+            return False
+        self._last_check_timestamp = timestamp
+
+        try:
+            image = Image.open(io.BytesIO(jpeg_data))
+            image.draft("RGB", (self.tile_width, self.tile_height))
+            image = image.convert("RGB")
+            signature = image.convert("L").resize(SIGNATURE_SIZE)
+        except Exception as e:
+            logger.debug(f"Failed to decode frame for thumbnail: {e}")
+            return False
+
+        reason = "interval"
+        if not due:
+            if self._change_score(signature) < self.change_threshold:
+                return False
+            reason = "change"
+
+        self._add_tile(image, timestamp, reason)
+        self._last_signature = signature
+        self._last_tile_timestamp = timestamp
+        return True
+
+    def close(self) -> Optional[str]:
+        """
+        Flush the open sheet and write the index.
+
+        Returns:
+            Path of the JSON index, or None if no thumbnails were taken
+        """
+        self._flush_sheet()
+        if not self.tiles:
+            return None
+
+        index = {
+            "tile_width": self.tile_width,
+            "tile_height": self.tile_height,
+            "columns": self.columns,
+            "rows": self.rows,
+            "start_timestamp": self._start_timestamp,
+            "sheets": [os.path.basename(path) for path in self.sheets],
+            "tiles": self.tiles,
+        }
+        with open(self.index_path, "w") as f:
+            json.dump(index, f)
+        return self.index_path
+
+    def _change_score(self, signature: Any) -> float:
+        """Mean absolute grayscale difference to the last thumbnail, scaled to 0-1."""
+        if self._last_signature is None:
+            return 1.0
+        diff = ImageChops.difference(signature, self._last_signature)
+        return ImageStat.Stat(diff).mean[0] / 255.0
+
+    def _add_tile(self, image: Any, timestamp: float, reason: str) -> None:
+        """Paste a thumbnail into the open sheet and record it in the index."""
+        if self._sheet is None:
+            self._sheet = Image.new(
+                "RGB", (self.tile_width * self.columns, self.tile_height * self.rows)
+            )
+            self._sheet_tiles = 0
+
+        image.thumbnail((self.tile_width, self.tile_height))
+        column = self._sheet_tiles % self.columns
+        row = self._sheet_tiles // self.columns
+        x = column * self.tile_width
+        y = row * self.tile_height
+        self._sheet.paste(image, (x, y))
+
+        assert self._start_timestamp is not None
+        self.tiles.append(
+            {
+                "t": round(timestamp - self._start_timestamp, 3),
+                "timestamp": timestamp,
+                "sheet": len(self.sheets),
+                "x": x,
+                "y": y,
+                "w": image.width,
+                "h": image.height,
+                "reason": reason,
+            }
+        )
+
+        self._sheet_tiles += 1
+        if self._sheet_tiles >= self.columns * self.rows:
+            self._flush_sheet()
+
+    def _flush_sheet(self) -> None:
+        """Write the open sheet to disk, cropped to the rows in use."""
+        if self._sheet is None or not self._sheet_tiles:
+            return
+
+        used_rows = (self._sheet_tiles + self.columns - 1) // self.columns
+        sheet = self._sheet.crop((0, 0, self._sheet.width, used_rows * self.tile_height))
+        path = os.path.join(self.output_dir, f"{self.name}_sprite_{len(self.sheets):03d}.jpg")
+        sheet.save(path, "JPEG", quality=self.quality)
+
+        self.sheets.append(path)
+        self._sheet = None
+        self._sheet_tiles = 0
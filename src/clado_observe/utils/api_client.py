@@ -1,45 +1,154 @@
 import aiohttp
 import asyncio
 import json
-from typing import Any, Dict, Optional, Literal, Union
-from dataclasses import dataclass
+import math
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple, Union
 import logging
 
+from .media_upload import (
+    MediaUploadError,
+    clear_upload_state,
+    guess_mime_type,
+    load_upload_state,
+    media_filename,
+    parse_data_uri,
+    read_part,
+    save_upload_state,
+)
+from .outbox import DEFAULT_MAX_AGE_S, DEFAULT_MAX_BYTES, Outbox, OutboxRecord
+from .rate_limiter import AdaptiveLimiter, LimiterSlot
+from .trace_batcher import Compression, TraceBatcher, decode_batch, encode_batch
+from .trace_sink import MediaType, Session, TraceResponse, TraceSink, TraceType
+
 logging.getLogger("aiohttp").setLevel(logging.WARNING)
 
-TraceType = Literal["dom", "action", "eval", "tool", "thought", "network", "final"]
-TraceResponse = Dict[str, Union[str, int]]
+DEFAULT_BASE_URL = "https://ingestion.clado.ai"
 
+# Statuses worth retrying; any other non-200 answer rejects an outbox record for good
+RETRYABLE_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+OUTBOX_REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=60)
+# Trace batches read from the outbox at once, so several can be in flight
+OUTBOX_READ_BATCHES = 8
+# 404 bodies of a route the API does not serve (aiohttp and FastAPI defaults), compared
+# without whitespace and case; other 404s, e.g. "Unknown session", come from the endpoint
+MISSING_ENDPOINT_BODIES = ("404:notfound", "notfound", '{"detail":"notfound"}')
+# Media bodies can take arbitrarily long to send, so only stalls are timed out
+MEDIA_REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
 
-@dataclass
-class Session:
-    """Represents an API session"""
 
-    id: str
-    prompt: str
-    model: str
-    param: Optional[Dict[str, Any]] = None
+def endpoint_missing(status: int, body: str) -> bool:
+    """Whether a response says the endpoint itself does not exist."""
+    if status == 405:
+        return True
+    return status == 404 and "".join(body.split()).lower() in MISSING_ENDPOINT_BODIES
 
 
-class APIClient:
+class APIClient(TraceSink):
     """Client for interacting with the observability API at ingestion.clado.ai"""
 
-    def __init__(self, api_key: str, skip_verification: bool = False):
+    name = "http"
+
+    def __init__(
+        self,
+        api_key: str,
+        skip_verification: bool = False,
+        base_url: str = DEFAULT_BASE_URL,
+        batch_traces: bool = False,
+        max_batch_traces: int = 500,
+        max_batch_age_s: float = 1.0,
+        compression: Compression = "gzip",
+        outbox_dir: Optional[str] = None,
+        outbox_drain_timeout_s: float = 5.0,
+        outbox_max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+        outbox_max_age_s: Optional[float] = DEFAULT_MAX_AGE_S,
+        multipart_threshold_bytes: int = 32 * 1024 * 1024,
+        media_part_size: int = 8 * 1024 * 1024,
+        media_part_retries: int = 3,
+        media_max_attempts: int = 8,
+        max_trace_concurrency: int = 32,
+        max_media_concurrency: int = 4,
+    ):
         """
         Initialize the API client and optionally verify the API key.
 
         Args:
             api_key: The API key for authentication
             skip_verification: If True, skip API key verification during init
+            base_url: Ingestion API base URL (e.g. a LocalIngestServer for tests)
+            batch_traces: Buffer traces and send them in compressed batches to the bulk
+                endpoint instead of one request per trace
+            max_batch_traces: Flush a batch when it holds this many traces
+            max_batch_age_s: Flush a batch when its oldest trace is this old
+            compression: Batch compression ("gzip", "zstd" or "none")
+            outbox_dir: Write traces, media, session updates and session ends to a
+                durable outbox in this directory and send them from a background thread,
+                retrying while the API is unavailable; unsent records are resent on the
+                next start
+            outbox_drain_timeout_s: How long close() waits for the outbox to drain
+            outbox_max_bytes: Disk space of the outbox; the oldest unsent records are
+                dropped beyond it (None for no limit)
+            outbox_max_age_s: Unsent records older than this are dropped (None to keep them)
+            multipart_threshold_bytes: Upload media of at least this size in resumable parts
+            media_part_size: Part size of resumable uploads, unless the API chooses one
+            media_part_retries: Attempts per part before a resumable upload is given up
+            media_max_attempts: Deliveries of an outbox media record before it is dropped,
+                so one failing upload cannot hold up the records behind it
+            max_trace_concurrency: Upper bound of the adaptive concurrency limit for
+                traces and session calls
+            max_media_concurrency: Upper bound of the adaptive concurrency limit for
+                media uploads, which have their own budget so they cannot delay traces
 
         Raises:
             Exception: If the API key is invalid (when skip_verification is False)
         """
-        self.base_url = "https://ingestion.clado.ai"
+        self.base_url = base_url.rstrip("/")
         self.api_key = api_key
         self.headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
         self.session_id: Optional[str] = None
         self._client_sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self.limiters = {
+            "traces": AdaptiveLimiter("traces", initial_limit=8, max_limit=max_trace_concurrency),
+            "media": AdaptiveLimiter(
+                "media",
+                initial_limit=min(2, max_media_concurrency),
+                max_limit=max_media_concurrency,
+            ),
+        }
+        self.batch_traces = batch_traces
+        self.max_batch_traces = max_batch_traces
+        self.compression = compression
+        self.trace_batcher: Optional[TraceBatcher] = None
+        self._bulk_traces_supported = True
+        self.multipart_threshold_bytes = multipart_threshold_bytes
+        self.media_part_size = media_part_size
+        self.media_part_retries = media_part_retries
+        self.media_max_attempts = media_max_attempts
+        self._media_attempts: Dict[int, int] = {}
+        # Outbox records sent after an earlier record failed; skipped when retried
+        self._outbox_sent_ids: Set[int] = set()
+        self._multipart_media_supported = True
+        self.outbox: Optional[Outbox] = None
+        self.outbox_drain_timeout_s = outbox_drain_timeout_s
+        if outbox_dir:
+            # The outbox sender groups consecutive traces into batches itself
+            self.outbox = Outbox(
+                outbox_dir,
+                self._deliver_outbox,
+                max_batch_records=max_batch_traces * OUTBOX_READ_BATCHES,
+                max_bytes=outbox_max_bytes,
+                max_age_s=outbox_max_age_s,
+                on_close=self._close_loop_session,
+            )
+            self.outbox.start()
+        elif batch_traces:
+            self.trace_batcher = TraceBatcher(
+                self._send_trace_batch,
+                max_batch_traces=max_batch_traces,
+                max_batch_age_s=max_batch_age_s,
+                compression=compression,
+            )
 
         # Only verify if not skipping (to avoid event loop issues in sync context)
         if not skip_verification and not self._verify_api_key_sync():
@@ -54,8 +163,55 @@ class APIClient:
 
         return self._client_sessions[loop]
 
+    @asynccontextmanager
+    async def _limit(self, budget: str) -> AsyncIterator[LimiterSlot]:
+        """Hold a slot of a concurrency budget ("traces" or "media") for one request"""
+        async with await self.limiters[budget].acquire() as slot:
+            yield slot
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of the batcher, the outbox and the concurrency budgets"""
+        stats: Dict[str, Any] = {"name": self.name, "limiters": self.get_limiter_stats()}
+        if self.trace_batcher:
+            stats["batcher"] = {
+                "traces_sent": self.trace_batcher.traces_sent,
+                "batches_sent": self.trace_batcher.batches_sent,
+                "batches_failed": self.trace_batcher.batches_failed,
+                "traces_dropped": self.trace_batcher.traces_dropped,
+                "pending": self.trace_batcher.pending(),
+            }
+        if self.outbox:
+            stats["outbox"] = {
+                "records_appended": self.outbox.records_appended,
+                "records_delivered": self.outbox.records_delivered,
+                "delivery_failures": self.outbox.delivery_failures,
+                "records_dropped": self.outbox.records_dropped,
+                "pending": self.outbox.pending(),
+            }
+        return stats
+
+    def get_limiter_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Current state of the concurrency budgets.
+
+        Returns:
+            Per budget: limit, in-flight and queued requests, smoothed and maximum
+            queueing delay, remaining Retry-After pause and overload counters
+        """
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+    async def _close_loop_session(self) -> None:
+        """Close the aiohttp session of the current event loop"""
+        session = self._client_sessions.pop(asyncio.get_event_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
     async def close(self):
-        """Close all aiohttp sessions"""
+        """Flush buffered traces, stop the outbox sender and close all aiohttp sessions"""
+        if self.outbox:
+            await asyncio.to_thread(self.outbox.close, self.outbox_drain_timeout_s)
+        else:
+            await self.flush_traces()
         for session in self._client_sessions.values():
             if not session.closed:
                 await session.close()
@@ -93,7 +249,11 @@ class APIClient:
             return False
 
     async def create_session(
-        self, prompt: str, model: str, param: Optional[Dict[str, Any]] = None
+        self,
+        prompt: str,
+        model: str,
+        param: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
     ) -> Session:
         """
         Create a new session.
@@ -102,6 +262,7 @@ class APIClient:
             prompt: The task/prompt for the AI model
             model: The AI model name/identifier
             param: Optional additional parameters
+            session_id: Ignored; the API assigns session ids
 
         Returns:
             Session object with the created session data
@@ -111,7 +272,11 @@ class APIClient:
 
         try:
             client = await self._get_session()
-            async with client.post(url, headers=self.headers, json=payload) as response:
+            async with (
+                self._limit("traces") as slot,
+                client.post(url, headers=self.headers, json=payload) as response,
+            ):
+                slot.record(response.status, response.headers.get("Retry-After"))
                 if response.status == 200:
                     text = await response.text()
                     try:
@@ -151,12 +316,21 @@ class APIClient:
         if not sid:
             raise ValueError("No session ID provided or set")
 
+        if self.outbox:
+            # Queued behind the session's traces, so it is sent after them
+            await asyncio.to_thread(self.outbox.append, "end", {"session_id": sid})
+            return "queued"
+
+        await self.flush_traces(sid)
+
         url = f"{self.base_url}/session/{sid}/end"
 
         client = await self._get_session()
-        async with client.post(
-            url, headers={"Authorization": f"Bearer {self.api_key}"}
-        ) as response:
+        async with (
+            self._limit("traces") as slot,
+            client.post(url, headers={"Authorization": f"Bearer {self.api_key}"}) as response,
+        ):
+            slot.record(response.status, response.headers.get("Retry-After"))
             if response.status == 200:
                 print(f"[API] Ended session: {sid}")
                 return await response.text()
@@ -165,44 +339,255 @@ class APIClient:
                 raise Exception(f"Failed to end session: {response.status} - {error}")
 
     async def upload_media(
-        self, media_type: Literal["image", "video"], data: str, session_id: Optional[str] = None
+        self,
+        media_type: MediaType,
+        data: Union[str, bytes],
+        session_id: Optional[str] = None,
+        mime_type: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Upload media (screenshot or video) to the API as raw bytes.
+
+        Args:
+            media_type: Type of media ("image" or "video")
+            data: Raw media bytes, or a data URI (e.g., data:image/png;base64,...)
+            session_id: The session ID (uses current session if not provided)
+            mime_type: MIME type of the media (taken from the data URI if not provided)
+
+        Returns:
+            URL of the uploaded media, an "outbox:<id>" reference when it was queued in
+            the outbox, or None if failed
+        """
+        sid = session_id or self.session_id
+        if not sid:
+            raise ValueError("No session ID provided or set")
+
+        if isinstance(data, str):
+            uri_mime_type, data = parse_data_uri(data)
+            mime_type = mime_type or uri_mime_type
+        mime_type = mime_type or "application/octet-stream"
+
+        if self.outbox:
+            record_id = await asyncio.to_thread(
+                self.outbox.append,
+                "media",
+                {"session_id": sid, "media_type": media_type, "mime_type": mime_type},
+                data,
+            )
+            return f"outbox:{record_id}"
+
+        try:
+            return await self._transfer_media(sid, media_type, mime_type, data=data)
+        except MediaUploadError as e:
+            print(f"[API] Failed to upload media: {e}")
+            return None
+
+    async def upload_media_file(
+        self,
+        media_type: MediaType,
+        path: str,
+        session_id: Optional[str] = None,
+        mime_type: Optional[str] = None,
     ) -> Optional[str]:
         """
-        Upload media (screenshot or video) to the API.
+        Upload a media file, streaming it from disk instead of loading it into memory.
 
         Args:
             media_type: Type of media ("image" or "video")
-            data: Data URI formatted media data (e.g., data:image/png;base64,...)
+            path: Path of the media file
             session_id: The session ID (uses current session if not provided)
+            mime_type: MIME type of the media (guessed from the extension if not provided)
 
         Returns:
-            URL of the uploaded media or None if failed
+            URL of the uploaded media, an "outbox:<id>" reference when it was queued in
+            the outbox (the file may be deleted afterwards), or None if failed
         """
         sid = session_id or self.session_id
         if not sid:
             raise ValueError("No session ID provided or set")
 
+        mime_type = mime_type or guess_mime_type(path, media_type)
+
+        if self.outbox:
+            record_id = await asyncio.to_thread(
+                self.outbox.append,
+                "media",
+                {"session_id": sid, "media_type": media_type, "mime_type": mime_type},
+                None,
+                path,
+            )
+            return f"outbox:{record_id}"
+
+        try:
+            return await self._transfer_media(sid, media_type, mime_type, path=path)
+        except MediaUploadError as e:
+            print(f"[API] Failed to upload media: {e}")
+            return None
+
+    async def _transfer_media(
+        self,
+        sid: str,
+        media_type: str,
+        mime_type: str,
+        data: Optional[bytes] = None,
+        path: Optional[str] = None,
+        state_path: Optional[str] = None,
+    ) -> str:
+        """
+        Upload media bytes or a media file, in resumable parts if it is large.
+
+        Returns:
+            URL of the uploaded media
+
+        Raises:
+            MediaUploadError: If the upload failed
+        """
+        size = len(data) if data is not None else os.path.getsize(path or "")
+        if size >= self.multipart_threshold_bytes and self._multipart_media_supported:
+            media_url = await self._multipart_media_upload(
+                sid, media_type, mime_type, size, data, path, state_path
+            )
+            if media_url is not None:
+                return media_url
+
         url = f"{self.base_url}/session/{sid}/trace/media"
+        media_file = open(path, "rb") if data is None and path else None
+        try:
+            # aiohttp streams file parts in chunks
+            form = aiohttp.FormData()
+            form.add_field("type", media_type)
+            form.add_field(
+                "data",
+                media_file if media_file is not None else data,
+                content_type=mime_type,
+                filename=media_filename(media_type, mime_type),
+            )
+            response = await self._media_request("POST", url, data=form)
+            return await response.json()
+        finally:
+            if media_file is not None:
+                media_file.close()
+
+    async def _multipart_media_upload(
+        self,
+        sid: str,
+        media_type: str,
+        mime_type: str,
+        size: int,
+        data: Optional[bytes],
+        path: Optional[str],
+        state_path: Optional[str],
+    ) -> Optional[str]:
+        """
+        Upload media in parts through the resumable upload endpoints.
 
-        form = aiohttp.FormData()
-        form.add_field("type", media_type)
-        form.add_field("data", data)
+        Returns:
+            URL of the uploaded media, or None if the API has no resumable uploads
 
+        Raises:
+            MediaUploadError: If the upload failed
+        """
+        uploads_url = f"{self.base_url}/session/{sid}/trace/media/uploads"
+        received: set = set()
+
+        state = load_upload_state(state_path)
+        if state is not None:
+            response = await self._media_request(
+                "GET", f"{uploads_url}/{state['upload_id']}", allow_statuses=(404,)
+            )
+            if response.status == 404:
+                state = None
+            else:
+                received = set((await response.json()).get("parts", []))
+
+        if state is None:
+            response = await self._media_request(
+                "POST",
+                uploads_url,
+                json={"type": media_type, "mime_type": mime_type, "size": size},
+                allow_statuses=(404, 405),
+            )
+            if response.status in (404, 405):
+                print("[API] Resumable media uploads unavailable, uploading in one request")
+                self._multipart_media_supported = False
+                return None
+            created = await response.json()
+            state = {
+                "upload_id": created["upload_id"],
+                "part_size": int(created.get("part_size") or self.media_part_size),
+            }
+            save_upload_state(state_path, state)
+
+        upload_url = f"{uploads_url}/{state['upload_id']}"
+        part_size = state["part_size"]
+        parts = max(1, math.ceil(size / part_size))
+        view = memoryview(data) if data is not None else None
+
+        for number in range(parts):
+            if number in received:
+                continue
+            offset = number * part_size
+            if view is not None:
+                part = view[offset : offset + part_size]
+            else:
+                part = await asyncio.to_thread(read_part, path or "", offset, part_size)
+
+            for attempt in range(self.media_part_retries):
+                try:
+                    await self._media_request(
+                        "PUT",
+                        f"{upload_url}/parts/{number}",
+                        data=part,
+                        headers={"Content-Type": "application/octet-stream"},
+                    )
+                    break
+                except MediaUploadError as e:
+                    if not e.retryable or attempt + 1 == self.media_part_retries:
+                        raise
+                    await asyncio.sleep(0.5 * 2**attempt)
+
+        response = await self._media_request(
+            "POST", f"{upload_url}/complete", json={"parts": parts, "size": size}
+        )
+        media_url = await response.json()
+        clear_upload_state(state_path)
+        return media_url
+
+    async def _media_request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        allow_statuses: Tuple[int, ...] = (),
+        **kwargs: Any,
+    ) -> aiohttp.ClientResponse:
+        """
+        Send a media request; the body of the returned response is already read.
+
+        Raises:
+            MediaUploadError: On connection errors and statuses other than 200 and
+                allow_statuses
+        """
+        request_headers = {"Authorization": f"Bearer {self.api_key}", **(headers or {})}
         try:
             client = await self._get_session()
-            async with client.post(
-                url, headers={"Authorization": f"Bearer {self.api_key}"}, data=form
-            ) as response:
-                if response.status == 200:
-                    media_url = await response.json()
-                    return media_url
-                else:
-                    error = await response.text()
-                    print(f"[API] Failed to upload media: {response.status} - {error}")
-                    return None
-        except Exception as e:
-            print(f"[API] Error uploading media: {e}")
-            return None
+            async with (
+                self._limit("media") as slot,
+                client.request(
+                    method, url, headers=request_headers, timeout=MEDIA_REQUEST_TIMEOUT, **kwargs
+                ) as response,
+            ):
+                slot.record(response.status, response.headers.get("Retry-After"))
+                await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise MediaUploadError(f"{method} {url}: {e}") from e
+
+        if response.status != 200 and response.status not in allow_statuses:
+            error = await response.text()
+            raise MediaUploadError(
+                f"{response.status} - {error}", retryable=response.status in RETRYABLE_STATUSES
+            )
+        return response
 
     async def create_trace(
         self, trace_type: TraceType, content: str, session_id: Optional[str] = None
@@ -216,18 +601,47 @@ class APIClient:
             session_id: The session ID (uses current session if not provided)
 
         Returns:
-            Trace data from the API
+            Trace data from the API, or {"seq": n} when the trace was queued for a batch
         """
         sid = session_id or self.session_id
         if not sid:
             raise ValueError("No session ID provided or set")
 
+        if self.outbox:
+            record_id = await asyncio.to_thread(
+                self.outbox.append,
+                "trace",
+                {"session_id": sid, "type": trace_type, "content": content},
+            )
+            return {"seq": record_id}
+
+        if self.trace_batcher and self._bulk_traces_supported:
+            return {"seq": self.trace_batcher.add(sid, trace_type, content)}
+
+        return await self._post_trace(sid, trace_type, content)
+
+    async def _post_trace(
+        self,
+        sid: str,
+        trace_type: str,
+        content: str,
+        seq: Optional[int] = None,
+        client_ts: Optional[float] = None,
+    ) -> TraceResponse:
+        """POST a single trace, with its sequence number and client time if it has them."""
         url = f"{self.base_url}/session/{sid}/trace"
-        payload = {"type": trace_type, "content": content}
+        payload: Dict[str, Any] = {"type": trace_type, "content": content}
+        if seq is not None:
+            payload["seq"] = seq
+            payload["client_ts"] = client_ts
 
         try:
             client = await self._get_session()
-            async with client.post(url, headers=self.headers, json=payload) as response:
+            async with (
+                self._limit("traces") as slot,
+                client.post(url, headers=self.headers, json=payload) as response,
+            ):
+                slot.record(response.status, response.headers.get("Retry-After"))
                 if response.status == 200:
                     return await response.json()
                 else:
@@ -241,6 +655,69 @@ class APIClient:
             print(f"[API] Error creating trace: {e}")
             return {}
 
+    async def flush_traces(self, session_id: Optional[str] = None) -> bool:
+        """
+        Send buffered traces now.
+
+        Args:
+            session_id: Flush only this session if provided
+
+        Returns:
+            True if all batches were sent (or batching is disabled)
+        """
+        if self.outbox:
+            return await asyncio.to_thread(self.outbox.flush, self.outbox_drain_timeout_s)
+        if not self.trace_batcher:
+            return True
+        return await self.trace_batcher.flush(session_id)
+
+    async def _send_trace_batch(
+        self, session_id: str, body: bytes, headers: Dict[str, str], count: int
+    ) -> Optional[bool]:
+        """
+        POST an encoded trace batch to the bulk endpoint.
+
+        Returns:
+            True if sent, False to retry later, None if rejected for good
+        """
+        url = f"{self.base_url}/session/{session_id}/trace/batch"
+        request_headers = {"Authorization": f"Bearer {self.api_key}", **headers}
+
+        try:
+            client = await self._get_session()
+            async with (
+                self._limit("traces") as slot,
+                client.post(url, headers=request_headers, data=body) as response,
+            ):
+                slot.record(response.status, response.headers.get("Retry-After"))
+                if response.status == 200:
+                    return True
+                error = await response.text()
+                if endpoint_missing(response.status, error):
+                    print("[API] Bulk trace endpoint unavailable, sending traces individually")
+                    self._bulk_traces_supported = False
+                    batch = decode_batch(body, headers.get("Content-Encoding"))
+                    for trace in batch.get("traces", []):
+                        await self._post_trace(
+                            session_id,
+                            trace["type"],
+                            trace["content"],
+                            seq=trace.get("seq"),
+                            client_ts=trace.get("client_ts"),
+                        )
+                    return True
+                if response.status in RETRYABLE_STATUSES:
+                    print(f"[API] Failed to send {count} traces, will retry: {response.status}")
+                    return False
+                print(
+                    f"[API] Failed to send {count} traces, dropping them: "
+                    f"{response.status} - {error}"
+                )
+                return None
+        except Exception as e:
+            print(f"[API] Error sending {count} traces: {e}")
+            return False
+
     async def update_session(
         self, evaluation: Dict[str, Any], result: str, session_id: Optional[str] = None
     ) -> bool:
@@ -262,9 +739,17 @@ class APIClient:
         url = f"{self.base_url}/session/{sid}/update"
         payload = {"evaluation": evaluation, "result": result}
 
+        if self.outbox:
+            await asyncio.to_thread(self.outbox.append, "update", {"session_id": sid, **payload})
+            return True
+
         try:
             client = await self._get_session()
-            async with client.post(url, headers=self.headers, json=payload) as response:
+            async with (
+                self._limit("traces") as slot,
+                client.post(url, headers=self.headers, json=payload) as response,
+            ):
+                slot.record(response.status, response.headers.get("Retry-After"))
                 if response.status == 200:
                     print("[API] Updated session with evaluation and result")
                     return True
@@ -275,3 +760,202 @@ class APIClient:
         except Exception as e:
             print(f"[API] Error updating session: {e}")
             return False
+
+    async def _deliver_outbox(self, records: List[OutboxRecord]) -> int:
+        """
+        Send outbox records; runs on the outbox sender thread.
+
+        Records are split into units (a run of traces of one session, a media upload, a
+        session update or end). Consecutive trace and media units are sent concurrently,
+        as many at a time as the concurrency limiters allow; session updates and ends wait
+        for everything before them and are sent alone. Each unit is acknowledged on its
+        own: units sent after a failed one are remembered and skipped when the outbox
+        retries, so only the failed records are sent again.
+
+        Returns:
+            Number of leading records consumed (sent, or rejected with a final status)
+        """
+        units: List[Tuple[int, int]] = []
+        start = 0
+        while start < len(records):
+            end = start + 1
+            if records[start].get("kind") == "trace":
+                sid = records[start].get("session_id")
+                while (
+                    end < len(records)
+                    and end - start < self.max_batch_traces
+                    and records[end].get("kind") == "trace"
+                    and records[end].get("session_id") == sid
+                ):
+                    end += 1
+            units.append((start, end))
+            start = end
+
+        consumed: Optional[int] = None
+        index = 0
+        while index < len(units) and consumed is None:
+            group = [index]
+            if records[units[index][0]].get("kind") in ("trace", "media"):
+                while index + len(group) < len(units) and records[units[index + len(group)][0]].get(
+                    "kind"
+                ) in ("trace", "media"):
+                    group.append(index + len(group))
+
+            results = await asyncio.gather(
+                *(self._deliver_unit(records[units[i][0] : units[i][1]]) for i in group)
+            )
+            for i, count in zip(group, results):
+                start, end = units[i]
+                self._outbox_sent_ids.update(
+                    record["id"] for record in records[start : start + count]
+                )
+                if consumed is None and start + count < end:
+                    consumed = start + count
+            index += len(group)
+
+        if consumed is None:
+            consumed = len(records)
+        # The outbox acknowledges the leading records; only later ones need remembering
+        self._outbox_sent_ids.difference_update(record["id"] for record in records[:consumed])
+        return consumed
+
+    async def _deliver_unit(self, records: List[OutboxRecord]) -> int:
+        """Send one unit of outbox records and return how many leading ones were consumed."""
+        # Leading records may have been sent before an earlier unit failed
+        sent = 0
+        while sent < len(records) and records[sent]["id"] in self._outbox_sent_ids:
+            sent += 1
+        if sent == len(records):
+            return sent
+        records = records[sent:]
+
+        record = records[0]
+        sid = record.get("session_id")
+        kind = record.get("kind")
+
+        if kind == "trace":
+            return sent + await self._deliver_traces(sid, records)
+        if kind == "media":
+            ok = await self._deliver_media(sid, record)
+        elif kind == "update":
+            ok = await self._deliver_request(
+                f"/session/{sid}/update",
+                "update session",
+                json={"evaluation": record["evaluation"], "result": record["result"]},
+            )
+        elif kind == "end":
+            ok = await self._deliver_request(f"/session/{sid}/end", "end session")
+        else:
+            print(f"[API] Dropping unknown outbox record kind: {kind}")
+            ok = True
+        return sent + (1 if ok else 0)
+
+    async def _deliver_media(self, sid: str, record: OutboxRecord) -> bool:
+        """Upload a media record; large blobs resume from their last uploaded part."""
+        assert self.outbox is not None
+        path = self.outbox.blob_path(record)
+        state_path = f"{path}.upload"
+        try:
+            if "mime_type" not in record:
+                # Written by an older version as a data URI
+                mime_type, data = parse_data_uri(self.outbox.read_blob(record).decode("utf-8"))
+                await self._transfer_media(sid, record["media_type"], mime_type, data=data)
+            else:
+                await self._transfer_media(
+                    sid, record["media_type"], record["mime_type"], path=path, state_path=state_path
+                )
+        except MediaUploadError as e:
+            attempts = self._media_attempts.get(record["id"], 0) + 1
+            if e.retryable and attempts < self.media_max_attempts:
+                self._media_attempts[record["id"]] = attempts
+                print(f"[API] Failed to upload media, will retry: {e}")
+                return False
+            print(f"[API] Failed to upload media after {attempts} attempts, dropping it: {e}")
+            clear_upload_state(state_path)
+        except FileNotFoundError:
+            print(f"[API] Dropping media record {record.get('id')} without its blob")
+        self._media_attempts.pop(record["id"], None)
+        return True
+
+    async def _deliver_traces(self, sid: str, records: List[OutboxRecord]) -> int:
+        """Send a run of trace records, in one bulk request if possible."""
+        if self.batch_traces and self._bulk_traces_supported and len(records) > 1:
+            traces = [
+                {
+                    "seq": record["id"],
+                    "type": record["type"],
+                    "content": record["content"],
+                    "client_ts": record["ts"],
+                }
+                for record in records
+            ]
+            body, headers = encode_batch(sid, traces, self.compression)
+            status = await self._deliver_request(
+                f"/session/{sid}/trace/batch",
+                f"send {len(records)} traces",
+                headers=headers,
+                data=body,
+                fallback_on_missing_endpoint=True,
+            )
+            if status is None:
+                print("[API] Bulk trace endpoint unavailable, sending traces individually")
+                self._bulk_traces_supported = False
+            else:
+                return len(records) if status else 0
+
+        for index, record in enumerate(records):
+            ok = await self._deliver_request(
+                f"/session/{sid}/trace",
+                "create trace",
+                json={
+                    "type": record["type"],
+                    "content": record["content"],
+                    "seq": record["id"],
+                    "client_ts": record["ts"],
+                },
+            )
+            if not ok:
+                return index
+        return len(records)
+
+    async def _deliver_request(
+        self,
+        path: str,
+        what: str,
+        headers: Optional[Dict[str, str]] = None,
+        fallback_on_missing_endpoint: bool = False,
+        **kwargs: Any,
+    ) -> Optional[bool]:
+        """
+        POST an outbox record.
+
+        Returns:
+            True if consumed (sent or rejected for good), False to retry later, or None
+            if the endpoint does not exist and fallback_on_missing_endpoint is set
+        """
+        request_headers = {"Authorization": f"Bearer {self.api_key}", **(headers or {})}
+        try:
+            client = await self._get_session()
+            async with (
+                self._limit("traces") as slot,
+                client.post(
+                    f"{self.base_url}{path}",
+                    headers=request_headers,
+                    timeout=OUTBOX_REQUEST_TIMEOUT,
+                    **kwargs,
+                ) as response,
+            ):
+                slot.record(response.status, response.headers.get("Retry-After"))
+                if response.status == 200:
+                    return True
+                error = await response.text()
+                if fallback_on_missing_endpoint and endpoint_missing(response.status, error):
+                    return None
+                if response.status in RETRYABLE_STATUSES:
+                    print(f"[API] Failed to {what}, will retry: {response.status} - {error}")
+                    return False
+                print(f"[API] Failed to {what}, dropping it: {response.status} - {error}")
+                return True
+        except Exception as e:
+            print(f"[API] Error trying to {what}, will retry: {e}")
+            return False
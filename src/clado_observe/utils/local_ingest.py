@@ -0,0 +1,239 @@
+"""
+Local Ingest Server
+
+In-process stand-in for the ingestion API, for tests and local development. It accepts
+the same endpoints as the hosted API (sessions, single and bulk traces, single and
+resumable media uploads, session update and end), keeps everything in memory and counts
+HTTP requests, so batching and retry behavior can be checked without network access:
+
+    async with LocalIngestServer() as server:
+        client = APIClient("test-key", base_url=server.url, batch_traces=True)
+"""
+
+import hashlib
+import uuid
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from .trace_batcher import decode_batch
+
+
+class LocalIngestServer:
+    """
+    Minimal in-memory ingestion API.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        api_key: Optional[str] = None,
+        bulk_endpoint: bool = True,
+        resumable_media: bool = True,
+        media_part_size: int = 8 * 1024 * 1024,
+    ):
+        """
+        Initialize LocalIngestServer.
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            api_key: Accepted bearer token; any token is accepted if not provided
+            bulk_endpoint: Serve the bulk trace endpoint (disable to test the fallback)
+            resumable_media: Serve the resumable media upload endpoints
+            media_part_size: Part size handed out for resumable uploads
+        """
+        self.host = host
+        self.port = port
+        self.api_key = api_key
+        self.bulk_endpoint = bulk_endpoint
+        self.resumable_media = resumable_media
+        self.media_part_size = media_part_size
+
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.traces: List[Dict[str, Any]] = []
+        self.media: List[Dict[str, Any]] = []
+        self.uploads: Dict[str, Dict[str, Any]] = {}
+        self.request_count = 0
+        self.bulk_request_count = 0
+
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to pass to APIClient."""
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        """Start serving."""
+        app = web.Application(middlewares=[self._count_and_authorize], client_max_size=1024**3)
+        app.router.add_get("/verify", self._verify)
+        app.router.add_post("/session", self._create_session)
+        app.router.add_post("/session/{sid}/trace", self._create_trace)
+        if self.bulk_endpoint:
+            app.router.add_post("/session/{sid}/trace/batch", self._create_traces)
+        app.router.add_post("/session/{sid}/trace/media", self._upload_media)
+        if self.resumable_media:
+            uploads = "/session/{sid}/trace/media/uploads"
+            app.router.add_post(uploads, self._create_upload)
+            app.router.add_get(uploads + "/{upload_id}", self._get_upload)
+            app.router.add_put(uploads + "/{upload_id}/parts/{part}", self._upload_part)
+            app.router.add_post(uploads + "/{upload_id}/complete", self._complete_upload)
+        app.router.add_post("/session/{sid}/update", self._update_session)
+        app.router.add_post("/session/{sid}/end", self._end_session)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        if self.port == 0:
+            server = getattr(site, "_server", None)
+            if server is not None and server.sockets:
+                self.port = server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "LocalIngestServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.stop()
+
+    @web.middleware
+    async def _count_and_authorize(self, request: web.Request, handler: Any) -> web.StreamResponse:
+        self.request_count += 1
+        if self.api_key and request.headers.get("Authorization") != f"Bearer {self.api_key}":
+            return web.Response(status=401, text="Invalid API key")
+        return await handler(request)
+
+    async def _verify(self, request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    async def _create_session(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        sid = str(uuid.uuid4())
+        self.sessions[sid] = {"id": sid, **payload, "ended": False}
+        return web.json_response({"id": sid})
+
+    def _session(self, request: web.Request) -> Optional[Dict[str, Any]]:
+        return self.sessions.get(request.match_info["sid"])
+
+    async def _create_trace(self, request: web.Request) -> web.Response:
+        if self._session(request) is None:
+            return web.Response(status=404, text="Unknown session")
+        payload = await request.json()
+        trace = {"session_id": request.match_info["sid"], **payload}
+        self.traces.append(trace)
+        return web.json_response({"id": len(self.traces)})
+
+    async def _create_traces(self, request: web.Request) -> web.Response:
+        if self._session(request) is None:
+            return web.Response(status=404, text="Unknown session")
+        self.bulk_request_count += 1
+        body = await request.read()
+        # aiohttp already decompresses the encodings it supports
+        encoding = None if body[:1] == b"{" else request.headers.get("Content-Encoding")
+        try:
+            batch = decode_batch(body, encoding)
+        except Exception as e:
+            return web.Response(status=400, text=f"Invalid batch: {e}")
+        for trace in batch.get("traces", []):
+            self.traces.append({"session_id": request.match_info["sid"], **trace})
+        return web.json_response({"accepted": len(batch.get("traces", []))})
+
+    def _add_media(self, sid: str, media_type: Any, mime_type: Any, data: bytes) -> str:
+        self.media.append(
+            {
+                "session_id": sid,
+                "type": media_type,
+                "mime_type": mime_type,
+                "size": len(data),
+                "sha256": hashlib.sha256(data).hexdigest(),
+            }
+        )
+        return f"{self.url}/media/{len(self.media)}"
+
+    async def _upload_media(self, request: web.Request) -> web.Response:
+        if self._session(request) is None:
+            return web.Response(status=404, text="Unknown session")
+        form = await request.post()
+        data = form.get("data")
+        mime_type = None
+        if isinstance(data, web.FileField):
+            mime_type = data.content_type
+            data = data.file.read()
+        elif isinstance(data, str):
+            # Data URI form field sent by older clients
+            mime_type = data[5:].split(";", 1)[0] if data.startswith("data:") else None
+            data = data.encode("utf-8")
+        else:
+            return web.Response(status=400, text="Missing data")
+        media_url = self._add_media(request.match_info["sid"], form.get("type"), mime_type, data)
+        return web.json_response(media_url)
+
+    def _upload(self, request: web.Request) -> Optional[Dict[str, Any]]:
+        upload = self.uploads.get(request.match_info["upload_id"])
+        if upload is None or upload["session_id"] != request.match_info["sid"]:
+            return None
+        return upload
+
+    async def _create_upload(self, request: web.Request) -> web.Response:
+        if self._session(request) is None:
+            return web.Response(status=404, text="Unknown session")
+        payload = await request.json()
+        upload_id = str(uuid.uuid4())
+        self.uploads[upload_id] = {
+            "session_id": request.match_info["sid"],
+            "type": payload.get("type"),
+            "mime_type": payload.get("mime_type"),
+            "size": payload.get("size"),
+            "parts": {},
+        }
+        return web.json_response({"upload_id": upload_id, "part_size": self.media_part_size})
+
+    async def _get_upload(self, request: web.Request) -> web.Response:
+        upload = self._upload(request)
+        if upload is None:
+            return web.Response(status=404, text="Unknown upload")
+        return web.json_response({"parts": sorted(upload["parts"])})
+
+    async def _upload_part(self, request: web.Request) -> web.Response:
+        upload = self._upload(request)
+        if upload is None:
+            return web.Response(status=404, text="Unknown upload")
+        upload["parts"][int(request.match_info["part"])] = await request.read()
+        return web.Response(text="ok")
+
+    async def _complete_upload(self, request: web.Request) -> web.Response:
+        upload = self._upload(request)
+        if upload is None:
+            return web.Response(status=404, text="Unknown upload")
+        payload = await request.json()
+        if sorted(upload["parts"]) != list(range(payload.get("parts", 0))):
+            return web.Response(status=400, text="Missing parts")
+        data = b"".join(upload["parts"][number] for number in sorted(upload["parts"]))
+        if upload["size"] is not None and len(data) != upload["size"]:
+            return web.Response(status=400, text="Size mismatch")
+        del self.uploads[request.match_info["upload_id"]]
+        media_url = self._add_media(upload["session_id"], upload["type"], upload["mime_type"], data)
+        return web.json_response(media_url)
+
+    async def _update_session(self, request: web.Request) -> web.Response:
+        session = self._session(request)
+        if session is None:
+            return web.Response(status=404, text="Unknown session")
+        session.update(await request.json())
+        return web.Response(text="ok")
+
+    async def _end_session(self, request: web.Request) -> web.Response:
+        session = self._session(request)
+        if session is None:
+            return web.Response(status=404, text="Unknown session")
+        session["ended"] = True
+        return web.Response(text="ok")
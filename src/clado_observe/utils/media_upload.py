@@ -0,0 +1,104 @@
+"""
+Media Upload Helpers
+
+Media is sent as raw bytes: small media as a binary multipart part, streamed from a file
+in chunks, and large media through the resumable upload endpoints, one part at a time:
+
+    POST /session/{sid}/trace/media/uploads                   -> {"upload_id", "part_size"}
+    GET  /session/{sid}/trace/media/uploads/{id}              -> {"parts": [received parts]}
+    PUT  /session/{sid}/trace/media/uploads/{id}/parts/{n}    raw part bytes
+    POST /session/{sid}/trace/media/uploads/{id}/complete     -> media URL
+
+Only one part is held in memory at a time, so peak memory does not depend on media size.
+The upload id can be persisted in a small state file so an interrupted upload continues
+with the missing parts instead of starting over.
+"""
+
+import base64
+import json
+import mimetypes
+import os
+from typing import Any, Dict, Optional, Tuple
+
+
+class MediaUploadError(Exception):
+    """A media upload failed; retryable is False when resending cannot succeed."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def parse_data_uri(
+    data_uri: str, default_mime_type: str = "application/octet-stream"
+) -> Tuple[str, bytes]:
+    """
+    Decode a data URI.
+
+    Returns:
+        (mime_type, data)
+    """
+    header, _, encoded = data_uri.partition(",")
+    mime_type = default_mime_type
+    if header.startswith("data:"):
+        mime_type = header[5:].split(";", 1)[0] or default_mime_type
+    if header.endswith(";base64"):
+        return mime_type, base64.b64decode(encoded)
+    return mime_type, encoded.encode("utf-8")
+
+
+def guess_mime_type(path: str, media_type: str) -> str:
+    """MIME type of a media file from its extension."""
+    mime_type, _ = mimetypes.guess_type(path)
+    if mime_type:
+        return mime_type
+    if path.endswith(".mkv"):
+        return "video/x-matroska"
+    return "video/mp4" if media_type == "video" else "application/octet-stream"
+
+
+def media_filename(media_type: str, mime_type: str) -> str:
+    """Filename sent with a binary media part."""
+    extension = mimetypes.guess_extension(mime_type) or ".bin"
+    return f"{media_type}{extension}"
+
+
+def read_part(path: str, offset: int, size: int) -> bytes:
+    """Read one upload part from a file."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def load_upload_state(state_path: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Load the state of an interrupted upload, if any."""
+    if not state_path:
+        return None
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or "upload_id" not in state or "part_size" not in state:
+        return None
+    return state
+
+
+def save_upload_state(state_path: Optional[str], state: Dict[str, Any]) -> None:
+    """Persist the state of an upload so it can be resumed."""
+    if not state_path:
+        return
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+
+def clear_upload_state(state_path: Optional[str]) -> None:
+    """Remove the state of a finished or abandoned upload."""
+    if not state_path:
+        return
+    try:
+        os.remove(state_path)
+    except FileNotFoundError:
+        pass
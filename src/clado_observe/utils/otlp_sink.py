@@ -0,0 +1,227 @@
+"""
+OTLP/HTTP Trace Sink
+
+Exports to an OpenTelemetry collector using the OTLP/HTTP JSON encoding, so no
+OpenTelemetry packages are needed. Every trace, media and session update record becomes
+a log record on /v1/logs; each session becomes a span on /v1/traces when it ends. The
+session id is used as the OpenTelemetry trace id, so the logs of a session are linked
+to its span.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from .trace_sink import BufferedTraceSink, MediaType, SinkRecord
+
+SCOPE = {"name": "clado_observe"}
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    """OTLP JSON key-value."""
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _nanos(timestamp: float) -> str:
+    return str(int(timestamp * 1e9))
+
+
+def trace_id(session_id: str) -> str:
+    """32 hex digit trace id of a session (the UUID itself when the id is one)."""
+    hex_id = session_id.replace("-", "").lower()
+    if len(hex_id) == 32 and all(c in "0123456789abcdef" for c in hex_id):
+        return hex_id
+    return hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+
+
+def span_id(session_id: str) -> str:
+    """16 hex digit id of a session's span."""
+    return hashlib.sha256(f"span:{session_id}".encode("utf-8")).hexdigest()[:16]
+
+
+class OTLPHTTPSink(BufferedTraceSink):
+    """
+    Exports records to an OTLP/HTTP endpoint as logs and session spans.
+    """
+
+    name = "otlp"
+
+    def __init__(
+        self,
+        endpoint: str = "http://localhost:4318",
+        headers: Optional[Dict[str, str]] = None,
+        service_name: str = "clado-observe",
+        timeout_s: float = 10.0,
+        max_batch_records: int = 500,
+        max_batch_age_s: float = 1.0,
+    ):
+        """
+        Initialize OTLPHTTPSink.
+
+        Args:
+            endpoint: Collector base URL; /v1/logs and /v1/traces are appended
+            headers: Extra request headers (e.g. authentication)
+            service_name: service.name resource attribute
+            timeout_s: Request timeout
+            max_batch_records: Export a batch when this many records are buffered
+            max_batch_age_s: Export a batch when its oldest record is this old
+        """
+        super().__init__(max_batch_records=max_batch_records, max_batch_age_s=max_batch_age_s)
+        self.endpoint = endpoint.rstrip("/")
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.resource = {"attributes": [_attribute("service.name", service_name)]}
+        self.timeout = aiohttp.ClientTimeout(total=timeout_s)
+
+        self._sessions: Dict[str, SinkRecord] = {}
+        self._client_sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+    async def upload_media_file(
+        self,
+        media_type: MediaType,
+        path: str,
+        session_id: Optional[str] = None,
+        mime_type: Optional[str] = None,
+    ) -> Optional[str]:
+        # Only the size is exported, so the file is not read
+        sequence = self._add(
+            "media",
+            self._session(session_id),
+            {"media_type": media_type, "mime_type": mime_type, "size": os.path.getsize(path)},
+        )
+        return f"{self.name}:{sequence}"
+
+    async def close(self) -> None:
+        await super().close()
+        for session in self._client_sessions.values():
+            if not session.closed:
+                await session.close()
+        self._client_sessions.clear()
+
+    async def _write_batch(self, records: List[SinkRecord]) -> int:
+        logs, spans = self._convert(records)
+        written = 0
+        if logs:
+            written += await self._export(
+                "/v1/logs",
+                {
+                    "resourceLogs": [
+                        {
+                            "resource": self.resource,
+                            "scopeLogs": [{"scope": SCOPE, "logRecords": logs}],
+                        }
+                    ]
+                },
+            )
+        if spans:
+            written += await self._export(
+                "/v1/traces",
+                {
+                    "resourceSpans": [
+                        {
+                            "resource": self.resource,
+                            "scopeSpans": [{"scope": SCOPE, "spans": spans}],
+                        }
+                    ]
+                },
+            )
+        return written
+
+    def _convert(
+        self, records: List[SinkRecord]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Map records to OTLP log records and session spans."""
+        logs: List[Dict[str, Any]] = []
+        spans: List[Dict[str, Any]] = []
+
+        for record in records:
+            sid = record["session_id"]
+            kind = record["kind"]
+
+            if kind == "session":
+                self._sessions[sid] = record
+                continue
+            if kind == "end":
+                start = self._sessions.pop(sid, None)
+                spans.append(
+                    {
+                        "traceId": trace_id(sid),
+                        "spanId": span_id(sid),
+                        "name": "session",
+                        "kind": 1,
+                        "startTimeUnixNano": _nanos(start["ts"] if start else record["ts"]),
+                        "endTimeUnixNano": _nanos(record["ts"]),
+                        "attributes": [
+                            _attribute("clado.session_id", sid),
+                            *(
+                                [
+                                    _attribute("clado.prompt", start["prompt"]),
+                                    _attribute("clado.model", start["model"]),
+                                ]
+                                if start
+                                else []
+                            ),
+                        ],
+                    }
+                )
+                continue
+
+            attributes = [
+                _attribute("clado.session_id", sid),
+                _attribute("clado.record", kind),
+                _attribute("clado.seq", record["seq"]),
+            ]
+            if kind == "trace":
+                body = record["content"]
+                attributes.append(_attribute("clado.trace_type", record["type"]))
+            elif kind == "media":
+                body = f"{record['media_type']} ({record['size']} bytes)"
+                attributes.append(_attribute("clado.media_type", record["media_type"]))
+                attributes.append(_attribute("clado.mime_type", record["mime_type"] or ""))
+                attributes.append(_attribute("clado.size", record["size"]))
+            else:
+                body = record.get("result", "")
+                attributes.append(
+                    _attribute(
+                        "clado.evaluation", json.dumps(record.get("evaluation"), default=str)
+                    )
+                )
+
+            logs.append(
+                {
+                    "timeUnixNano": _nanos(record["ts"]),
+                    "observedTimeUnixNano": _nanos(record["ts"]),
+                    "severityNumber": 9,
+                    "severityText": "INFO",
+                    "body": {"stringValue": body},
+                    "attributes": attributes,
+                    "traceId": trace_id(sid),
+                    "spanId": span_id(sid),
+                }
+            )
+        return logs, spans
+
+    async def _export(self, path: str, payload: Dict[str, Any]) -> int:
+        """POST an OTLP JSON payload; raises on failure, returns the body size."""
+        loop = asyncio.get_running_loop()
+        client = self._client_sessions.get(loop)
+        if client is None or client.closed:
+            client = self._client_sessions[loop] = aiohttp.ClientSession()
+
+        body = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+        async with client.post(
+            f"{self.endpoint}{path}", headers=self.headers, data=body, timeout=self.timeout
+        ) as response:
+            if response.status >= 300:
+                error = await response.text()
+                raise Exception(f"{path}: {response.status} - {error[:200]}")
+        return len(body)
@@ -0,0 +1,606 @@
+"""
+Durable Outbox
+
+Append-only on-disk queue for everything sent to the ingestion API. Records are JSON
+lines appended to segment files and fsynced in groups; large payloads (media) are
+written to blob files next to the segments. A background thread with its own event
+loop hands records to a delivery coroutine in order, retries with exponential backoff
+while the API is unavailable and persists a cursor after each delivered batch, so
+records that were not sent when the process exited are resent on the next start.
+Undelivered records are dropped, oldest first, once the lane holds more than max_bytes
+or they are older than max_age_s, so an unreachable API cannot fill the disk.
+
+Layout of an outbox directory:
+
+    lane-0/lock                  held while a process uses the lane
+    lane-0/cursor.json           segment and offset of the first undelivered record
+    lane-0/segment-00000001.wal  JSON lines, one record each
+    lane-0/blobs/<uuid>.blob     payloads of records appended with a blob
+
+Each process claims a free lane, resuming its backlog, or creates a new one, so several
+agents can share one directory.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTBOX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "clado_observe", "outbox")
+
+OutboxRecord = Dict[str, Any]
+OutboxDelivery = Callable[[List[OutboxRecord]], Awaitable[int]]
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_AGE_S = 7 * 24 * 3600.0
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".wal"
+
+
+def _segment_name(index: int) -> str:
+    return f"{SEGMENT_PREFIX}{index:08d}{SEGMENT_SUFFIX}"
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Replace a file so that readers see either the old or the new content."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _remove(path: str) -> int:
+    """Delete a file; returns its size, or 0 if it did not exist."""
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+    return size
+
+
+class Outbox:
+    """
+    Write-ahead log of outgoing records with a background sender.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        deliver: OutboxDelivery,
+        segment_max_bytes: int = 8 * 1024 * 1024,
+        fsync_interval_s: float = 0.2,
+        max_batch_records: int = 500,
+        initial_backoff_s: float = 0.5,
+        max_backoff_s: float = 60.0,
+        max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+        max_age_s: Optional[float] = DEFAULT_MAX_AGE_S,
+        on_close: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        """
+        Initialize Outbox.
+
+        Args:
+            directory: Outbox directory (created if missing)
+            deliver: Coroutine receiving records in order and returning how many leading
+                records were consumed (delivered or permanently rejected); records after
+                that are retried after a backoff
+            segment_max_bytes: Start a new segment file after this many bytes
+            fsync_interval_s: Appends are fsynced together at most this often
+            max_batch_records: Maximum records passed to deliver at once
+            initial_backoff_s: First retry delay after a failed delivery
+            max_backoff_s: Maximum retry delay
+            max_bytes: Drop the oldest undelivered records while segments and blobs take
+                more than this many bytes (None for no limit)
+            max_age_s: Drop undelivered records older than this (None for no limit)
+            on_close: Coroutine run on the sender loop before it stops (e.g. to close
+                HTTP sessions bound to that loop)
+        """
+        self.directory = directory
+        self.deliver = deliver
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_interval_s = fsync_interval_s
+        self.max_batch_records = max_batch_records
+        self.initial_backoff_s = initial_backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.on_close = on_close
+
+        self.lane_dir: Optional[str] = None
+        self.blob_dir: Optional[str] = None
+        self._lock_fd: Optional[int] = None
+
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._next_id = 1
+        self._pending = 0
+        self._write_segment = 0
+        self._write_file: Optional[Any] = None
+        self._write_bytes = 0
+        self._dirty = False
+        # Bytes of the lane's segments and blobs
+        self._bytes = 0
+
+        self._cursor: Tuple[int, int] = (0, 0)
+        self._read_position: Tuple[int, int] = (0, 0)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._stopping = False
+
+        self.records_appended = 0
+        self.records_delivered = 0
+        self.delivery_failures = 0
+        self.records_dropped = 0
+
+    def start(self) -> None:
+        """Claim a lane, recover its backlog and start the sender thread."""
+        if self._thread is not None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._claim_lane()
+        assert self.lane_dir is not None
+        self.blob_dir = os.path.join(self.lane_dir, "blobs")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._recover()
+
+        ready = threading.Event()
+
+        def run_sender_loop() -> None:
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._wakeup = asyncio.Event()
+            self._stopped = asyncio.Event()
+            ready.set()
+            try:
+                self._loop.run_until_complete(self._run())
+            finally:
+                self._loop.close()
+
+        self._thread = threading.Thread(target=run_sender_loop, name="clado-outbox", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+        if self._pending:
+            print(f"[OUTBOX] Resuming {self._pending} unsent records from {self.lane_dir}")
+
+    def append(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        blob: Optional[bytes] = None,
+        blob_file: Optional[str] = None,
+    ) -> int:
+        """
+        Durably queue a record.
+
+        Args:
+            kind: Record kind understood by the delivery coroutine
+            payload: JSON-serializable record fields
+            blob: Large payload stored in a separate file (fsynced before the record)
+            blob_file: File copied into the outbox as the blob, instead of blob
+
+        Returns:
+            Id of the record
+        """
+        if self.lane_dir is None:
+            raise RuntimeError("Outbox is not started")
+
+        blob_name, blob_size = None, 0
+        if blob is not None or blob_file:
+            blob_name, blob_size = self._write_blob(blob, blob_file)
+
+        with self._lock:
+            record_id = self._next_id
+            self._next_id += 1
+
+            record: OutboxRecord = {"id": record_id, "kind": kind, "ts": time.time(), **payload}
+            if blob_name is not None:
+                record["blob"] = blob_name
+
+            line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+            if self._write_bytes and self._write_bytes + len(line) > self.segment_max_bytes:
+                self._roll_segment()
+            assert self._write_file is not None
+            self._write_file.write(line)
+            self._write_file.flush()
+            self._write_bytes += len(line)
+            self._bytes += len(line) + blob_size
+            self._dirty = True
+            self._pending += 1
+            self.records_appended += 1
+
+        self._wake()
+        return record_id
+
+    def blob_path(self, record: OutboxRecord) -> str:
+        """Path of the blob of a record appended with one."""
+        assert self.blob_dir is not None
+        return os.path.join(self.blob_dir, record["blob"])
+
+    def read_blob(self, record: OutboxRecord) -> bytes:
+        """Read the blob of a record appended with one."""
+        with open(self.blob_path(record), "rb") as f:
+            return f.read()
+
+    def pending(self) -> int:
+        """Number of records not yet consumed."""
+        with self._lock:
+            return self._pending
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued record was consumed.
+
+        Returns:
+            True if the outbox drained within the timeout
+        """
+        self._wake()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._drained:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._drained.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = 5.0) -> bool:
+        """
+        Give the sender up to `timeout` seconds to drain, then stop it. Records left
+        are kept on disk and resent by the next process using this directory.
+
+        Returns:
+            True if the outbox drained before stopping
+        """
+        if self._thread is None:
+            return True
+
+        drained = self.flush(timeout)
+        self._stopping = True
+        if self._loop is not None and self._stopped is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._stopped.set)
+            except RuntimeError:
+                pass
+        self._thread.join(timeout=max(timeout or 0.0, 1.0))
+        self._thread = None
+
+        with self._lock:
+            if self._write_file is not None:
+                self._sync_locked()
+                self._write_file.close()
+                self._write_file = None
+            if not drained:
+                print(f"[OUTBOX] {self._pending} records left in {self.lane_dir} for the next run")
+        self._release_lane()
+        return drained
+
+    def _wake(self) -> None:
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                pass
+
+    def _claim_lane(self) -> None:
+        """Lock the first free lane, or create a new one."""
+        lanes = sorted(
+            (name for name in os.listdir(self.directory) if name.startswith("lane-")),
+            key=lambda name: int(name[5:]) if name[5:].isdigit() else -1,
+        )
+        for name in lanes:
+            if self._lock_lane(os.path.join(self.directory, name)):
+                return
+
+        index = len(lanes)
+        while True:
+            lane_dir = os.path.join(self.directory, f"lane-{index}")
+            try:
+                os.makedirs(lane_dir)
+            except FileExistsError:
+                index += 1
+                continue
+            if self._lock_lane(lane_dir):
+                return
+            index += 1
+
+    def _lock_lane(self, lane_dir: str) -> bool:
+        lock_path = os.path.join(lane_dir, "lock")
+        if fcntl is not None:
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+        else:
+            # Without flock a lock left by a crashed process keeps its lane unused
+            try:
+                fd = os.open(lock_path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                return False
+        self._lock_fd = fd
+        self.lane_dir = lane_dir
+        return True
+
+    def _release_lane(self) -> None:
+        if self._lock_fd is None:
+            return
+        os.close(self._lock_fd)
+        self._lock_fd = None
+        if fcntl is None and self.lane_dir is not None:
+            os.remove(os.path.join(self.lane_dir, "lock"))
+
+    def _segments(self) -> List[int]:
+        assert self.lane_dir is not None
+        return sorted(
+            int(name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.lane_dir)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _segment_path(self, index: int) -> str:
+        assert self.lane_dir is not None
+        return os.path.join(self.lane_dir, _segment_name(index))
+
+    def _recover(self) -> None:
+        """Load the cursor, count unsent records and open a fresh segment for writing."""
+        assert self.lane_dir is not None
+        cursor = (0, 0)
+        try:
+            with open(os.path.join(self.lane_dir, "cursor.json"), "rb") as f:
+                data = json.loads(f.read())
+                cursor = (int(data["segment"]), int(data["offset"]))
+        except (OSError, ValueError, KeyError):
+            pass
+
+        segments = self._segments()
+        last_id = 0
+        pending = 0
+        total_bytes = 0
+        for index in segments:
+            if index < cursor[0]:
+                os.remove(self._segment_path(index))
+                continue
+            total_bytes += os.path.getsize(self._segment_path(index))
+            offset = cursor[1] if index == cursor[0] else 0
+            with open(self._segment_path(index), "rb") as f:
+                for line in f:
+                    delivered = offset > 0
+                    offset -= len(line)
+                    try:
+                        last_id = max(last_id, int(json.loads(line)["id"]))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    if not delivered:
+                        pending += 1
+
+        if segments and cursor[0] < segments[0]:
+            cursor = (segments[0], 0)
+        self._cursor = cursor
+        self._read_position = cursor
+        self._pending = pending
+        self._next_id = last_id + 1
+        assert self.blob_dir is not None
+        for name in os.listdir(self.blob_dir):
+            try:
+                total_bytes += os.path.getsize(os.path.join(self.blob_dir, name))
+            except OSError:
+                pass
+        self._bytes = total_bytes
+
+        # Never append to a segment a previous process may have left with a torn write
+        self._write_segment = (segments[-1] if segments else 0) + 1
+        self._open_segment()
+
+    def _open_segment(self) -> None:
+        self._write_file = open(self._segment_path(self._write_segment), "ab")
+        self._write_bytes = self._write_file.tell()
+
+    def _roll_segment(self) -> None:
+        self._sync_locked()
+        assert self._write_file is not None
+        self._write_file.close()
+        self._write_segment += 1
+        self._open_segment()
+
+    def _sync_locked(self) -> None:
+        if self._dirty and self._write_file is not None:
+            os.fsync(self._write_file.fileno())
+            self._dirty = False
+
+    def _write_blob(
+        self, blob: Optional[bytes], blob_file: Optional[str] = None
+    ) -> Tuple[str, int]:
+        """Write a blob file; returns its name and size."""
+        assert self.blob_dir is not None
+        name = f"{uuid.uuid4().hex}.blob"
+        with open(os.path.join(self.blob_dir, name), "wb") as f:
+            if blob_file is not None:
+                with open(blob_file, "rb") as source:
+                    shutil.copyfileobj(source, f, 1024 * 1024)
+            else:
+                f.write(blob or b"")
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        return name, size
+
+    def _read_batch(self) -> Tuple[List[OutboxRecord], List[Tuple[int, int]]]:
+        """Read the next records after the read position, with the position after each."""
+        records: List[OutboxRecord] = []
+        ends: List[Tuple[int, int]] = []
+        segment, offset = self._read_position
+
+        with self._lock:
+            write_segment = self._write_segment
+
+        while len(records) < self.max_batch_records:
+            if segment == 0 or not os.path.exists(self._segment_path(segment)):
+                later = [index for index in self._segments() if index > segment]
+                if not later:
+                    break
+                segment, offset = later[0], 0
+                continue
+
+            with open(self._segment_path(segment), "rb") as f:
+                f.seek(offset)
+                while len(records) < self.max_batch_records:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        logger.warning("Skipping corrupt outbox record in %s", f.name)
+                        continue
+                    ends.append((segment, offset))
+
+            if len(records) >= self.max_batch_records or segment >= write_segment:
+                break
+            # An older segment is complete; a torn last line left by a crash is dropped
+            segment, offset = segment + 1, 0
+
+        self._read_position = (segment, offset)
+        return records, ends
+
+    def _acknowledge(
+        self, records: List[OutboxRecord], end: Tuple[int, int], delivered: bool = True
+    ) -> None:
+        """Persist the cursor after consumed or dropped records and delete their files."""
+        assert self.lane_dir is not None and self.blob_dir is not None
+        _write_atomic(
+            os.path.join(self.lane_dir, "cursor.json"),
+            json.dumps({"segment": end[0], "offset": end[1]}).encode("utf-8"),
+        )
+        previous_segment = self._cursor[0]
+        self._cursor = end
+
+        freed = 0
+        for record in records:
+            if record.get("blob"):
+                freed += _remove(os.path.join(self.blob_dir, record["blob"]))
+        for index in range(previous_segment, end[0]):
+            freed += _remove(self._segment_path(index))
+
+        with self._drained:
+            self._bytes -= freed
+            self._pending = max(0, self._pending - len(records))
+            if delivered:
+                self.records_delivered += len(records)
+            else:
+                self.records_dropped += len(records)
+            if not self._pending:
+                self._drained.notify_all()
+
+    async def _run(self) -> None:
+        """Sender loop: deliver in order, back off on failure, fsync in groups."""
+        assert self._wakeup is not None
+        sync_task = asyncio.create_task(self._sync_periodically())
+        backoff = self.initial_backoff_s
+
+        try:
+            while not self._stopping:
+                # Cleared before reading, so an append during the read is not missed
+                self._wakeup.clear()
+                records, ends = self._read_batch()
+                expired = self._expired(records)
+                if expired:
+                    print(f"[OUTBOX] Dropping {expired} records over the size or age limit")
+                    self._acknowledge(records[:expired], ends[expired - 1], delivered=False)
+                    self._read_position = self._cursor
+                    continue
+                if not records:
+                    if self._read_position[0] > self._cursor[0]:
+                        # Older segments were read to the end; let them be deleted
+                        self._acknowledge([], self._read_position)
+                    await self._sleep(self.fsync_interval_s * 5)
+                    continue
+
+                try:
+                    consumed = await self.deliver(records)
+                except Exception as e:
+                    print(f"[OUTBOX] Delivery error: {e}")
+                    consumed = 0
+
+                if consumed > 0:
+                    self._acknowledge(records[:consumed], ends[consumed - 1])
+                    backoff = self.initial_backoff_s
+                if consumed < len(records):
+                    self.delivery_failures += 1
+                    self._read_position = self._cursor
+                    await self._backoff(backoff * random.uniform(0.5, 1.0))
+                    backoff = min(backoff * 2, self.max_backoff_s)
+        finally:
+            sync_task.cancel()
+            await asyncio.gather(sync_task, return_exceptions=True)
+            if self.on_close is not None:
+                try:
+                    await self.on_close()
+                except Exception as e:
+                    print(f"[OUTBOX] Error closing sender: {e}")
+
+    def _expired(self, records: List[OutboxRecord]) -> int:
+        """Number of leading records to drop to respect max_bytes and max_age_s."""
+        with self._lock:
+            excess = self._bytes - self.max_bytes if self.max_bytes is not None else 0
+        cutoff = time.time() - self.max_age_s if self.max_age_s is not None else None
+
+        count = 0
+        for record in records:
+            if excess <= 0 and (cutoff is None or record.get("ts", 0) >= cutoff):
+                break
+            excess -= len(json.dumps(record, separators=(",", ":"))) + 1
+            if record.get("blob"):
+                try:
+                    excess -= os.path.getsize(self.blob_path(record))
+                except OSError:
+                    pass
+            count += 1
+        return count
+
+    async def _sleep(self, delay: float) -> None:
+        """Sleep until the delay passes or a record is appended."""
+        assert self._wakeup is not None
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _backoff(self, delay: float) -> None:
+        """Sleep until the delay passes or the outbox is closed."""
+        assert self._stopped is not None
+        try:
+            await asyncio.wait_for(self._stopped.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _sync_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.fsync_interval_s)
+            with self._lock:
+                self._sync_locked()
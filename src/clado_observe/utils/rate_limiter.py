@@ -0,0 +1,208 @@
+"""
+Adaptive Rate Limiter
+
+AIMD concurrency limit for requests to the ingestion API. Each successful response
+raises the limit by about one per window of requests (additive increase); an overload
+signal (429, 503, timeout) halves it (multiplicative decrease), at most once per window
+so a burst of failures from requests already in flight counts as one signal. A
+Retry-After header pauses the whole budget until the given time.
+
+The limiter is shared by the event loops of several threads (the agent's trace thread,
+the observer thread, the outbox sender), so its state is guarded by a threading lock and
+waiters are woken through their own loops.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Dict, Optional, Tuple
+
+OVERLOAD_STATUSES = (429, 503)
+
+
+def parse_retry_after(value: Optional[str], max_delay_s: float = 60.0) -> Optional[float]:
+    """
+    Parse a Retry-After header (seconds or HTTP date).
+
+    Returns:
+        Delay in seconds, capped at max_delay_s, or None if absent or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(delay, 0.0), max_delay_s)
+
+
+class LimiterSlot:
+    """One admitted request; record its outcome before leaving the context."""
+
+    __slots__ = ("limiter", "started", "queued_s", "recorded")
+
+    def __init__(self, limiter: "AdaptiveLimiter", started: float, queued_s: float):
+        self.limiter = limiter
+        self.started = started
+        self.queued_s = queued_s
+        self.recorded = False
+
+    def record(self, status: int, retry_after: Optional[str] = None) -> None:
+        """Record the HTTP status (and Retry-After header) of the response."""
+        self.recorded = True
+        self.limiter._record(self.started, status in OVERLOAD_STATUSES, retry_after)
+
+    async def __aenter__(self) -> "LimiterSlot":
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if not self.recorded and isinstance(exc, asyncio.TimeoutError):
+            self.recorded = True
+            self.limiter._record(self.started, True, None)
+        self.limiter._release()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter with Retry-After support.
+
+    Usage:
+        async with await limiter.acquire() as slot:
+            async with client.post(...) as response:
+                slot.record(response.status, response.headers.get("Retry-After"))
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: float = 4,
+        min_limit: float = 1,
+        max_limit: float = 64,
+        decrease_factor: float = 0.5,
+        max_retry_after_s: float = 60.0,
+    ):
+        """
+        Initialize AdaptiveLimiter.
+
+        Args:
+            name: Budget name, used in stats
+            initial_limit: Concurrent requests allowed at start
+            min_limit: Lower bound of the limit
+            max_limit: Upper bound of the limit
+            decrease_factor: Factor applied to the limit on an overload signal
+            max_retry_after_s: Longest pause honored from a Retry-After header
+        """
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.decrease_factor = decrease_factor
+        self.max_retry_after_s = max_retry_after_s
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = deque()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+
+        self.requests = 0
+        self.overloads = 0
+        self.retry_after_pauses = 0
+        self.queueing_delay_s = 0.0
+        self.max_queueing_delay_s = 0.0
+
+    async def acquire(self) -> LimiterSlot:
+        """Wait for a free slot (and for any Retry-After pause to pass)."""
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+
+        while True:
+            future: Optional["asyncio.Future[None]"] = None
+            with self._lock:
+                now = time.monotonic()
+                pause = self._blocked_until - now
+                if pause <= 0 and self._in_flight < max(1, int(self.limit)):
+                    self._in_flight += 1
+                    self.requests += 1
+                    queued_s = now - start
+                    # Smoothed queueing delay, most recent requests weigh the most
+                    self.queueing_delay_s += (queued_s - self.queueing_delay_s) * 0.1
+                    self.max_queueing_delay_s = max(self.max_queueing_delay_s, queued_s)
+                    return LimiterSlot(self, now, queued_s)
+                if pause <= 0:
+                    future = loop.create_future()
+                    self._waiters.append((loop, future))
+
+            if future is None:
+                await asyncio.sleep(pause)
+                continue
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._lock:
+                    if (loop, future) in self._waiters:
+                        self._waiters.remove((loop, future))
+                        raise
+                # Woken while being cancelled: pass the wakeup on
+                self._wake()
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        """Current limit, in-flight and queued requests, and queueing delay."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "limit": round(self.limit, 2),
+                "in_flight": self._in_flight,
+                "queued": len(self._waiters),
+                "queueing_delay_ms": round(self.queueing_delay_s * 1000, 2),
+                "max_queueing_delay_ms": round(self.max_queueing_delay_s * 1000, 2),
+                "paused_for_s": round(max(0.0, self._blocked_until - time.monotonic()), 3),
+                "requests": self.requests,
+                "overloads": self.overloads,
+                "retry_after_pauses": self.retry_after_pauses,
+            }
+
+    def _record(self, started: float, overloaded: bool, retry_after: Optional[str]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if overloaded:
+                self.overloads += 1
+                # Requests sent before the last decrease saw the old limit; ignore them
+                if started >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                delay = parse_retry_after(retry_after, self.max_retry_after_s)
+                if delay:
+                    self.retry_after_pauses += 1
+                    self._blocked_until = max(self._blocked_until, now + delay)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        """Wake as many waiters as there are free slots."""
+        with self._lock:
+            free = max(1, int(self.limit)) - self._in_flight
+            woken = []
+            while free > 0 and self._waiters:
+                woken.append(self._waiters.popleft())
+                free -= 1
+        for loop, future in woken:
+            loop.call_soon_threadsafe(_resolve, future)
+
+
+def _resolve(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,195 @@
+"""
+Tiered screenshot store.
+
+Keeps decoded screenshot bytes instead of data URI strings. The most recent screenshots
+stay in memory; older ones spill to a content-addressed on-disk cache with a size cap,
+evicting the oldest files first. Screenshots evicted from disk are dropped from the store,
+and at most max_entries screenshots are listed. Iterating the store yields data URIs
+lazily.
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterator, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+class ScreenshotStore:
+    """Bounded store of screenshots, hot in RAM and spilled to disk."""
+
+    def __init__(
+        self,
+        max_hot: int = 8,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+        cache_dir: Optional[str] = None,
+        max_entries: int = 10000,
+    ):
+        """
+        Initialize the screenshot store.
+
+        Args:
+            max_hot: Number of most recent screenshots kept in memory
+            max_disk_bytes: Size cap of the on-disk cache; oldest files are evicted first
+            cache_dir: Directory for the on-disk cache (a temporary directory if not provided)
+            max_entries: Number of most recent screenshots listed; repeated screenshots
+                each count
+        """
+        self.max_hot = max_hot
+        self.max_disk_bytes = max_disk_bytes
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+        self._entries: Deque[Tuple[str, str]] = deque()
+        self._hot: "OrderedDict[str, bytes]" = OrderedDict()
+        self._disk: Dict[str, int] = {}
+        self._disk_order: Deque[str] = deque()
+        self._disk_bytes = 0
+        self._owns_cache_dir = cache_dir is None
+        self._lock = threading.Lock()
+
+    def add(self, screenshot: Union[str, bytes], mime_type: str = "image/png") -> str:
+        """
+        Add a screenshot.
+
+        Args:
+            screenshot: Data URI (data:image/...;base64,...) or raw image bytes
+            mime_type: MIME type of raw bytes; ignored for data URIs
+
+        Returns:
+            Content digest of the screenshot
+        """
+        if isinstance(screenshot, str):
+            header, _, encoded = screenshot.partition(",")
+            if header.startswith("data:"):
+                mime_type = header[5:].split(";", 1)[0] or mime_type
+            data = base64.b64decode(encoded)
+        else:
+            data = screenshot
+
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._entries.append((digest, mime_type))
+            if digest in self._hot:
+                self._hot.move_to_end(digest)
+            elif digest not in self._disk:
+                self._hot[digest] = data
+                dropped = False
+                while len(self._hot) > self.max_hot:
+                    dropped |= self._spill(*self._hot.popitem(last=False))
+                if dropped:
+                    self._entries = deque(
+                        entry
+                        for entry in self._entries
+                        if entry[0] in self._hot or entry[0] in self._disk
+                    )
+            while len(self._entries) > self.max_entries:
+                self._entries.popleft()
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """Get screenshot bytes by digest, or None if it was evicted."""
+        with self._lock:
+            data = self._hot.get(digest)
+            on_disk = digest in self._disk
+        if data is not None or not on_disk:
+            return data
+
+        try:
+            with open(self._path(digest), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def data_uris(self) -> Iterator[str]:
+        """Yield data URIs of all retained screenshots in insertion order."""
+        with self._lock:
+            entries = list(self._entries)
+        for digest, mime_type in entries:
+            data = self.get(digest)
+            if data is not None:
+                yield f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
+
+    def __iter__(self) -> Iterator[str]:
+        return self.data_uris()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, screenshot: object) -> bool:
+        if not isinstance(screenshot, str):
+            return False
+        digest = hashlib.sha256(base64.b64decode(screenshot.partition(",")[2])).hexdigest()
+        with self._lock:
+            return any(entry_digest == digest for entry_digest, _ in self._entries)
+
+    @property
+    def hot_bytes(self) -> int:
+        """Bytes currently held in memory."""
+        return sum(len(data) for data in self._hot.values())
+
+    @property
+    def disk_bytes(self) -> int:
+        """Bytes currently held in the on-disk cache."""
+        return self._disk_bytes
+
+    def clear(self) -> None:
+        """Drop all screenshots and remove the on-disk cache."""
+        with self._lock:
+            self._entries.clear()
+            self._hot.clear()
+            self._disk.clear()
+            self._disk_order.clear()
+            self._disk_bytes = 0
+
+            if self.cache_dir and os.path.exists(self.cache_dir):
+                if self._owns_cache_dir:
+                    shutil.rmtree(self.cache_dir, ignore_errors=True)
+                    self.cache_dir = None
+
+    def _path(self, digest: str) -> str:
+        assert self.cache_dir is not None
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def _spill(self, digest: str, data: bytes) -> bool:
+        """
+        Write an entry evicted from memory to disk and enforce the disk cap.
+
+        Returns:
+            True if this or an older screenshot was dropped
+        """
+        if len(data) > self.max_disk_bytes:
+            return True
+
+        try:
+            if self.cache_dir is None:
+                self.cache_dir = tempfile.mkdtemp(prefix="screenshots_")
+            path = self._path(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        except OSError as e:
+            logger.debug(f"Failed to spill screenshot {digest[:12]} to disk: {e}")
+            return True
+
+        self._disk[digest] = len(data)
+        self._disk_order.append(digest)
+        self._disk_bytes += len(data)
+
+        dropped = False
+        while self._disk_bytes > self.max_disk_bytes and self._disk_order:
+            evicted = self._disk_order.popleft()
+            self._disk_bytes -= self._disk.pop(evicted, 0)
+            dropped = True
+            try:
+                os.remove(self._path(evicted))
+            except OSError:
+                pass
+        return dropped
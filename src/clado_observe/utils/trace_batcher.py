@@ -0,0 +1,227 @@
+"""
+Trace Batcher
+
+Buffers traces per session with sequence numbers and client timestamps and hands them
+to a sender in compressed batches. A batch is flushed when it reaches a trace count or
+byte size, when its oldest trace reaches a maximum age, or on an explicit flush. A batch
+that fails with a retryable error is put back at the front of its session's buffer and
+sent again with the next flush; the oldest traces are dropped once a session buffers more
+than max_buffered_traces.
+
+zstd compression requires the zstandard package; gzip is used when it is not installed.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Set, Tuple
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None  # type: ignore[assignment]
+
+
+logger = logging.getLogger(__name__)
+
+Compression = Literal["gzip", "zstd", "none"]
+# Returns True if sent, False to retry later, None if rejected for good
+BatchSender = Callable[[str, bytes, Dict[str, str], int], Awaitable[Optional[bool]]]
+
+
+def encode_batch(
+    session_id: str, traces: List[Dict[str, Any]], compression: Compression = "gzip"
+) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Serialize and compress a batch of traces.
+
+    Args:
+        session_id: Session the traces belong to
+        traces: Trace dictionaries (seq, type, content, client_ts)
+        compression: "gzip", "zstd" or "none"
+
+    Returns:
+        (body, headers) for the bulk trace request
+    """
+    body = json.dumps({"session_id": session_id, "traces": traces}, separators=(",", ":")).encode(
+        "utf-8"
+    )
+    headers = {"Content-Type": "application/json"}
+
+    if compression == "zstd" and zstandard is not None:
+        body = zstandard.ZstdCompressor(level=3).compress(body)
+        headers["Content-Encoding"] = "zstd"
+    elif compression != "none":
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+def decode_batch(body: bytes, content_encoding: Optional[str]) -> Dict[str, Any]:
+    """Decode a batch produced by encode_batch."""
+    if content_encoding == "gzip":
+        body = gzip.decompress(body)
+    elif content_encoding == "zstd":
+        if zstandard is None:
+            raise ValueError("zstandard is required to decode zstd batches")
+        body = zstandard.ZstdDecompressor().decompress(body)
+    return json.loads(body)
+
+
+class TraceBatcher:
+    """
+    Thread-safe per-session trace buffer with size, age and explicit flushing.
+    """
+
+    def __init__(
+        self,
+        send: BatchSender,
+        max_batch_traces: int = 500,
+        max_batch_bytes: int = 512 * 1024,
+        max_batch_age_s: float = 1.0,
+        compression: Compression = "gzip",
+        max_buffered_traces: int = 10000,
+    ) -> None:
+        """
+        Initialize TraceBatcher.
+
+        Args:
+            send: Coroutine sending (session_id, body, headers, trace_count); returns True
+                if sent, False to retry the batch later, None if it was rejected for good
+            max_batch_traces: Flush when a session buffer holds this many traces
+            max_batch_bytes: Flush when a session buffer holds this many content bytes
+            max_batch_age_s: Flush when the oldest buffered trace is this old
+            compression: Batch compression ("gzip", "zstd" or "none")
+            max_buffered_traces: Traces kept per session while batches fail; older ones
+                are dropped
+        """
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed, compressing trace batches with gzip")
+            compression = "gzip"
+
+        self.send = send
+        self.max_batch_traces = max_batch_traces
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_age_s = max_batch_age_s
+        self.compression = compression
+        self.max_buffered_traces = max_buffered_traces
+
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._buffer_bytes: Dict[str, int] = {}
+        self._sequence = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+
+        self.traces_sent = 0
+        self.batches_sent = 0
+        self.batches_failed = 0
+        self.traces_dropped = 0
+
+    def add(self, session_id: str, trace_type: str, content: str) -> int:
+        """
+        Buffer a trace and schedule a flush.
+
+        Returns:
+            Sequence number of the trace
+        """
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+            buffer = self._buffers.setdefault(session_id, [])
+            buffer.append(
+                {"seq": sequence, "type": trace_type, "content": content, "client_ts": time.time()}
+            )
+            size = self._buffer_bytes.get(session_id, 0) + len(content)
+            self._buffer_bytes[session_id] = size
+            full = len(buffer) >= self.max_batch_traces or size >= self.max_batch_bytes
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return sequence
+
+        if full:
+            self._start_flush(loop, session_id)
+        else:
+            self._schedule(loop)
+        return sequence
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Arm the age-based flush timer unless it is already armed on a running loop."""
+        if self._timer is None or not (self._timer_loop and self._timer_loop.is_running()):
+            # Traces arrive from several threads' loops; re-arm if the timer's loop stopped
+            self._timer_loop = loop
+            self._timer = loop.call_later(self.max_batch_age_s, self._on_timer, loop)
+
+    def pending(self) -> int:
+        """Number of buffered traces."""
+        with self._lock:
+            return sum(len(buffer) for buffer in self._buffers.values())
+
+    async def flush(self, session_id: Optional[str] = None) -> bool:
+        """
+        Send buffered traces.
+
+        Args:
+            session_id: Flush only this session if provided
+
+        Returns:
+            True if every batch was sent; failed batches are buffered again unless rejected
+        """
+        with self._lock:
+            session_ids = [session_id] if session_id is not None else list(self._buffers)
+            batches = [(sid, self._buffers.pop(sid, [])) for sid in session_ids]
+            for sid in session_ids:
+                self._buffer_bytes.pop(sid, None)
+
+        ok = True
+        for sid, traces in batches:
+            for start in range(0, len(traces), self.max_batch_traces):
+                chunk = traces[start : start + self.max_batch_traces]
+                body, headers = encode_batch(sid, chunk, self.compression)
+                sent = await self.send(sid, body, headers, len(chunk))
+                if sent:
+                    self.traces_sent += len(chunk)
+                    self.batches_sent += 1
+                    continue
+                self.batches_failed += 1
+                ok = False
+                if sent is None:
+                    self.traces_dropped += len(chunk)
+                    continue
+                # Keep this and the following chunks, ahead of traces added meanwhile
+                self._requeue(sid, traces[start:])
+                self._schedule(asyncio.get_running_loop())
+                break
+        return ok
+
+    def _requeue(self, session_id: str, traces: List[Dict[str, Any]]) -> None:
+        """Put unsent traces back at the front of a session buffer, within the cap."""
+        with self._lock:
+            buffer = traces + self._buffers.get(session_id, [])
+            excess = len(buffer) - self.max_buffered_traces
+            if excess > 0:
+                self.traces_dropped += excess
+                logger.warning(f"Dropping {excess} unsent traces of session {session_id}")
+                buffer = buffer[excess:]
+            self._buffers[session_id] = buffer
+            self._buffer_bytes[session_id] = sum(len(trace["content"]) for trace in buffer)
+
+    def _on_timer(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Age-based flush."""
+        self._timer = None
+        if self.pending():
+            self._start_flush(loop)
+
+    def _start_flush(
+        self, loop: asyncio.AbstractEventLoop, session_id: Optional[str] = None
+    ) -> None:
+        """Run a flush in the background, keeping a reference until it is done."""
+        task = loop.create_task(self.flush(session_id))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
@@ -0,0 +1,706 @@
+"""
+Trace Sinks
+
+Destinations for sessions, traces and media. CDPObserver and Agent write to a TraceSink;
+APIClient is the sink for the ingestion API, and the sinks here write elsewhere:
+
+- MemorySink keeps records in memory, for tests
+- JSONLFileSink writes rotating, optionally gzip-compressed JSONL files
+- OTLPHTTPSink (in otlp_sink) exports to an OpenTelemetry collector over OTLP/HTTP
+- FanoutSink writes to several sinks at once
+
+Local sinks derive from BufferedTraceSink, which buffers records and writes them in
+batches by count or age, one batch at a time and in order, and keeps per-sink stats
+(records, batches, bytes, errors and time spent writing) so the overhead of different
+sinks can be compared.
+"""
+
+import abc
+import asyncio
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Literal, Optional, Sequence, Set, Tuple, Union
+
+from .media_upload import guess_mime_type, media_filename, parse_data_uri
+
+logger = logging.getLogger(__name__)
+
+TraceType = Literal["dom", "action", "eval", "tool", "thought", "network", "final"]
+TraceResponse = Dict[str, Union[str, int]]
+MediaType = Literal["image", "video"]
+SinkRecord = Dict[str, Any]
+
+
+@dataclass
+class Session:
+    """Represents an API session"""
+
+    id: str
+    prompt: str
+    model: str
+    param: Optional[Dict[str, Any]] = None
+
+
+class TraceSink(abc.ABC):
+    """
+    Interface of trace destinations.
+
+    session_id is the current session, used when a call does not pass one.
+    """
+
+    name = "sink"
+    session_id: Optional[str] = None
+
+    @abc.abstractmethod
+    async def create_session(
+        self,
+        prompt: str,
+        model: str,
+        param: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        """
+        Start a session.
+
+        Args:
+            prompt: The task/prompt for the AI model
+            model: The AI model name/identifier
+            param: Optional additional parameters
+            session_id: Id to use, so fanned-out sinks share one; sinks whose backend
+                assigns ids ignore it
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def create_trace(
+        self, trace_type: TraceType, content: str, session_id: Optional[str] = None
+    ) -> TraceResponse:
+        """Record a trace."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def upload_media(
+        self,
+        media_type: MediaType,
+        data: Union[str, bytes],
+        session_id: Optional[str] = None,
+        mime_type: Optional[str] = None,
+    ) -> Optional[str]:
+        """Store media given as raw bytes or a data URI; returns a reference or None."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def upload_media_file(
+        self,
+        media_type: MediaType,
+        path: str,
+        session_id: Optional[str] = None,
+        mime_type: Optional[str] = None,
+    ) -> Optional[str]:
+        """Store a media file (it may be deleted afterwards); returns a reference or None."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def update_session(
+        self, evaluation: Dict[str, Any], result: str, session_id: Optional[str] = None
+    ) -> bool:
+        """Record the evaluation and final result of a session."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def end_session(self, session_id: Optional[str] = None) -> str:
+        """End a session."""
+        raise NotImplementedError
+
+    async def flush_traces(self, session_id: Optional[str] = None) -> bool:
+        """Write buffered records now; returns True if everything was written."""
+        return True
+
+    async def close(self) -> None:
+        """Flush and release resources."""
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of the sink."""
+        return {"name": self.name}
+
+
+class SinkStats:
+    """Write counters of a buffered sink."""
+
+    def __init__(self) -> None:
+        self.records = 0
+        self.batches = 0
+        self.bytes = 0
+        self.errors = 0
+        self.records_dropped = 0
+        self.write_time_s = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "records": self.records,
+            "batches": self.batches,
+            "bytes": self.bytes,
+            "errors": self.errors,
+            "records_dropped": self.records_dropped,
+            "write_time_ms": round(self.write_time_s * 1000, 3),
+            "avg_batch_ms": round(self.write_time_s * 1000 / self.batches, 3)
+            if self.batches
+            else 0.0,
+            "avg_record_us": round(self.write_time_s * 1e6 / self.records, 3)
+            if self.records
+            else 0.0,
+        }
+
+
+class BufferedTraceSink(TraceSink):
+    """
+    Base class of local sinks: assigns session ids and sequence numbers, buffers records
+    and hands them to _write_batch by count, age or explicit flush.
+    """
+
+    def __init__(self, max_batch_records: int = 500, max_batch_age_s: float = 1.0):
+        """
+        Initialize BufferedTraceSink.
+
+        Args:
+            max_batch_records: Write a batch when this many records are buffered
+            max_batch_age_s: Write a batch when its oldest record is this old
+        """
+        self.session_id: Optional[str] = None
+        self.max_batch_records = max_batch_records
+        self.max_batch_age_s = max_batch_age_s
+        self.sink_stats = SinkStats()
+
+        self._buffer: List[SinkRecord] = []
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+        # Flushes run one at a time across threads; waiters are woken through their loops
+        self._writing = False
+        self._write_waiters: Deque[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = (
+            deque()
+        )
+
+    async def create_session(
+        self,
+        prompt: str,
+        model: str,
+        param: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        self.session_id = session_id or str(uuid.uuid4())
+        self._add(
+            "session",
+            self.session_id,
+            {"prompt": prompt, "model": model, "param": param or {}},
+        )
+        return Session(id=self.session_id, prompt=prompt, model=model, param=param)
+
+    async def create_trace(
+        self, trace_type: TraceType, content: str, session_id: Optional[str] = None
+    ) -> TraceResponse:
+        sequence = self._add(
+            "trace", self._session(session_id), {"type": trace_type, "content": content}
+        )
+        return {"seq": sequence}
+
+    async def upload_media(
+        self,
+        media_type: MediaType,
+        data: Union[str, bytes],
+        session_id: Optional[str] = None,
+        mime_type: Optional[str] = None,
+    ) -> Optional[str]:
+        if isinstance(data, str):
+            uri_mime_type, data = parse_data_uri(data)
+            mime_type = mime_type or uri_mime_type
+        return await self._store_media(
+            self._session(session_id), media_type, mime_type or "application/octet-stream", data
+        )
+
+    async def upload_media_file(
+        self,
+        media_type: MediaType,
+        path: str,
+        session_id: Optional[str] = None,
+        mime_type: Optional[str] = None,
+    ) -> Optional[str]:
+        data = await asyncio.to_thread(_read_file, path)
+        return await self._store_media(
+            self._session(session_id),
+            media_type,
+            mime_type or guess_mime_type(path, media_type),
+            data,
+        )
+
+    async def update_session(
+        self, evaluation: Dict[str, Any], result: str, session_id: Optional[str] = None
+    ) -> bool:
+        self._add("update", self._session(session_id), {"evaluation": evaluation, "result": result})
+        return True
+
+    async def end_session(self, session_id: Optional[str] = None) -> str:
+        self._add("end", self._session(session_id), {})
+        await self.flush_traces()
+        return "ok"
+
+    async def flush_traces(self, session_id: Optional[str] = None) -> bool:
+        await self._acquire_writer()
+        try:
+            # Taken while holding the writer, so batches are written in buffer order
+            with self._lock:
+                records, self._buffer = self._buffer, []
+            if not records:
+                return True
+
+            start = time.perf_counter()
+            try:
+                written = await self._write_batch(records)
+            except Exception as e:
+                self.sink_stats.errors += 1
+                self.sink_stats.records_dropped += len(records)
+                print(f"[{self.name.upper()}] Failed to write {len(records)} records: {e}")
+                return False
+        finally:
+            self._release_writer()
+        self.sink_stats.write_time_s += time.perf_counter() - start
+        self.sink_stats.records += len(records)
+        self.sink_stats.batches += 1
+        self.sink_stats.bytes += written
+        return True
+
+    async def close(self) -> None:
+        await self.flush_traces()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, **self.sink_stats.to_dict(), "buffered": len(self._buffer)}
+
+    async def _acquire_writer(self) -> None:
+        """Wait until no other flush is writing, on any thread."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._writing:
+                self._writing = True
+                return
+            future = loop.create_future()
+            self._write_waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, future) in self._write_waiters:
+                    self._write_waiters.remove((loop, future))
+                    raise
+            # Handed the writer while being cancelled: pass it on
+            self._release_writer()
+            raise
+
+    def _release_writer(self) -> None:
+        """Hand the writer to the next waiting flush, if any."""
+        with self._lock:
+            if not self._write_waiters:
+                self._writing = False
+                return
+            loop, future = self._write_waiters.popleft()
+        loop.call_soon_threadsafe(_resolve, future)
+
+    def _start_flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Run a flush in the background, keeping a reference until it is done."""
+        task = loop.create_task(self.flush_traces())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _store_media(
+        self, session_id: str, media_type: str, mime_type: str, data: bytes
+    ) -> Optional[str]:
+        """Record media; subclasses that keep the bytes override this."""
+        sequence = self._add(
+            "media",
+            session_id,
+            {"media_type": media_type, "mime_type": mime_type, "size": len(data)},
+        )
+        return f"{self.name}:{sequence}"
+
+    @abc.abstractmethod
+    async def _write_batch(self, records: List[SinkRecord]) -> int:
+        """
+        Write a batch of records.
+
+        Returns:
+            Number of bytes written (0 if not meaningful for the sink)
+        """
+        raise NotImplementedError
+
+    def _session(self, session_id: Optional[str]) -> str:
+        sid = session_id or self.session_id
+        if not sid:
+            raise ValueError("No session ID provided or set")
+        return sid
+
+    def _add(self, kind: str, session_id: str, fields: Dict[str, Any]) -> int:
+        """Buffer a record and schedule its batch."""
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+            self._buffer.append(
+                {
+                    "seq": sequence,
+                    "ts": time.time(),
+                    "kind": kind,
+                    "session_id": session_id,
+                    **fields,
+                }
+            )
+            full = len(self._buffer) >= self.max_batch_records
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return sequence
+
+        if full:
+            self._start_flush(loop)
+        elif self._timer is None or not (self._timer_loop and self._timer_loop.is_running()):
+            self._timer_loop = loop
+            self._timer = loop.call_later(self.max_batch_age_s, self._on_timer, loop)
+        return sequence
+
+    def _on_timer(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._timer = None
+        if self._buffer:
+            self._start_flush(loop)
+
+
+def _resolve(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class MemorySink(BufferedTraceSink):
+    """
+    Keeps records in memory, for tests. Media bytes are kept in the record's "data".
+    """
+
+    name = "memory"
+
+    def __init__(
+        self,
+        max_records: Optional[int] = None,
+        max_batch_records: int = 500,
+        max_batch_age_s: float = 1.0,
+    ):
+        """
+        Initialize MemorySink.
+
+        Args:
+            max_records: Keep only the most recent records if provided
+            max_batch_records: Write a batch when this many records are buffered
+            max_batch_age_s: Write a batch when its oldest record is this old
+        """
+        super().__init__(max_batch_records=max_batch_records, max_batch_age_s=max_batch_age_s)
+        self.records: Deque[SinkRecord] = deque(maxlen=max_records)
+
+    def traces(
+        self, trace_type: Optional[str] = None, session_id: Optional[str] = None
+    ) -> List[SinkRecord]:
+        """Written trace records, optionally of one type or session."""
+        return [
+            record
+            for record in self.records
+            if record["kind"] == "trace"
+            and (trace_type is None or record["type"] == trace_type)
+            and (session_id is None or record["session_id"] == session_id)
+        ]
+
+    async def _store_media(
+        self, session_id: str, media_type: str, mime_type: str, data: bytes
+    ) -> Optional[str]:
+        sequence = self._add(
+            "media",
+            session_id,
+            {"media_type": media_type, "mime_type": mime_type, "size": len(data), "data": data},
+        )
+        return f"{self.name}:{sequence}"
+
+    async def _write_batch(self, records: List[SinkRecord]) -> int:
+        self.records.extend(records)
+        return 0
+
+
+class JSONLFileSink(BufferedTraceSink):
+    """
+    Writes records as JSON lines to rotating files, gzip-compressed by default. Media
+    bytes are written to a media/ directory and referenced by path.
+    """
+
+    name = "jsonl"
+
+    def __init__(
+        self,
+        directory: str,
+        compress: bool = True,
+        max_file_bytes: int = 64 * 1024 * 1024,
+        max_files: Optional[int] = None,
+        max_batch_records: int = 500,
+        max_batch_age_s: float = 1.0,
+    ):
+        """
+        Initialize JSONLFileSink.
+
+        Args:
+            directory: Output directory (created if missing)
+            compress: Write .jsonl.gz files instead of .jsonl
+            max_file_bytes: Start a new file after this many uncompressed bytes
+            max_files: Delete the oldest trace files beyond this many if provided
+            max_batch_records: Write a batch when this many records are buffered
+            max_batch_age_s: Write a batch when its oldest record is this old
+        """
+        super().__init__(max_batch_records=max_batch_records, max_batch_age_s=max_batch_age_s)
+        self.directory = directory
+        self.compress = compress
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.media_dir = os.path.join(directory, "media")
+        os.makedirs(self.media_dir, exist_ok=True)
+
+        self.files: List[str] = []
+        self._write_lock = threading.Lock()
+        self._file: Optional[Any] = None
+        self._file_bytes = 0
+        self._file_prefix = f"traces-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+    async def upload_media_file(
+        self,
+        media_type: MediaType,
+        path: str,
+        session_id: Optional[str] = None,
+        mime_type: Optional[str] = None,
+    ) -> Optional[str]:
+        sid = self._session(session_id)
+        mime_type = mime_type or guess_mime_type(path, media_type)
+        target = self._media_path(media_type, mime_type)
+        size = await asyncio.to_thread(_copy_file, path, target)
+        self._add(
+            "media",
+            sid,
+            {"media_type": media_type, "mime_type": mime_type, "size": size, "path": target},
+        )
+        return target
+
+    async def close(self) -> None:
+        await self.flush_traces()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "files": len(self.files)}
+
+    async def _store_media(
+        self, session_id: str, media_type: str, mime_type: str, data: bytes
+    ) -> Optional[str]:
+        target = self._media_path(media_type, mime_type)
+        await asyncio.to_thread(_write_file, target, data)
+        self._add(
+            "media",
+            session_id,
+            {"media_type": media_type, "mime_type": mime_type, "size": len(data), "path": target},
+        )
+        return target
+
+    def _media_path(self, media_type: str, mime_type: str) -> str:
+        return os.path.join(
+            self.media_dir, f"{uuid.uuid4().hex}-{media_filename(media_type, mime_type)}"
+        )
+
+    async def _write_batch(self, records: List[SinkRecord]) -> int:
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        return await asyncio.to_thread(self._write_lines, data.encode("utf-8"))
+
+    def _write_lines(self, data: bytes) -> int:
+        with self._write_lock:
+            if self._file is None or (
+                self._file_bytes and self._file_bytes + len(data) > self.max_file_bytes
+            ):
+                self._rotate()
+            assert self._file is not None
+            self._file.write(data)
+            # For gzip this is a sync flush, so complete lines can be read back after a crash
+            self._file.flush()
+            self._file_bytes += len(data)
+        return len(data)
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        extension = ".jsonl.gz" if self.compress else ".jsonl"
+        path = os.path.join(self.directory, f"{self._file_prefix}-{len(self.files):04d}{extension}")
+        self._file = gzip.open(path, "ab") if self.compress else open(path, "ab")
+        self._file_bytes = 0
+        self.files.append(path)
+
+        while self.max_files is not None and len(self.files) > self.max_files:
+            try:
+                os.remove(self.files.pop(0))
+            except FileNotFoundError:
+                pass
+
+
+def _write_file(path: str, data: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _copy_file(source: str, target: str) -> int:
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        size = 0
+        while chunk := src.read(1024 * 1024):
+            dst.write(chunk)
+            size += len(chunk)
+    return size
+
+
+class FanoutSink(TraceSink):
+    """
+    Writes to several sinks concurrently. The first sink that creates a session decides
+    its id, which the other sinks reuse; a failing sink does not affect the others.
+    """
+
+    name = "fanout"
+
+    def __init__(self, sinks: Sequence[TraceSink]):
+        """
+        Initialize FanoutSink.
+
+        Args:
+            sinks: Sinks to write to; results are taken from the first that succeeds
+        """
+        if not sinks:
+            raise ValueError("FanoutSink needs at least one sink")
+        self.sinks: List[TraceSink] = list(sinks)
+        self.session_id: Optional[str] = None
+        self.errors: Dict[str, int] = {}
+
+    async def create_session(
+        self,
+        prompt: str,
+        model: str,
+        param: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session: Optional[Session] = None
+        for sink in self.sinks:
+            try:
+                created = await sink.create_session(
+                    prompt, model, param, session_id=session.id if session else session_id
+                )
+            except Exception as e:
+                self._record_error(sink, "create session", e)
+                continue
+            session = session or created
+        if session is None:
+            raise Exception("No sink could create a session")
+        self.session_id = session.id
+        return session
+
+    async def create_trace(
+        self, trace_type: TraceType, content: str, session_id: Optional[str] = None
+    ) -> TraceResponse:
+        results = await self._call(
+            "create trace", "create_trace", trace_type, content, session_id=session_id
+        )
+        return next((result for result in results if result), {})
+
+    async def upload_media(
+        self,
+        media_type: MediaType,
+        data: Union[str, bytes],
+        session_id: Optional[str] = None,
+        mime_type: Optional[str] = None,
+    ) -> Optional[str]:
+        results = await self._call(
+            "upload media",
+            "upload_media",
+            media_type,
+            data,
+            session_id=session_id,
+            mime_type=mime_type,
+        )
+        return next((result for result in results if result), None)
+
+    async def upload_media_file(
+        self,
+        media_type: MediaType,
+        path: str,
+        session_id: Optional[str] = None,
+        mime_type: Optional[str] = None,
+    ) -> Optional[str]:
+        results = await self._call(
+            "upload media file",
+            "upload_media_file",
+            media_type,
+            path,
+            session_id=session_id,
+            mime_type=mime_type,
+        )
+        return next((result for result in results if result), None)
+
+    async def update_session(
+        self, evaluation: Dict[str, Any], result: str, session_id: Optional[str] = None
+    ) -> bool:
+        results = await self._call(
+            "update session", "update_session", evaluation, result, session_id=session_id
+        )
+        return any(results)
+
+    async def end_session(self, session_id: Optional[str] = None) -> str:
+        results = await self._call("end session", "end_session", session_id=session_id)
+        return next((result for result in results if result), "")
+
+    async def flush_traces(self, session_id: Optional[str] = None) -> bool:
+        results = await self._call("flush", "flush_traces", all_sinks=True)
+        return all(results)
+
+    async def close(self) -> None:
+        await self._call("close", "close", all_sinks=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "errors": dict(self.errors),
+            "sinks": [sink.stats() for sink in self.sinks],
+        }
+
+    async def _call(
+        self, what: str, method: str, *args: Any, all_sinks: bool = False, **kwargs: Any
+    ) -> List[Any]:
+        """Call a method on every sink with a session (or every sink); failures yield None."""
+        sinks = [sink for sink in self.sinks if all_sinks or sink.session_id]
+
+        async def call(sink: TraceSink) -> Any:
+            try:
+                return await getattr(sink, method)(*args, **kwargs)
+            except Exception as e:
+                self._record_error(sink, what, e)
+                return None
+
+        return list(await asyncio.gather(*(call(sink) for sink in sinks)))
+
+    def _record_error(self, sink: TraceSink, what: str, error: Exception) -> None:
+        self.errors[sink.name] = self.errors.get(sink.name, 0) + 1
+        logger.warning("%s sink failed to %s: %s", sink.name, what, error)
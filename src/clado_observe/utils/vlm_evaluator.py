@@ -4,7 +4,7 @@ Uses OpenAI's GPT-4 Vision to evaluate screenshots and logs.
 """
 
 import json
-from typing import List, Optional, Tuple, TypedDict
+from typing import Collection, Iterable, List, Optional, Tuple, TypedDict
 from dataclasses import dataclass
 from openai import OpenAI
 import re
@@ -29,7 +29,7 @@ class RunData:
     """Container for collected run data"""
 
     task: str
-    screenshots: List[str]
+    screenshots: Collection[str]
     logs: List[Tuple[str, str]]
     final_result: Optional[str] = None
 
@@ -57,12 +57,12 @@ class VLMEvaluator:
         """
         self.client = OpenAI(api_key=api_key)
 
-    def prepare_screenshots_for_vlm(self, screenshots: List[str]) -> List[dict]:
+    def prepare_screenshots_for_vlm(self, screenshots: Iterable[str]) -> List[dict]:
         """
         Prepare screenshots for VLM input.
 
         Args:
-            screenshots: List of base64 encoded images (already include data URI prefix)
+            screenshots: Base64 encoded images (already include data URI prefix), read lazily
 
         Returns:
             List of formatted image inputs for the VLM
@@ -0,0 +1,85 @@
+import pytest
+
+from clado_observe.cdp.utils.action_index import ActionIndex
+
+
+def _index(*action_times: float) -> ActionIndex:
+    index: ActionIndex = ActionIndex()
+    for n, timestamp in enumerate(action_times):
+        index.add_action(f"action {n}", timestamp)
+    return index
+
+
+def test_window_boundaries() -> None:
+    index = _index(10.0, 20.0)
+    for key, timestamp in [("a", 5.0), ("b", 10.0), ("c", 10.5), ("d", 20.0), ("e", 25.0)]:
+        index.add_request(key, timestamp)
+
+    # A window ends at its action's log time, inclusive, and starts after the previous one
+    assert index.requests_for_action(0) == ["a", "b"]
+    assert index.requests_for_action(1) == ["c", "d"]
+    assert index.action_for_request("b") == 0
+    assert index.action_for_request("c") == 1
+    # Requests after the last action belong to no action yet
+    assert index.action_for_request("e") is None
+    assert index.add_action("action 2", 30.0) == 2
+    assert index.requests_for_action(2) == ["e"]
+    assert index.action_for_request("e") == 2
+
+
+def test_out_of_order_actions_are_clamped() -> None:
+    index = _index(10.0, 5.0)
+    assert index.action_times == [10.0, 10.0]
+    index.add_request("a", 8.0)
+    assert index.requests_for_action(0) == ["a"]
+    assert index.requests_for_action(1) == []
+
+
+def test_requests_for_action_rejects_unknown_index() -> None:
+    index = _index(10.0)
+    with pytest.raises(IndexError):
+        index.requests_for_action(1)
+    with pytest.raises(IndexError):
+        index.requests_for_action(-1)
+
+
+def test_child_requests_inherit_parent_start() -> None:
+    index = _index(10.0)
+    index.add_request("navigation", 9.0)
+    index.add_request("preflight", 12.0, parent="navigation")
+    index.add_request("unrelated", 12.0, parent="unknown")
+    index.add_action("action 1", 20.0)
+
+    assert index.requests_for_action(0) == ["navigation", "preflight"]
+    assert index.requests_for_action(1) == ["unrelated"]
+    assert index.action_for_request("preflight") == 0
+
+
+def test_duplicate_requests_keep_their_first_start() -> None:
+    index = _index(10.0, 20.0)
+    index.add_request("a", 5.0)
+    index.add_request("a", 15.0)
+    assert index.requests_for_action(0) == ["a"]
+    assert index.requests_for_action(1) == []
+
+
+def test_remove_request() -> None:
+    index = _index(10.0)
+    for key in ("a", "b", "c"):
+        index.add_request(key, 5.0)
+    index.remove_request("b")
+    index.remove_request("missing")
+
+    assert index.requests_for_action(0) == ["a", "c"]
+    assert index.action_for_request("b") is None
+    # A removed request can be recorded again
+    index.add_request("b", 5.0)
+    assert index.requests_for_action(0) == ["a", "c", "b"]
+
+
+def test_clear() -> None:
+    index = _index(10.0)
+    index.add_request("a", 5.0)
+    index.clear()
+    assert len(index) == 0
+    assert index.action_for_request("a") is None
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from clado_observe.cdp.utils.latency import LatencySketch
+
+
+def _exact_quantile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def _sketch(values, **kwargs) -> LatencySketch:
+    sketch = LatencySketch(**kwargs)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def test_quantiles_are_within_relative_accuracy() -> None:
+    rng = random.Random(7)
+    values = [rng.lognormvariate(4, 1.5) for _ in range(5000)]
+    sketch = LatencySketch(relative_accuracy=0.01)
+    for n, value in enumerate(values, 1):
+        sketch.add(value)
+        if n % 500 == 0:
+            for q in (0.01, 0.25, 0.5, 0.9, 0.95, 0.99):
+                exact = _exact_quantile(values[:n], q)
+                assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+
+
+def test_quantile_edges() -> None:
+    assert LatencySketch().quantile(0.5) is None
+
+    sketch = _sketch([5.0, 10.0, 20.0])
+    assert sketch.quantile(0) == 5.0
+    assert sketch.quantile(1) == 20.0
+    # Estimates are clamped to the observed range
+    assert 5.0 <= sketch.quantile(0.001) <= 20.0
+    assert sketch.percentiles()["p50"] == pytest.approx(10.0, rel=0.01)
+
+
+def test_values_at_or_below_min_value_are_zero() -> None:
+    sketch = _sketch([0.0, 0.0005, 0.001, 100.0, 100.0, 100.0], min_value=1e-3)
+    assert sketch.zero_count == 3
+    assert sketch.quantile(0.3) == 0.0
+    assert sketch.quantile(0.9) == pytest.approx(100.0, rel=0.01)
+
+
+def test_merge_matches_a_single_sketch() -> None:
+    rng = random.Random(11)
+    first = [rng.expovariate(0.01) for _ in range(1000)]
+    second = [rng.expovariate(0.001) for _ in range(1000)]
+
+    merged = _sketch(first)
+    merged.merge(_sketch(second))
+    combined = _sketch(first + second)
+
+    assert merged.count == combined.count == 2000
+    assert merged.sum == pytest.approx(combined.sum)
+    assert merged.min == combined.min and merged.max == combined.max
+    assert merged.bins == combined.bins
+    for q in (0.1, 0.5, 0.9, 0.99):
+        assert merged.quantile(q) == combined.quantile(q)
+
+    # Adding after a merge keeps the sketch consistent
+    merged.add(1e6)
+    combined.add(1e6)
+    assert merged.quantile(0.9995) == combined.quantile(0.9995)
+
+
+def test_merge_rejects_incompatible_sketches() -> None:
+    sketch = LatencySketch(relative_accuracy=0.01)
+    with pytest.raises(ValueError):
+        sketch.merge(LatencySketch(relative_accuracy=0.02))
+    with pytest.raises(ValueError):
+        sketch.merge(LatencySketch(relative_accuracy=0.01, min_value=1.0))
+
+
+def test_to_dict_round_trip() -> None:
+    rng = random.Random(3)
+    sketch = _sketch([0.0] + [rng.uniform(1, 5000) for _ in range(500)], relative_accuracy=0.02)
+    restored = LatencySketch.from_dict(sketch.to_dict())
+
+    assert restored.to_dict() == sketch.to_dict()
+    assert restored.percentiles() == sketch.percentiles()
+
+    restored.add(9000.0)
+    sketch.add(9000.0)
+    assert restored.quantile(0.999) == sketch.quantile(0.999)
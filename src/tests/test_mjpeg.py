@@ -0,0 +1,184 @@
+import struct
+
+import pytest
+
+from clado_observe.cdp.utils import mjpeg
+from clado_observe.cdp.utils.mjpeg import MJPEGWriter, _encode_size, jpeg_dimensions
+
+
+def _jpeg(width: int = 320, height: int = 200, padding: int = 0) -> bytes:
+    """Minimal JPEG: SOI, an APP0 segment, a baseline SOF0 segment and EOI."""
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00"
+    return b"\xff\xd8" + app0 + sof0 + b"\x00" * padding + b"\xff\xd9"
+
+
+def _read_vint(data: bytes, offset: int, keep_marker: bool):
+    first = data[offset]
+    length = 1
+    while not first & (0x80 >> (length - 1)):
+        length += 1
+    value = int.from_bytes(data[offset : offset + length], "big")
+    if not keep_marker:
+        value &= (1 << (7 * length)) - 1
+        if value == (1 << (7 * length)) - 1:
+            value = None
+    return value, offset + length
+
+
+def _parse(data: bytes):
+    """Parse EBML elements into (id, offset of data, data) tuples; sizes must be known."""
+    elements = []
+    offset = 0
+    while offset < len(data):
+        element_id, offset = _read_vint(data, offset, keep_marker=True)
+        size, offset = _read_vint(data, offset, keep_marker=False)
+        assert size is not None, f"unknown size left in element {element_id:x}"
+        elements.append((element_id, offset, data[offset : offset + size]))
+        offset += size
+    assert offset == len(data)
+    return elements
+
+
+def _find(elements, element_id):
+    return [element for element in elements if element[0] == element_id]
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    top = _parse(data)
+    assert [element[0] for element in top] == [mjpeg.EBML_ID, mjpeg.SEGMENT_ID]
+    segment = _parse(top[1][2])
+    return data, top, segment
+
+
+def _clusters(segment):
+    clusters = []
+    for _, _, cluster in _find(segment, mjpeg.CLUSTER_ID):
+        children = _parse(cluster)
+        timecode = int.from_bytes(_find(children, mjpeg.CLUSTER_TIMECODE_ID)[0][2], "big")
+        blocks = [
+            (struct.unpack(">h", block[1:3])[0], block[4:])
+            for _, _, block in _find(children, mjpeg.SIMPLE_BLOCK_ID)
+        ]
+        clusters.append((timecode, blocks))
+    return clusters
+
+
+def _duration(segment) -> float:
+    info = _parse(_find(segment, mjpeg.INFO_ID)[0][2])
+    return struct.unpack(">d", _find(info, mjpeg.DURATION_ID)[0][2])[0]
+
+
+def test_jpeg_dimensions() -> None:
+    assert jpeg_dimensions(_jpeg(1280, 720)) == (1280, 720)
+    # Fill bytes before a marker are skipped
+    jpeg = _jpeg(640, 480)
+    assert jpeg_dimensions(jpeg[:2] + b"\xff" + jpeg[2:]) == (640, 480)
+    assert jpeg_dimensions(b"\x89PNG\r\n\x1a\n") is None
+    assert jpeg_dimensions(b"\xff\xd8\xff\xe0\x00\x10") is None
+    assert jpeg_dimensions(b"") is None
+
+
+@pytest.mark.parametrize(
+    "size, encoded",
+    [
+        (0, b"\x80"),
+        (126, b"\xfe"),
+        # 127 would be the reserved all-ones (unknown) value in one byte
+        (127, b"\x40\x7f"),
+        (2**14 - 2, b"\x7f\xfe"),
+        (2**14 - 1, b"\x20\x3f\xff"),
+        (2**56 - 2, b"\x01\xff\xff\xff\xff\xff\xff\xfe"),
+    ],
+)
+def test_encode_size_boundaries(size: int, encoded: bytes) -> None:
+    assert _encode_size(size) == encoded
+    assert _read_vint(encoded, 0, keep_marker=False) == (size, len(encoded))
+
+
+def test_encode_size_rejects_unknown_size() -> None:
+    with pytest.raises(ValueError):
+        _encode_size(2**56 - 1)
+
+
+def test_frames_are_read_back_with_track_and_timecodes(tmp_path) -> None:
+    path = str(tmp_path / "track.mkv")
+    writer = MJPEGWriter(path)
+    frames = [_jpeg(padding=n) for n in range(3)]
+    for n, frame in enumerate(frames):
+        writer.write_frame(frame, 100.0 + n * 0.1)
+    writer.close()
+
+    _, _, segment = _read_file(path)
+    tracks = _parse(_find(segment, mjpeg.TRACKS_ID)[0][2])
+    entry = _parse(_find(tracks, mjpeg.TRACK_ENTRY_ID)[0][2])
+    assert _find(entry, mjpeg.CODEC_ID_ID)[0][2] == b"V_MJPEG"
+    video = _parse(_find(entry, mjpeg.VIDEO_ID)[0][2])
+    assert int.from_bytes(_find(video, mjpeg.PIXEL_WIDTH_ID)[0][2], "big") == 320
+    assert int.from_bytes(_find(video, mjpeg.PIXEL_HEIGHT_ID)[0][2], "big") == 200
+
+    assert _clusters(segment) == [(0, [(0, frames[0]), (100, frames[1]), (200, frames[2])])]
+
+
+def test_cluster_rolls_over_after_max_duration(tmp_path) -> None:
+    path = str(tmp_path / "track.mkv")
+    writer = MJPEGWriter(path)
+    frame = _jpeg()
+    limit_s = mjpeg.MAX_CLUSTER_MS / 1000
+    for timestamp in (0.0, limit_s / 2, limit_s, limit_s + 0.001, limit_s + 1.0):
+        writer.write_frame(frame, timestamp)
+    writer.close()
+
+    _, _, segment = _read_file(path)
+    clusters = _clusters(segment)
+    assert [timecode for timecode, _ in clusters] == [0, mjpeg.MAX_CLUSTER_MS + 1]
+    assert [relative for relative, _ in clusters[0][1]] == [0, 2500, 5000]
+    assert [relative for relative, _ in clusters[1][1]] == [0, 999]
+
+
+def test_cluster_rolls_over_after_max_bytes(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(mjpeg, "MAX_CLUSTER_BYTES", 1000)
+    path = str(tmp_path / "track.mkv")
+    writer = MJPEGWriter(path)
+    frame = _jpeg(padding=400)
+    for n in range(5):
+        writer.write_frame(frame, n * 0.04)
+    writer.close()
+
+    _, _, segment = _read_file(path)
+    clusters = _clusters(segment)
+    # A cluster takes frames until it holds more than MAX_CLUSTER_BYTES
+    assert [len(blocks) for _, blocks in clusters] == [3, 2]
+    assert [timecode for timecode, _ in clusters] == [0, 120]
+    assert sum(len(blocks) for _, blocks in clusters) == writer.frame_count == 5
+
+
+def test_close_patches_segment_size_and_duration(tmp_path) -> None:
+    path = str(tmp_path / "track.mkv")
+    writer = MJPEGWriter(path)
+    for n in range(3):
+        writer.write_frame(_jpeg(), 10.0 + n * 0.5)
+
+    # Sizes stay unknown until the file is closed
+    writer._file.flush()
+    with open(path, "rb") as f:
+        assert mjpeg.UNKNOWN_SIZE in f.read()
+
+    writer.close(end_timestamp=12.0)
+    data, top, segment = _read_file(path)
+    _, segment_offset, segment_data = top[1]
+    assert segment_offset + len(segment_data) == len(data)
+    assert _duration(segment) == 2000.0
+
+
+def test_duration_without_end_timestamp_adds_average_frame_interval(tmp_path) -> None:
+    path = str(tmp_path / "track.mkv")
+    writer = MJPEGWriter(path)
+    for n in range(3):
+        writer.write_frame(_jpeg(), n * 0.5)
+    writer.close()
+
+    _, _, segment = _read_file(path)
+    assert _duration(segment) == 1500.0
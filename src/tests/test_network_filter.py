@@ -0,0 +1,94 @@
+from typing import Optional
+
+import pytest
+
+from clado_observe.cdp.utils.network import NetworkEvent
+from clado_observe.cdp.utils.network_filter import NetworkFilter, NetworkRule
+
+KEEP_FAILURES = NetworkRule(status_classes=("failed", "4xx", "5xx"))
+DROP_ANALYTICS = NetworkRule(action="drop", hosts=("*.analytics.example",))
+BLOCK_ADS = NetworkRule(action="block", url_patterns=("*://ads.example/*",))
+SAMPLE_IMAGES = NetworkRule(resource_types=("Image",), status_classes=("2xx",), sample_rate=0.0)
+DROP_FONTS = NetworkRule(action="drop", resource_types=("Font",))
+
+RULES = [KEEP_FAILURES, DROP_ANALYTICS, BLOCK_ADS, SAMPLE_IMAGES, DROP_FONTS]
+
+
+def _event(
+    url: str,
+    resource_type: str,
+    status_code: Optional[int] = None,
+    failed: bool = False,
+    mime_type: Optional[str] = None,
+) -> NetworkEvent:
+    event = NetworkEvent("1.1", 0.0)
+    event.url = url
+    event.resource_type = resource_type
+    event.status_code = status_code
+    event.failed = failed
+    event.mime_type = mime_type
+    return event
+
+
+@pytest.mark.parametrize(
+    "url, resource_type, decision",
+    [
+        # Request-only drop and block rules apply before the earlier failure rule
+        ("https://t.analytics.example/beacon", "Ping", False),
+        ("https://ads.example/banner.js", "Script", False),
+        ("https://cdn.example/font.woff2", "Font", False),
+        # Everything else may still fail, so the failure rule decides on completion
+        ("https://cdn.example/logo.png", "Image", None),
+        ("https://app.example/api", "XHR", None),
+    ],
+)
+def test_on_request(url: str, resource_type: str, decision: Optional[bool]) -> None:
+    assert NetworkFilter(RULES).on_request("1.1", url, resource_type) is decision
+
+
+@pytest.mark.parametrize(
+    "event, decision",
+    [
+        (_event("https://cdn.example/logo.png", "Image", 500), True),
+        (_event("https://cdn.example/logo.png", "Image", failed=True), True),
+        (_event("https://cdn.example/logo.png", "Image", 200, mime_type="image/png"), False),
+        (_event("https://app.example/api", "XHR", 200), True),
+    ],
+)
+def test_on_complete(event: NetworkEvent, decision: bool) -> None:
+    assert NetworkFilter(RULES).on_complete(event) is decision
+
+
+def test_request_only_rules_decide_at_request_time() -> None:
+    network_filter = NetworkFilter([DROP_FONTS], default_sample_rate=0.0)
+    assert network_filter.on_request("1.1", "https://cdn.example/a.woff2", "Font") is False
+    assert network_filter.on_request("1.2", "https://app.example/", "Document") is False
+    assert NetworkFilter([DROP_FONTS]).on_request("1.3", "https://app.example/", "XHR") is True
+
+
+def test_request_only_rules_after_an_outcome_rule() -> None:
+    # A keep rule cannot override the earlier failure rule, so the decision is deferred
+    keep_images = NetworkFilter([KEEP_FAILURES, NetworkRule(resource_types=("Image",))])
+    assert keep_images.on_request("1.1", "https://cdn.example/a.png", "Image") is None
+    # A drop rule applies at once
+    drop_all = NetworkFilter([KEEP_FAILURES, NetworkRule(action="drop")])
+    assert drop_all.on_request("1.1", "https://cdn.example/a.png", "Image") is False
+
+
+def test_sampling_is_stable_per_request_id() -> None:
+    network_filter = NetworkFilter([], default_sample_rate=0.5)
+    decisions = [
+        network_filter.on_request(f"1.{n}", "https://a.example/", "XHR") for n in range(200)
+    ]
+    assert decisions == [
+        network_filter.on_request(f"1.{n}", "https://b.example/", "XHR") for n in range(200)
+    ]
+    assert 60 < sum(decisions) < 140
+
+
+def test_block_patterns_and_validation() -> None:
+    assert NetworkFilter(RULES).blocked_url_patterns() == ["*://ads.example/*"]
+    with pytest.raises(ValueError):
+        NetworkRule(action="block", hosts=("ads.example",))
+    with pytest.raises(ValueError):
+        NetworkRule(sample_rate=1.5)
@@ -0,0 +1,162 @@
+import json
+import os
+import time
+
+from clado_observe.utils.outbox import Outbox
+
+
+class Recorder:
+    """Delivery coroutine that records what it consumed."""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.records = []
+
+    async def __call__(self, records):
+        if self.fail:
+            return 0
+        self.records.extend(records)
+        return len(records)
+
+
+def _outbox(directory, deliver, **kwargs) -> Outbox:
+    outbox = Outbox(str(directory), deliver, fsync_interval_s=0.02, **kwargs)
+    outbox.start()
+    return outbox
+
+
+def _segments(lane_dir):
+    return sorted(name for name in os.listdir(lane_dir) if name.endswith(".wal"))
+
+
+def test_records_are_delivered_in_append_order(tmp_path) -> None:
+    deliver = Recorder()
+    outbox = _outbox(tmp_path, deliver, max_batch_records=7)
+    ids = [outbox.append("trace", {"n": n}) for n in range(50)]
+
+    assert outbox.flush(5)
+    assert outbox.close()
+    assert [record["id"] for record in deliver.records] == ids
+    assert [record["n"] for record in deliver.records] == list(range(50))
+    assert outbox.records_delivered == 50
+
+
+def test_cursor_is_persisted(tmp_path) -> None:
+    outbox = _outbox(tmp_path, Recorder())
+    for n in range(3):
+        outbox.append("trace", {"n": n})
+    assert outbox.flush(5)
+    outbox.close()
+
+    with open(os.path.join(outbox.lane_dir, "cursor.json")) as f:
+        cursor = json.load(f)
+    assert cursor["segment"] == 1
+    assert cursor["offset"] == os.path.getsize(
+        os.path.join(outbox.lane_dir, _segments(outbox.lane_dir)[0])
+    )
+
+    # Nothing is sent again after a restart
+    deliver = Recorder()
+    outbox = _outbox(tmp_path, deliver)
+    assert outbox.pending() == 0
+    outbox.append("trace", {"n": 3})
+    assert outbox.flush(5)
+    outbox.close()
+    assert [record["n"] for record in deliver.records] == [3]
+    assert deliver.records[0]["id"] == 4
+
+
+def test_unsent_records_are_resumed_after_restart(tmp_path) -> None:
+    outbox = _outbox(tmp_path, Recorder(fail=True), initial_backoff_s=10.0)
+    ids = [outbox.append("trace", {"n": n}) for n in range(3)]
+    assert not outbox.close(timeout=0.1)
+
+    deliver = Recorder()
+    outbox = _outbox(tmp_path, deliver)
+    assert outbox.pending() == 3
+    assert outbox.flush(5)
+    outbox.close()
+    assert [record["id"] for record in deliver.records] == ids
+
+
+def test_torn_last_line_is_skipped(tmp_path) -> None:
+    outbox = _outbox(tmp_path, Recorder(fail=True), initial_backoff_s=10.0)
+    for n in range(2):
+        outbox.append("trace", {"n": n})
+    outbox.close(timeout=0.1)
+    segment = os.path.join(outbox.lane_dir, _segments(outbox.lane_dir)[-1])
+    with open(segment, "ab") as f:
+        f.write(b'{"id": 3, "kind": "tra')
+
+    deliver = Recorder()
+    outbox = _outbox(tmp_path, deliver)
+    outbox.append("trace", {"n": 2})
+    assert outbox.flush(5)
+    outbox.close()
+    assert [record["n"] for record in deliver.records] == [0, 1, 2]
+    # Appends after a restart go to a new segment, not after the torn line
+    assert deliver.records[-1]["id"] == 3
+
+
+def test_segments_roll_over_and_are_deleted_once_delivered(tmp_path) -> None:
+    deliver = Recorder(fail=True)
+    outbox = _outbox(tmp_path, deliver, segment_max_bytes=200, initial_backoff_s=0.02)
+    for n in range(20):
+        outbox.append("trace", {"content": "x" * 40, "n": n})
+    assert len(_segments(outbox.lane_dir)) > 3
+
+    deliver.fail = False
+    assert outbox.flush(5)
+    # The sender deletes fully read segments when it is idle
+    deadline = time.monotonic() + 5
+    while len(_segments(outbox.lane_dir)) > 1 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    outbox.close()
+    assert [record["n"] for record in deliver.records] == list(range(20))
+    assert len(_segments(outbox.lane_dir)) == 1
+
+
+def test_blobs_are_deleted_once_delivered(tmp_path) -> None:
+    deliver = Recorder(fail=True)
+    outbox = _outbox(tmp_path, deliver, initial_backoff_s=0.02)
+    source = tmp_path / "video.mp4"
+    source.write_bytes(b"video")
+    outbox.append("media", {"n": 0}, blob=b"image")
+    outbox.append("media", {"n": 1}, blob_file=str(source))
+    blobs = sorted(os.listdir(outbox.blob_dir))
+    assert len(blobs) == 2
+
+    deliver.fail = False
+    assert outbox.flush(5)
+    outbox.close()
+    assert os.listdir(outbox.blob_dir) == []
+    assert source.exists()
+
+
+def test_oldest_records_are_dropped_over_the_size_limit(tmp_path) -> None:
+    outbox = _outbox(tmp_path, Recorder(fail=True), initial_backoff_s=10.0)
+    for n in range(3):
+        outbox.append("media", {"n": n}, blob=b"x" * 1000)
+    outbox.close(timeout=0.1)
+
+    deliver = Recorder()
+    outbox = _outbox(tmp_path, deliver, max_bytes=2500)
+    assert outbox.flush(5)
+    outbox.close()
+    assert [record["n"] for record in deliver.records] == [1, 2]
+    assert outbox.records_dropped == 1
+
+
+def test_records_older_than_the_age_limit_are_dropped(tmp_path) -> None:
+    outbox = _outbox(tmp_path, Recorder(fail=True), initial_backoff_s=10.0)
+    outbox.append("trace", {"n": 0})
+    outbox.close(timeout=0.1)
+    time.sleep(0.2)
+
+    deliver = Recorder()
+    outbox = _outbox(tmp_path, deliver, max_age_s=0.1)
+    outbox.append("trace", {"n": 1})
+    assert outbox.flush(5)
+    outbox.close()
+    assert [record["n"] for record in deliver.records] == [1]
+    assert outbox.records_dropped == 1
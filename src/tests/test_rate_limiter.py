@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+
+from clado_observe.utils.rate_limiter import AdaptiveLimiter, parse_retry_after
+
+
+def test_success_increases_limit_by_about_one_per_window() -> None:
+    async def run() -> None:
+        limiter = AdaptiveLimiter("test", initial_limit=4, max_limit=64)
+        for _ in range(4):
+            async with await limiter.acquire() as slot:
+                slot.record(200)
+        assert 4.9 < limiter.limit < 5.0
+
+    asyncio.run(run())
+
+
+def test_limit_stays_within_bounds() -> None:
+    async def run() -> None:
+        limiter = AdaptiveLimiter("test", initial_limit=2, min_limit=1, max_limit=3)
+        for _ in range(50):
+            async with await limiter.acquire() as slot:
+                slot.record(200)
+        assert limiter.limit == 3
+        for _ in range(10):
+            async with await limiter.acquire() as slot:
+                slot.record(503)
+        assert limiter.limit == 1
+
+    asyncio.run(run())
+
+
+def test_overloads_from_one_window_halve_the_limit_once() -> None:
+    async def run() -> None:
+        limiter = AdaptiveLimiter("test", initial_limit=8)
+        slots = [await limiter.acquire() for _ in range(4)]
+        for slot in slots:
+            async with slot:
+                slot.record(429)
+        assert limiter.limit == 4
+        assert limiter.overloads == 4
+
+        # A request sent after the decrease counts as a new signal
+        async with await limiter.acquire() as slot:
+            slot.record(503)
+        assert limiter.limit == 2
+
+    asyncio.run(run())
+
+
+def test_timeout_counts_as_overload() -> None:
+    async def run() -> None:
+        limiter = AdaptiveLimiter("test", initial_limit=8)
+        try:
+            async with await limiter.acquire():
+                raise asyncio.TimeoutError()
+        except asyncio.TimeoutError:
+            pass
+        assert limiter.limit == 4
+        assert limiter.stats()["in_flight"] == 0
+
+    asyncio.run(run())
+
+
+def test_retry_after_pauses_the_budget() -> None:
+    async def run() -> None:
+        limiter = AdaptiveLimiter("test", initial_limit=4)
+        async with await limiter.acquire() as slot:
+            slot.record(429, "0.2")
+        assert limiter.retry_after_pauses == 1
+
+        start = time.monotonic()
+        async with await limiter.acquire() as slot:
+            slot.record(200)
+        assert time.monotonic() - start >= 0.15
+
+    asyncio.run(run())
+
+
+def test_parse_retry_after() -> None:
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("600", max_delay_s=60.0) == 60.0
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after("Thu, 01 Jan 1970 00:00:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+
+
+def test_release_wakes_waiter_on_another_thread_loop() -> None:
+    limiter = AdaptiveLimiter("test", initial_limit=1, max_limit=1)
+    held = threading.Event()
+    release = threading.Event()
+    acquired_at = []
+
+    async def hold() -> None:
+        async with await limiter.acquire() as slot:
+            held.set()
+            await asyncio.to_thread(release.wait)
+            slot.record(200)
+
+    async def wait_for_slot() -> None:
+        async with await limiter.acquire() as slot:
+            acquired_at.append(time.monotonic())
+            slot.record(200)
+
+    holder = threading.Thread(target=lambda: asyncio.run(hold()))
+    holder.start()
+    assert held.wait(5)
+
+    waiter = threading.Thread(target=lambda: asyncio.run(wait_for_slot()))
+    waiter.start()
+    time.sleep(0.1)
+    assert not acquired_at
+    assert limiter.stats()["queued"] == 1
+
+    released_at = time.monotonic()
+    release.set()
+    holder.join(5)
+    waiter.join(5)
+    assert acquired_at and acquired_at[0] >= released_at
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_cancelled_waiter_passes_wakeup_on() -> None:
+    async def run() -> None:
+        limiter = AdaptiveLimiter("test", initial_limit=1, max_limit=1)
+        slot = await limiter.acquire()
+        cancelled = asyncio.create_task(limiter.acquire())
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        async with slot:
+            slot.record(200)
+        second = await asyncio.wait_for(waiting, 1)
+        async with second:
+            second.record(200)
+        assert limiter.stats()["in_flight"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,29 @@
+import base64
+
+from clado_observe.utils.screenshot_store import ScreenshotStore
+
+
+def _uri(data: bytes) -> str:
+    return f"data:image/png;base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+def test_screenshots_evicted_from_disk_are_dropped(tmp_path) -> None:
+    store = ScreenshotStore(max_hot=2, max_disk_bytes=250, cache_dir=str(tmp_path))
+    screenshots = [bytes([n]) * 100 for n in range(6)]
+    for data in screenshots:
+        store.add(data)
+
+    # Two stay in memory, two fit on disk and the two oldest are gone
+    assert store.disk_bytes == 200
+    assert len(store) == 4
+    assert [_uri(data) in store for data in screenshots] == [False] * 2 + [True] * 4
+    assert list(store) == [_uri(data) for data in screenshots[2:]]
+
+
+def test_entries_are_capped() -> None:
+    store = ScreenshotStore(max_entries=3)
+    for n in range(5):
+        store.add(b"same")
+        store.add(bytes([n]))
+    assert len(store) == 3
+    assert list(store) == [_uri(b"\x03"), _uri(b"same"), _uri(b"\x04")]
@@ -0,0 +1,139 @@
+import asyncio
+
+from clado_observe.utils.api_client import APIClient, endpoint_missing
+from clado_observe.utils.local_ingest import LocalIngestServer
+from clado_observe.utils.trace_batcher import TraceBatcher
+
+
+async def _send_traces(server: LocalIngestServer, count: int, session_id: str = "") -> APIClient:
+    client = APIClient(
+        "test-key",
+        skip_verification=True,
+        base_url=server.url,
+        batch_traces=True,
+        max_batch_age_s=60.0,
+    )
+    if not session_id:
+        await client.create_session(prompt="task", model="model")
+    for i in range(count):
+        await client.create_trace("thought", f"trace {i}", session_id=session_id or None)
+    await client.flush_traces()
+    await client.close()
+    return client
+
+
+def test_traces_are_sent_in_one_bulk_request() -> None:
+    async def run() -> None:
+        async with LocalIngestServer() as server:
+            await _send_traces(server, 50)
+            assert server.bulk_request_count == 1
+            # One request creates the session, one sends the batch
+            assert server.request_count == 2
+            assert [trace["content"] for trace in server.traces] == [
+                f"trace {i}" for i in range(50)
+            ]
+
+    asyncio.run(run())
+
+
+def test_falls_back_to_single_traces_without_bulk_endpoint() -> None:
+    async def run() -> None:
+        async with LocalIngestServer(bulk_endpoint=False) as server:
+            client = await _send_traces(server, 5)
+            assert not client._bulk_traces_supported
+            # Session, the rejected batch, then one request per trace
+            assert server.request_count == 1 + 1 + 5
+            assert len(server.traces) == 5
+
+    asyncio.run(run())
+
+
+def test_unknown_session_does_not_disable_bulk_endpoint() -> None:
+    async def run() -> None:
+        async with LocalIngestServer() as server:
+            client = await _send_traces(server, 5, session_id="missing")
+            assert client._bulk_traces_supported
+            assert server.request_count == 1
+            assert client.trace_batcher is not None
+            assert client.trace_batcher.traces_dropped == 5
+            assert client.trace_batcher.pending() == 0
+
+    asyncio.run(run())
+
+
+def test_endpoint_missing() -> None:
+    assert endpoint_missing(405, "")
+    assert endpoint_missing(404, "404: Not Found")
+    assert endpoint_missing(404, '{"detail": "Not Found"}')
+    assert not endpoint_missing(404, "Unknown session")
+    assert not endpoint_missing(500, "Not Found")
+
+
+def test_failed_batch_is_buffered_again() -> None:
+    results = [False, True]
+    sent = []
+
+    async def send(session_id, body, headers, count):
+        ok = results.pop(0)
+        if ok:
+            sent.append(count)
+        return ok
+
+    async def run() -> None:
+        batcher = TraceBatcher(send, max_batch_age_s=60.0)
+        for i in range(3):
+            batcher.add("s", "thought", f"trace {i}")
+        assert not await batcher.flush()
+        assert batcher.pending() == 3
+
+        batcher.add("s", "thought", "trace 3")
+        assert await batcher.flush()
+        assert sent == [4]
+        assert batcher.pending() == 0
+
+    asyncio.run(run())
+
+
+def test_requeued_traces_are_capped() -> None:
+    async def send(session_id, body, headers, count):
+        return False
+
+    async def run() -> None:
+        batcher = TraceBatcher(send, max_batch_age_s=60.0, max_buffered_traces=2)
+        for i in range(3):
+            batcher.add("s", "thought", f"trace {i}")
+        await batcher.flush()
+        assert batcher.pending() == 2
+        assert batcher.traces_dropped == 1
+
+    asyncio.run(run())
+
+
+def test_outbox_retry_skips_units_already_sent() -> None:
+    async def run() -> None:
+        async with LocalIngestServer() as server:
+            client = APIClient("test-key", skip_verification=True, base_url=server.url)
+            session = await client.create_session(prompt="task", model="model")
+            media_results = [False, True]
+
+            async def deliver_media(sid, record):
+                return media_results.pop(0)
+
+            client._deliver_media = deliver_media
+            records = [
+                {"id": 1, "kind": "trace", "session_id": session.id, "ts": 1.0},
+                {"id": 2, "kind": "media", "session_id": session.id, "ts": 2.0},
+                {"id": 3, "kind": "trace", "session_id": session.id, "ts": 3.0},
+                {"id": 4, "kind": "trace", "session_id": session.id, "ts": 4.0},
+            ]
+            for record in records:
+                if record["kind"] == "trace":
+                    record.update(type="thought", content=f"trace {record['id']}")
+
+            assert await client._deliver_outbox(records) == 1
+            assert await client._deliver_outbox(records[1:]) == 3
+            assert sorted(trace["seq"] for trace in server.traces) == [1, 3, 4]
+            assert not client._outbox_sent_ids
+            await client.close()
+
+    asyncio.run(run())